@@ -0,0 +1,451 @@
+"""
+Offline throughput benchmark for the GeoCortex API.
+
+Earth Engine, Groq and the Google/Nominatim HTTP services are replaced by
+in-process fakes with configurable latency and error rates, then each Flask
+route is driven at a fixed concurrency and its latency percentiles and
+throughput are reported.
+
+    python benchmark.py
+    python benchmark.py --routes analyze,planning --concurrency 32 --requests 500
+    python benchmark.py --latency groq=2000 --error-rate 0.02 --save run.json
+    python benchmark.py --compare run.json
+"""
+import os
+import sys
+import json
+import time
+import types
+import random
+import shutil
+import argparse
+import tempfile
+import threading
+import contextlib
+from types import SimpleNamespace
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import requests
+
+# Typical latencies (ms) of the real services, before --latency-scale
+DEFAULT_LATENCY_MS = {
+    'ee_getinfo': 400,
+    'ee_getmapid': 800,
+    'ee_compute_pixels': 2000,
+    'groq': 1200,
+    'nominatim': 150,
+    'solar': 300,
+    'pollen': 200,
+    'aerial_view': 250,
+    'ee_tile': 80,
+}
+BENCH_YEAR = 2023
+WORLDCOVER_CODES = [10, 20, 30, 40, 50, 60, 80]
+
+
+class FakeUpstream:
+    """Injected latency (uniform +/-50% around the mean) and error rate for one dependency."""
+
+    def __init__(self, name, latency_ms, error_rate):
+        self.name = name
+        self.latency_s = latency_ms / 1000.0
+        self.error_rate = error_rate
+        self.calls = 0
+        self._rng = random.Random(name)
+        self._lock = threading.Lock()
+
+    def wait(self, fraction=1.0):
+        """Sleep for one call's latency and return True if this call should fail."""
+        with self._lock:
+            self.calls += 1
+            delay = self.latency_s * fraction * self._rng.uniform(0.5, 1.5)
+            failed = self._rng.random() < self.error_rate
+        time.sleep(delay)
+        return failed
+
+
+# --- Earth Engine ---
+
+class FakeEEObject:
+    """
+    Lazily chained EE expression. Any method call returns another expression;
+    only the calls the server actually evaluates (getInfo, getMapId,
+    computePixels) consult the fake upstreams and produce data.
+    """
+
+    def __init__(self, fakes, kind='image', meta=None, bands=('LST_Day_1km',)):
+        self._fakes = fakes
+        self._kind = kind
+        self._meta = meta
+        self._bands = tuple(bands)
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+
+        def method(*args, **kwargs):
+            if name == 'sample':
+                return FakeEEObject(self._fakes, 'sample')
+            if name == 'sampleRegions':
+                return FakeEEObject(self._fakes, 'regions', meta=kwargs['collection']._meta, bands=self._bands)
+            if name == 'rename':
+                return FakeEEObject(self._fakes, self._kind, self._meta, bands=args[:1])
+            if name == 'addBands':
+                return FakeEEObject(self._fakes, self._kind, self._meta, bands=self._bands + args[0]._bands)
+            return FakeEEObject(self._fakes, self._kind, self._meta, self._bands)
+        return method
+
+    def getMapId(self, vis_params=None):
+        if self._fakes['ee_getmapid'].wait():
+            raise Exception("Injected EE getMapId error")
+        map_id = f"fake{random.getrandbits(32):08x}"
+        url = f"https://earthengine.googleapis.com/v1/projects/fake/maps/{map_id}/tiles/{{z}}/{{x}}/{{y}}"
+        return {'mapid': map_id, 'tile_fetcher': SimpleNamespace(url_format=url)}
+
+    def getInfo(self):
+        if self._fakes['ee_getinfo'].wait():
+            raise Exception("Injected EE getInfo error")
+        if self._kind == 'sample':
+            return random.uniform(14900, 15300)
+        if self._kind == 'regions':
+            return {'features': [
+                {'properties': dict({band: random.uniform(14900, 15300) for band in self._bands}, idx=props['idx'])}
+                for props in self._meta
+            ]}
+        if self._kind == 'dictionary':
+            region = random.uniform(27, 32)
+            return {
+                'region': region,
+                'groups': [{'landcover': code, 'mean': region + random.uniform(-3, 3)} for code in WORLDCOVER_CODES],
+            }
+        return None
+
+
+def build_fake_ee(fakes):
+    ee = types.ModuleType('ee')
+
+    def expr(kind='image'):
+        return lambda *args, **kwargs: FakeEEObject(fakes, kind)
+
+    def compute_pixels(params):
+        if fakes['ee_compute_pixels'].wait():
+            raise Exception("Injected EE computePixels error")
+        dims = params['grid']['dimensions']
+        bands = params['expression']._bands
+        shape = (dims['height'], dims['width'])
+        pixels = np.zeros(shape, dtype=[(band, 'f8') for band in bands])
+        for band in bands:
+            if band == 'landcover':
+                pixels[band] = np.random.choice(WORLDCOVER_CODES, size=shape)
+            else:
+                pixels[band] = np.random.normal(15100, 80, size=shape)
+        return pixels
+
+    ee.Initialize = lambda *args, **kwargs: None
+    ee.ServiceAccountCredentials = lambda *args, **kwargs: None
+    ee.Image = ee.ImageCollection = expr()
+    ee.Dictionary = expr('dictionary')
+    ee.FeatureCollection = lambda features, *args: FakeEEObject(fakes, 'features', meta=[f._meta for f in features])
+    ee.Feature = lambda geometry, props=None: FakeEEObject(fakes, 'feature', meta=props or {})
+    ee.Geometry = SimpleNamespace(Point=expr('geometry'), Rectangle=expr('geometry'))
+    ee.Reducer = SimpleNamespace(mean=expr('reducer'), minMax=expr('reducer'))
+    ee.Filter = SimpleNamespace(date=expr('filter'))
+    ee.Algorithms = SimpleNamespace(If=expr('value'))
+    ee.data = SimpleNamespace(computePixels=compute_pixels)
+    return ee
+
+
+# --- Groq ---
+
+def build_fake_groq(fakes):
+    groq = types.ModuleType('groq')
+    upstream = fakes['groq']
+    answer = ("This area shows elevated land surface temperatures typical of dense built-up cover. "
+              "Increase tree canopy along streets, add reflective roofing and protect nearby water bodies.")
+
+    def create(messages, model, stream=False, **kwargs):
+        if not stream:
+            if upstream.wait():
+                raise RuntimeError("Injected Groq error")
+            return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=answer))])
+
+        def chunks():
+            # ~30% of the latency to the first token, the rest spread over the answer
+            if upstream.wait(0.3):
+                raise RuntimeError("Injected Groq error")
+            words = answer.split(' ')
+            for word in words:
+                time.sleep(upstream.latency_s * 0.7 / len(words))
+                yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=word + ' '))])
+        return chunks()
+
+    class Groq:
+        def __init__(self, api_key=None, **kwargs):
+            self.chat = SimpleNamespace(completions=SimpleNamespace(create=create))
+
+    groq.Groq = Groq
+    return groq
+
+
+# --- HTTP services ---
+
+def fake_response(status, payload=None, content=None, content_type='application/json'):
+    response = requests.Response()
+    response.status_code = status
+    response._content = content if content is not None else json.dumps(payload).encode('utf-8')
+    response._content_consumed = True  # so iter_content() works as for a streamed body
+    response.headers['Content-Type'] = content_type
+    return response
+
+
+class FakeSession:
+    """Answers the hosts the server talks to, in place of a pooled requests.Session."""
+
+    HOSTS = {
+        'nominatim.openstreetmap.org': 'nominatim',
+        'solar.googleapis.com': 'solar',
+        'pollen.googleapis.com': 'pollen',
+        'aerialview.googleapis.com': 'aerial_view',
+        'earthengine.googleapis.com': 'ee_tile',
+    }
+
+    def __init__(self, fakes):
+        self.fakes = fakes
+        self.tile_bytes = b'\x89PNG\r\n\x1a\n' + os.urandom(2048)
+
+    def get(self, url, params=None, headers=None, timeout=None, **kwargs):
+        host = url.split('/')[2]
+        name = self.HOSTS.get(host)
+        if name is None:
+            raise requests.ConnectionError(f"No fake for {host}")
+        if self.fakes[name].wait():
+            return fake_response(503, {'error': {'code': 503, 'message': f'Injected {name} error'}})
+        if name == 'nominatim':
+            return fake_response(200, {
+                'display_name': 'Indiranagar, Bengaluru, Karnataka, India',
+                'address': {'neighbourhood': 'HAL 2nd Stage', 'suburb': 'Indiranagar', 'city': 'Bengaluru'},
+            })
+        if name == 'solar':
+            panels = random.randint(15, 60)
+            return fake_response(200, {
+                'name': f"buildings/fake{random.getrandbits(24):06x}",
+                'solarPotential': {
+                    'maxArrayPanelsCount': panels,
+                    'yearlyEnergyDcKwh': panels * random.uniform(420, 480),
+                    'panelCapacityWatts': 400,
+                },
+            })
+        if name == 'pollen':
+            value = random.randint(0, 5)
+            return fake_response(200, {'dailyInfo': [{'pollenTypeInfo': [
+                {'code': 'GRASS', 'indexInfo': {'value': value, 'category': ['None', 'Very Low', 'Low', 'Moderate', 'High', 'Very High'][value]}}
+            ]}]})
+        if name == 'aerial_view':
+            return fake_response(200, {'state': 'ACTIVE', 'uris': {'MP4_MEDIUM': {'landscapeUri': 'https://example.invalid/video.mp4'}}})
+        return fake_response(200, content=self.tile_bytes, content_type='image/png')
+
+
+def install_fakes(latency_ms, error_rates, work_dir):
+    """Install the fakes and import the server against them."""
+    fakes = {name: FakeUpstream(name, ms, error_rates.get(name, 0.0)) for name, ms in latency_ms.items()}
+    sys.modules['ee'] = build_fake_ee(fakes)
+    sys.modules['groq'] = build_fake_groq(fakes)
+    for var in ('GROQ_API_KEY', 'GOOGLE_SOLAR_API_KEY', 'GOOGLE_POLLEN_API_KEY', 'GOOGLE_MAPS_API_KEY'):
+        os.environ[var] = 'benchmark'
+    # Fresh caches every run so results are comparable
+    os.environ['LST_STORE_DIR'] = os.path.join(work_dir, 'lst')
+    os.environ['TILE_CACHE_DIR'] = os.path.join(work_dir, 'tiles')
+    os.environ['FACTOR_STORE_DB'] = os.path.join(work_dir, 'factors.sqlite')
+    os.environ['AERIAL_VIEW_CACHE_DB'] = os.path.join(work_dir, 'aerial_view.sqlite')
+    os.environ['LST_SERIES_CACHE_DB'] = os.path.join(work_dir, 'lst_series.sqlite')
+
+    import http_client
+    session = FakeSession(fakes)
+    http_client.get_session = lambda url: session
+    import server
+    return server, fakes
+
+
+# --- Scenarios ---
+
+def random_point(rng, bbox):
+    west, south, east, north = bbox
+    return {'lat': round(rng.uniform(south, north), 5), 'lng': round(rng.uniform(west, east), 5)}
+
+
+def build_scenarios(point_pool, rng):
+    """Route name -> function returning (method, path, kwargs) for one request."""
+    point = lambda: dict(rng.choice(point_pool))
+    items = [{'label': label} for label in ('Tree', 'Tree', 'Plant', 'Pond', 'Building', 'Road')]
+    return {
+        'health': lambda: ('GET', '/health', {}),
+        'analyze': lambda: ('POST', '/api/analyze', {'json': dict(point(), year=BENCH_YEAR)}),
+        'analyze_stream': lambda: ('POST', '/api/analyze/stream', {'json': dict(point(), year=BENCH_YEAR)}),
+        'analyze_batch': lambda: ('POST', '/api/analyze/batch', {'json': {
+            'points': [point() for _ in range(50)], 'year': BENCH_YEAR}}),
+        'chatbot': lambda: ('POST', '/api/chatbot', {'json': dict(
+            point(), question='How hot will it get here and what should we plant?', year=BENCH_YEAR)}),
+        'lst_timeseries': lambda: ('POST', '/api/lst/timeseries', {'json': {
+            'points': [point() for _ in range(5)], 'start_year': 2001, 'end_year': BENCH_YEAR}}),
+        'heat_layer': lambda: ('GET', f'/api/heat/{BENCH_YEAR}', {}),
+        'heat_tile': lambda: ('GET', f'/api/heat/tile/{BENCH_YEAR}/12/{rng.randint(2920, 2935)}/{rng.randint(1880, 1895)}', {}),
+        'planning': lambda: ('POST', '/api/planning/analyze', {'json': dict(point(), items=items)}),
+        'planning_sweep': lambda: ('POST', '/api/planning/sweep', {'json': dict(
+            point(), axes={'Tree': {'start': 0, 'stop': 500, 'steps': 51}, 'Pond': [0, 1, 2, 3, 4, 5]}, target=-1)}),
+        'pollen': lambda: ('POST', '/api/check_pollen', {'json': point()}),
+        'aerial_view': lambda: ('GET', '/api/aerial_view', {'query_string': {
+            'address': f"{rng.randint(1, 200)} 100 Feet Road, Indiranagar, Bengaluru"}}),
+        'solar_portfolio': lambda: ('POST', '/api/solar/portfolio', {'json': {
+            'sites': [point() for _ in range(20)]}}),
+        'solar_sensitivity': lambda: ('POST', '/api/solar/sensitivity', {'json': {
+            'energy_per_panel_kwh': 450, 'panel_counts': {'start': 10, 'stop': 60, 'steps': 26},
+            'tariffs': {'start': 5, 'stop': 12, 'steps': 15}, 'degradations': [0, 0.005, 0.01]}}),
+        'solar_report': lambda: ('POST', '/api/solar/report/batch', {'json': {
+            'sites': [point() for _ in range(5)]}}),
+        'metrics': lambda: ('GET', '/metrics', {}),
+    }
+
+
+def drive(app, make_request, total, concurrency):
+    """Issue `total` requests with `concurrency` in flight; returns (latencies_s, errors, wall_s)."""
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+
+    def one(_):
+        method, path, kwargs = make_request()
+        client = app.test_client()
+        started = time.perf_counter()
+        try:
+            response = client.open(path, method=method, **kwargs)
+            response.get_data()  # Drain streamed bodies
+            failed = response.status_code >= 500
+            response.close()
+        except Exception:
+            failed = True
+        elapsed = time.perf_counter() - started
+        with lock:
+            latencies.append(elapsed)
+            errors[0] += failed
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, range(total)))
+    return latencies, errors[0], time.perf_counter() - started
+
+
+def summarize(latencies, errors, wall):
+    ms = np.array(latencies) * 1000.0
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'p50_ms': round(float(np.percentile(ms, 50)), 1),
+        'p95_ms': round(float(np.percentile(ms, 95)), 1),
+        'p99_ms': round(float(np.percentile(ms, 99)), 1),
+        'rps': round(len(latencies) / wall, 1) if wall > 0 else 0.0,
+    }
+
+
+def warm_snapshots(server, timeout=120):
+    """Build the local LST snapshot and regional stats engine up front, as in a warmed-up deployment."""
+    server.lst_store.ingest(BENCH_YEAR)
+    deadline = time.monotonic() + timeout
+    while server.regional_engines.get(BENCH_YEAR) is None and time.monotonic() < deadline:
+        time.sleep(0.1)
+
+
+def print_report(results, baseline=None):
+    header = f"{'route':<18} {'n':>6} {'err':>5} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'req/s':>8}"
+    print(header)
+    print('-' * len(header))
+    for route, r in results.items():
+        line = (f"{route:<18} {r['requests']:>6} {r['errors']:>5} {r['p50_ms']:>9} "
+                f"{r['p95_ms']:>9} {r['p99_ms']:>9} {r['rps']:>8}")
+        before = (baseline or {}).get(route)
+        if before and before['p50_ms'] and before['rps']:
+            line += (f"   p50 {100 * (r['p50_ms'] / before['p50_ms'] - 1):+.0f}%"
+                     f"  req/s {100 * (r['rps'] / before['rps'] - 1):+.0f}%")
+        print(line)
+
+
+def parse_overrides(values, cast):
+    overrides = {}
+    for value in values or []:
+        name, _, amount = value.partition('=')
+        if name not in DEFAULT_LATENCY_MS:
+            raise SystemExit(f"Unknown upstream '{name}'; choose from {', '.join(DEFAULT_LATENCY_MS)}")
+        overrides[name] = cast(amount)
+    return overrides
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark GeoCortex routes against local fakes of every upstream")
+    parser.add_argument('--routes', help="Comma-separated routes to run (default: all)")
+    parser.add_argument('--requests', type=int, default=200, help="Requests per route")
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--warmup', type=int, default=5, help="Unmeasured requests per route first")
+    parser.add_argument('--points', type=int, default=100, help="Distinct locations to draw from (controls cache hit rates)")
+    parser.add_argument('--latency-scale', type=float, default=1.0, help="Multiply every upstream latency")
+    parser.add_argument('--latency', action='append', metavar='UPSTREAM=MS', help="Override one upstream's mean latency")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Failure probability for every upstream")
+    parser.add_argument('--error', action='append', metavar='UPSTREAM=P', help="Override one upstream's failure probability")
+    parser.add_argument('--no-snapshots', action='store_true', help="Skip the local LST/regional snapshots so requests hit EE")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--save', help="Write results as JSON")
+    parser.add_argument('--compare', help="JSON from an earlier --save to diff against")
+    parser.add_argument('--verbose', action='store_true', help="Show the server's own logging")
+    args = parser.parse_args()
+
+    latency_ms = {name: ms * args.latency_scale for name, ms in DEFAULT_LATENCY_MS.items()}
+    latency_ms.update(parse_overrides(args.latency, float))
+    error_rates = {name: args.error_rate for name in DEFAULT_LATENCY_MS}
+    error_rates.update(parse_overrides(args.error, float))
+    random.seed(args.seed)
+    np.random.seed(args.seed)
+
+    work_dir = tempfile.mkdtemp(prefix='geocortex_bench_')
+    quiet = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(open(os.devnull, 'w'))
+    try:
+        with quiet:
+            server, fakes = install_fakes(latency_ms, error_rates, work_dir)
+            if args.no_snapshots:
+                fakes['ee_compute_pixels'].error_rate = 1.0
+            else:
+                warm_snapshots(server)
+
+        rng = random.Random(args.seed)
+        point_pool = [random_point(rng, server.HEAT_BBOX) for _ in range(args.points)]
+        scenarios = build_scenarios(point_pool, rng)
+        routes = args.routes.split(',') if args.routes else list(scenarios)
+        unknown = [r for r in routes if r not in scenarios]
+        if unknown:
+            raise SystemExit(f"Unknown route(s) {', '.join(unknown)}; choose from {', '.join(scenarios)}")
+
+        print(f"Concurrency {args.concurrency}, {args.requests} requests per route, "
+              f"{args.points} distinct points, latency x{args.latency_scale}, error rate {args.error_rate}")
+        results = {}
+        for route in routes:
+            with quiet:
+                if args.warmup:
+                    drive(server.app, scenarios[route], args.warmup, min(args.warmup, args.concurrency))
+                results[route] = summarize(*drive(server.app, scenarios[route], args.requests, args.concurrency))
+            print(f"  {route}: done", file=sys.stderr)
+
+        baseline = None
+        if args.compare:
+            with open(args.compare) as f:
+                baseline = json.load(f)['results']
+        print()
+        print_report(results, baseline)
+        print(f"\nUpstream calls: " + ', '.join(f"{name}={f.calls}" for name, f in fakes.items()))
+        if args.save:
+            with open(args.save, 'w') as f:
+                json.dump({'args': vars(args), 'latency_ms': latency_ms, 'results': results}, f, indent=2)
+            print(f"Saved to {args.save}")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
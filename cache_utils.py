@@ -0,0 +1,498 @@
+import hashlib
+import json
+import multiprocessing
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+STREAM_CHUNK_SIZE = 64 * 1024
+
+# Sentinel for "no cached value", since None is a valid (negative) result
+MISSING = object()
+
+# Every cache registers here so hit ratios can be reported
+_caches = []
+_caches_lock = threading.Lock()
+
+
+def _register_cache(cache):
+    cache.hits = 0
+    cache.misses = 0
+    with _caches_lock:
+        _caches.append(cache)
+
+
+def cache_stats():
+    """Lookup counters per cache name: hits, misses and hit rate."""
+    totals = {}
+    with _caches_lock:
+        caches = list(_caches)
+    for cache in caches:
+        entry = totals.setdefault(cache.name, {'hits': 0, 'misses': 0})
+        entry['hits'] += cache.hits
+        entry['misses'] += cache.misses
+    for entry in totals.values():
+        lookups = entry['hits'] + entry['misses']
+        entry['hit_rate'] = round(entry['hits'] / lookups, 4) if lookups else 0.0
+    return totals
+
+
+class RefreshingTTLCache:
+    """
+    Thread-safe memo cache for values that go stale after a fixed TTL
+    (e.g. Earth Engine map IDs). Entries older than `refresh_after` seconds are
+    still served, but a background thread recomputes them so callers rarely
+    pay the loader latency.
+    """
+
+    def __init__(self, loader, ttl, refresh_after=None, name="cache"):
+        self.loader = loader
+        self.ttl = ttl
+        self.refresh_after = refresh_after if refresh_after is not None else ttl * 0.8
+        self.name = name
+        self._entries = {}  # key -> (value, created_at)
+        self._refreshing = set()
+        self._lock = threading.Lock()
+        self._flight = SingleFlight(name)
+        _register_cache(self)
+
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is not None:
+            value, created_at = entry
+            age = now - created_at
+            if age < self.ttl:
+                self.hits += 1
+                if age >= self.refresh_after:
+                    self._schedule_refresh(key)
+                return value
+        self.misses += 1
+        return self._load(key)
+
+    def invalidate(self, key=None):
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+    def _load(self, key):
+        # Concurrent misses (and a background refresh) for the same key share one loader call
+        def load():
+            value = self.loader(key)
+            with self._lock:
+                self._entries[key] = (value, time.monotonic())
+            return value
+
+        return self._flight.do(key, load)
+
+    def _schedule_refresh(self, key):
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+
+        def refresh():
+            try:
+                self._load(key)
+                print(f"[DEBUG] {self.name}: refreshed entry {key!r}")
+            except Exception as e:
+                # Keep serving the old value until it actually expires
+                print(f"[DEBUG] {self.name}: background refresh of {key!r} failed: {e}")
+            finally:
+                with self._lock:
+                    self._refreshing.discard(key)
+
+        threading.Thread(target=refresh, daemon=True).start()
+
+
+class DiskLRUCache:
+    """
+    Size-capped, content-addressed byte store on local disk with LRU eviction.
+    Each entry is written as `<key hash>-<etag>.bin`, where the etag is a hash of
+    the content, so the index can be rebuilt from the directory after a restart.
+    """
+
+    def __init__(self, directory, max_bytes, name="disk cache"):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.name = name
+        self._index = OrderedDict()  # key hash -> (etag, size), oldest first
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        # A spawned worker re-importing the server never serves from the cache, and
+        # rebuilding the index would delete the *.tmp files the parent is still writing
+        if multiprocessing.parent_process() is None:
+            self._load_index()
+        _register_cache(self)
+
+    @staticmethod
+    def make_key(*parts):
+        return hashlib.sha256("|".join(str(p) for p in parts).encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def make_etag(data):
+        return hashlib.sha256(data).hexdigest()[:32]
+
+    def etag(self, key):
+        """Return the ETag stored for `key` without reading the content, or None."""
+        with self._lock:
+            entry = self._index.get(key)
+            return entry[0] if entry else None
+
+    def get(self, key):
+        """Return `(data, etag)` for `key`, or None on a miss."""
+        with self._lock:
+            entry = self._index.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._index.move_to_end(key)
+        etag = entry[0]
+        path = self._path(key, etag)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            os.utime(path)  # mtime doubles as last-access time across restarts
+        except OSError:
+            self._drop(key)
+            self.misses += 1
+            return None
+        self.hits += 1
+        return data, etag
+
+    def put(self, key, data):
+        """Store `data` under `key` and return its ETag."""
+        tmp_path = self._tmp_path(key)
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        return self._commit(key, tmp_path, self.make_etag(data), len(data))
+
+    def put_stream(self, key, chunks):
+        """
+        Store an iterable of byte chunks under `key` as they arrive, without holding
+        the whole body in memory, and return its ETag. Nothing is committed if the
+        iterable fails part way.
+        """
+        tmp_path = self._tmp_path(key)
+        hasher = hashlib.sha256()
+        size = 0
+        try:
+            with open(tmp_path, "wb") as f:
+                for chunk in chunks:
+                    f.write(chunk)
+                    hasher.update(chunk)
+                    size += len(chunk)
+        except BaseException:
+            self._remove_path(tmp_path)
+            raise
+        return self._commit(key, tmp_path, hasher.hexdigest()[:32], size)
+
+    def stream(self, key, chunk_size=STREAM_CHUNK_SIZE):
+        """Return `(chunks, etag)` for `key`, with the file read lazily chunk by chunk, or None on a miss."""
+        with self._lock:
+            entry = self._index.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._index.move_to_end(key)
+        etag = entry[0]
+        path = self._path(key, etag)
+        try:
+            # Opened now, so a later eviction can't pull the file out from under the response
+            f = open(path, "rb")
+            os.utime(path)
+        except OSError:
+            self._drop(key)
+            self.misses += 1
+            return None
+        self.hits += 1
+        return _read_chunks(f, chunk_size), etag
+
+    def _commit(self, key, tmp_path, etag, size):
+        os.replace(tmp_path, self._path(key, etag))
+        with self._lock:
+            old = self._index.pop(key, None)
+            if old is not None:
+                self._total_bytes -= old[1]
+                if old[0] != etag:
+                    self._remove_file(key, old[0])
+            self._index[key] = (etag, size)
+            self._total_bytes += size
+            self._evict()
+        return etag
+
+    def _tmp_path(self, key):
+        return os.path.join(self.directory, f"{key}.{threading.get_ident()}.tmp")
+
+    def _path(self, key, etag):
+        return os.path.join(self.directory, f"{key}-{etag}.bin")
+
+    def _load_index(self):
+        entries = []
+        for fname in os.listdir(self.directory):
+            if fname.endswith(".tmp"):
+                # Left behind by an interrupted write
+                self._remove_path(os.path.join(self.directory, fname))
+                continue
+            if not fname.endswith(".bin"):
+                continue
+            key, _, etag = fname[:-len(".bin")].partition("-")
+            try:
+                st = os.stat(os.path.join(self.directory, fname))
+            except OSError:
+                continue
+            entries.append((st.st_mtime, key, etag, st.st_size))
+        for _, key, etag, size in sorted(entries):
+            self._index[key] = (etag, size)
+            self._total_bytes += size
+        self._evict()
+        print(f"[DEBUG] {self.name}: loaded {len(self._index)} entries ({self._total_bytes} bytes)")
+
+    def _evict(self):
+        # Caller holds the lock
+        while self._total_bytes > self.max_bytes and self._index:
+            key, (etag, size) = self._index.popitem(last=False)
+            self._total_bytes -= size
+            self._remove_file(key, etag)
+
+    def _drop(self, key):
+        with self._lock:
+            entry = self._index.pop(key, None)
+            if entry is not None:
+                self._total_bytes -= entry[1]
+
+    def _remove_file(self, key, etag):
+        self._remove_path(self._path(key, etag))
+
+    @staticmethod
+    def _remove_path(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def _read_chunks(f, chunk_size):
+    with f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+
+
+# Every SingleFlight registers here so coalescing hit rates can be reported
+_single_flights = []
+_single_flights_lock = threading.Lock()
+
+
+def single_flight_stats():
+    """Coalescing counters per single-flight name: calls, executions, coalesced and hit rate."""
+    totals = {}
+    with _single_flights_lock:
+        flights = list(_single_flights)
+    for flight in flights:
+        entry = totals.setdefault(flight.name, {'calls': 0, 'executions': 0})
+        entry['calls'] += flight.calls
+        entry['executions'] += flight.executions
+    for entry in totals.values():
+        entry['coalesced'] = entry['calls'] - entry['executions']
+        entry['hit_rate'] = round(entry['coalesced'] / entry['calls'], 4) if entry['calls'] else 0.0
+    return totals
+
+
+class SingleFlight:
+    """Coalesce concurrent calls for the same key so only one of them does the work."""
+
+    class _Call:
+        def __init__(self):
+            self.event = threading.Event()
+            self.result = None
+            self.error = None
+
+    def __init__(self, name="single-flight"):
+        self.name = name
+        self.calls = 0
+        self.executions = 0
+        self._calls = {}
+        self._lock = threading.Lock()
+        with _single_flights_lock:
+            _single_flights.append(self)
+
+    def do(self, key, fn):
+        with self._lock:
+            self.calls += 1
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                self.executions += 1
+                call = self._calls[key] = self._Call()
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.event.set()
+
+
+class SQLiteStore:
+    """Small persistent key/value table (JSON values, optional expiry) backing an in-memory cache."""
+
+    def __init__(self, path, table="cache"):
+        self.path = path
+        self.table = table
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {table} "
+                "(key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL)"
+            )
+
+    def get(self, key):
+        """Return the stored value, or MISSING if absent or expired."""
+        return self.get_with_expiry(key)[0]
+
+    def get_with_expiry(self, key):
+        """Return (value, expires_at as a time.time() timestamp or None), or (MISSING, None)."""
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT value, expires_at FROM {self.table} WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None:
+            return MISSING, None
+        value, expires_at = row
+        if expires_at is not None and expires_at < time.time():
+            self.delete(key)
+            return MISSING, None
+        return json.loads(value), expires_at
+
+    def set(self, key, value, ttl=None):
+        expires_at = time.time() + ttl if ttl is not None else None
+        with self._lock, self._conn:
+            self._conn.execute(
+                f"INSERT OR REPLACE INTO {self.table} (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, json.dumps(value), expires_at)
+            )
+
+    def set_many(self, items, ttl=None):
+        expires_at = time.time() + ttl if ttl is not None else None
+        with self._lock, self._conn:
+            self._conn.executemany(
+                f"INSERT OR REPLACE INTO {self.table} (key, value, expires_at) VALUES (?, ?, ?)",
+                [(key, json.dumps(value), expires_at) for key, value in items]
+            )
+
+    def delete(self, key):
+        with self._lock, self._conn:
+            self._conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+
+
+def _resolve_ttl(ttl, value):
+    return ttl(value) if callable(ttl) else ttl
+
+
+class LRUCache:
+    """
+    Bounded, thread-safe in-memory LRU with optional TTL and an optional
+    SQLiteStore behind it. `get_or_load` coalesces concurrent misses for the
+    same key into a single loader call. None is a cacheable value, so
+    negative results can be stored too. A TTL may be a callable taking the
+    value, for entries whose lifetime depends on what was loaded.
+    """
+
+    def __init__(self, max_entries, ttl=None, store=None, name="cache"):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.store = store
+        self.name = name
+        self._entries = OrderedDict()  # key -> (value, expires_at)
+        self._lock = threading.Lock()
+        self._flight = SingleFlight(name)
+        _register_cache(self)
+
+    def get(self, key, default=None):
+        value = self._lookup(key)
+        if value is MISSING:
+            self.misses += 1
+            return default
+        self.hits += 1
+        return value
+
+    def _lookup(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, expires_at = entry
+                if expires_at is None or expires_at > time.monotonic():
+                    self._entries.move_to_end(key)
+                    return value
+                del self._entries[key]
+        if self.store is not None:
+            value, expires_at = self.store.get_with_expiry(key)
+            if value is not MISSING:
+                # Keep the row's remaining lifetime, which may come from a per-call ttl
+                self._remember(key, value, expires_at - time.time() if expires_at is not None else None)
+                return value
+        return MISSING
+
+    def set(self, key, value, ttl=None):
+        ttl = _resolve_ttl(ttl if ttl is not None else self.ttl, value)
+        self._remember(key, value, ttl)
+        if self.store is not None:
+            self.store.set(key, value, ttl)
+
+    def set_many(self, items, ttl=None):
+        """Store (key, value) pairs sharing one TTL, in a single store transaction."""
+        ttl = ttl if ttl is not None else self.ttl
+        if callable(ttl):
+            for key, value in items:
+                self.set(key, value, ttl)
+            return
+        items = list(items)
+        for key, value in items:
+            self._remember(key, value, ttl)
+        if self.store is not None and items:
+            self.store.set_many(items, ttl)
+
+    def get_or_load(self, key, loader, ttl=None):
+        value = self.get(key, MISSING)
+        if value is not MISSING:
+            return value
+
+        def load():
+            # Another caller may have filled the entry while we were queued
+            cached = self._lookup(key)
+            if cached is not MISSING:
+                return cached
+            loaded = loader()
+            self.set(key, loaded, ttl)
+            return loaded
+
+        return self._flight.do(key, load)
+
+    def _remember(self, key, value, ttl):
+        expires_at = time.monotonic() + ttl if ttl is not None else None
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
@@ -28,6 +28,7 @@ const App = () => {
   const [planningTrigger, setPlanningTrigger] = React.useState(false);
   const [showCinematicPreview, setShowCinematicPreview] = React.useState(false);
   const [currentLocationName, setCurrentLocationName] = React.useState('');
+  const [currentLocation, setCurrentLocation] = React.useState(null);
   const [showDronePopup, setShowDronePopup] = React.useState(false);
   const [showGestureInstructions, setShowGestureInstructions] = React.useState(true);
   const [showMobilePopup, setShowMobilePopup] = React.useState(false);
@@ -139,6 +140,7 @@ const App = () => {
                       setMoveTo({ lat: loc.lat, lng: loc.lon });
                       // Also update current location for cinematic view if needed
                       setCurrentLocationName(loc.display_name);
+                      setCurrentLocation({ lat: loc.lat, lng: loc.lon });
                     }} />
                   </div>
                 </nav>
@@ -188,6 +190,7 @@ const App = () => {
                       <div className="w-full max-w-5xl shadow-2xl rounded-2xl overflow-hidden">
                         <CinematicPreview
                           targetAddress={currentLocationName}
+                          targetLocation={currentLocation}
                           onClose={() => setShowCinematicPreview(false)}
                         />
                       </div>
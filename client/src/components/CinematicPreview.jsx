@@ -23,7 +23,7 @@ const SAMPLE_LOCATIONS = [
     }
 ];
 
-const CinematicPreview = ({ targetAddress, onClose }) => {
+const CinematicPreview = ({ targetAddress, targetLocation, onClose }) => {
     const [loading, setLoading] = useState(false);
     const [videoUri, setVideoUri] = useState(null);
     const [error, setError] = useState(null);
@@ -37,11 +37,11 @@ const CinematicPreview = ({ targetAddress, onClose }) => {
             setVideoUri(null);
             setError(null);
             setIsFallbackMode(false);
-            lookupVideo(targetAddress);
+            lookupVideo(targetAddress, targetLocation);
         }
     }, [targetAddress]);
 
-    const lookupVideo = async (address) => {
+    const lookupVideo = async (address, location) => {
         setLoading(true);
         setError(null);
         setVideoUri(null);
@@ -52,7 +52,9 @@ const CinematicPreview = ({ targetAddress, onClose }) => {
                 `${API_BASE_URL}/api/aerial_view`,
                 {
                     params: {
-                        address: address
+                        address: address,
+                        // Geocoded position lets the server share cached lookups between spellings of an address
+                        ...(location ? { lat: location.lat, lng: location.lng } : {})
                     }
                 }
             );
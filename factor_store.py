@@ -0,0 +1,102 @@
+import math
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+from cache_utils import LRUCache, SQLiteStore, MISSING
+
+# ~1.1 km grid cells: a 5 km buffer barely changes within one cell
+FACTOR_CELL_DEG = 0.01
+
+
+def cell_for(lat, lng, cell_deg=FACTOR_CELL_DEG):
+    return math.floor(float(lat) / cell_deg), math.floor(float(lng) / cell_deg)
+
+
+def cell_center(row, col, cell_deg=FACTOR_CELL_DEG):
+    return (row + 0.5) * cell_deg, (col + 0.5) * cell_deg
+
+
+class RegionalFactorStore:
+    """
+    Persistent cache of regional LST statistics (overall mean and per
+    WorldCover class means) per grid cell, LST year and radius. The inputs
+    are a closed LST year and a static land-cover map, so entries never expire.
+    `compute(lat, lng, lst_year, radius_m)` must return (regional_mean, {class_code: mean}).
+    """
+
+    def __init__(self, path, compute, cell_deg=FACTOR_CELL_DEG, max_entries=20000):
+        self.compute = compute
+        self.cell_deg = cell_deg
+        self.store = SQLiteStore(path, table='regional_factors')
+        self.cache = LRUCache(max_entries, store=self.store, name="regional factor cache")
+
+    def _key(self, row, col, lst_year, radius_m):
+        return f"{lst_year}:{radius_m}:{row}:{col}"
+
+    def _load(self, row, col, lst_year, radius_m):
+        lat, lng = cell_center(row, col, self.cell_deg)
+        regional_mean, class_means = self.compute(lat, lng, lst_year, radius_m)
+        if regional_mean is None:
+            # No data (or a transient EE problem); don't persist it
+            raise LookupError(f"No LST data for cell {row},{col}")
+        return {'region': regional_mean, 'classes': {str(k): v for k, v in class_means.items()}}
+
+    def get(self, lat, lng, lst_year, radius_m):
+        """Return (regional_mean, {class_code: mean}) for the cell containing the point."""
+        row, col = cell_for(lat, lng, self.cell_deg)
+        entry = self.cache.get_or_load(
+            self._key(row, col, lst_year, radius_m),
+            lambda: self._load(row, col, lst_year, radius_m)
+        )
+        return entry['region'], {int(k): v for k, v in entry['classes'].items()}
+
+    def precompute(self, bbox, lst_year, radius_m, workers=8):
+        """Fill every cell of a [west, south, east, north] bbox that isn't stored yet."""
+        west, south, east, north = bbox
+        row_min, col_min = cell_for(south, west, self.cell_deg)
+        row_max, col_max = cell_for(north, east, self.cell_deg)
+        cells = [
+            (row, col)
+            for row in range(row_min, row_max + 1)
+            for col in range(col_min, col_max + 1)
+            if self.store.get(self._key(row, col, lst_year, radius_m)) is MISSING
+        ]
+        print(f"Precomputing {len(cells)} cells for {lst_year} (radius {radius_m} m)")
+
+        def fill(cell):
+            row, col = cell
+            try:
+                lat, lng = cell_center(row, col, self.cell_deg)
+                self.get(lat, lng, lst_year, radius_m)
+                return True
+            except Exception as e:
+                print(f"Cell {row},{col} failed: {e}")
+                return False
+
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            done = 0
+            for i, ok in enumerate(pool.map(fill, cells), 1):
+                done += ok
+                if i % 50 == 0 or i == len(cells):
+                    print(f"  {i}/{len(cells)} cells processed ({done} stored)")
+        return done
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Precompute regional cooling/heating factors for a city bbox")
+    parser.add_argument('--bbox', nargs=4, type=float, metavar=('WEST', 'SOUTH', 'EAST', 'NORTH'))
+    parser.add_argument('--year', type=int)
+    parser.add_argument('--radius', type=int)
+    parser.add_argument('--workers', type=int, default=8)
+    args = parser.parse_args()
+
+    import server  # The configured factor store
+    import startup
+    if not startup.ensure_ee():
+        raise SystemExit(f"Earth Engine is not available: {startup.ee_status()['error']}")
+    server.factor_store.precompute(
+        args.bbox or server.HEAT_BBOX,
+        args.year or server.PLANNING_LST_YEAR,
+        args.radius or server.PLANNING_RADIUS_M,
+        workers=args.workers
+    )
@@ -0,0 +1,77 @@
+import os
+import time
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+import resilience
+
+# Shared pool for independent upstream fetches (geocoding, EE reductions, ...) inside one request
+UPSTREAM_WORKERS = int(os.getenv('UPSTREAM_WORKERS', 32))
+_executor = ThreadPoolExecutor(max_workers=UPSTREAM_WORKERS, thread_name_prefix='upstream')
+
+
+class Branch:
+    """One independent upstream call: what to run, how long to wait for it, and what to use instead."""
+
+    def __init__(self, fn, deadline, fallback=None):
+        self.fn = fn
+        self.deadline = deadline
+        self.fallback = fallback
+
+
+def fan_out(branches, label="fan-out"):
+    """
+    Run independent branches concurrently and join them.
+
+    `branches` maps a name to a Branch. Returns a dict of name -> result; a
+    branch that raises or misses its deadline contributes its fallback, so
+    the caller can still continue with partial data. Deadlines are capped by
+    what is left of the request budget, and branches run in a copy of the
+    caller's context so their upstream calls see the same budget. Python
+    threads can't be cancelled, so a timed-out branch finishes in the
+    background and its result is discarded.
+    """
+    started = time.monotonic()
+    budget = resilience.remaining()
+    futures = {
+        name: (_executor.submit(contextvars.copy_context().run, branch.fn), branch)
+        for name, branch in branches.items()
+    }
+    results = {}
+    for name, (future, branch) in futures.items():
+        deadline = branch.deadline if budget is None else min(branch.deadline, budget)
+        remaining = deadline - (time.monotonic() - started)
+        try:
+            results[name] = future.result(timeout=max(remaining, 0))
+        except FutureTimeout:
+            print(f"[DEBUG] {label}: '{name}' missed its {branch.deadline}s deadline, using fallback")
+            results[name] = branch.fallback
+        except Exception as e:
+            print(f"[DEBUG] {label}: '{name}' failed ({e}), using fallback")
+            results[name] = branch.fallback
+    return results
+
+
+class TokenBucket:
+    """Thread-safe token bucket limiter: `rate` tokens per second with bursts of up to `capacity`."""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else max(rate, 1))
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a token is available, then take it."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
@@ -0,0 +1,145 @@
+import os
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, TimeoutError as FutureTimeout, wait
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import metrics
+import resilience
+
+# Connection pool and timeout settings shared by every outbound call
+POOL_CONNECTIONS = int(os.getenv('HTTP_POOL_CONNECTIONS', 4))
+POOL_MAXSIZE = int(os.getenv('HTTP_POOL_MAXSIZE', 16))
+CONNECT_TIMEOUT = float(os.getenv('HTTP_CONNECT_TIMEOUT', 3.05))
+READ_TIMEOUT = float(os.getenv('HTTP_READ_TIMEOUT', 30))
+STREAM_CHUNK_SIZE = 64 * 1024
+
+# Per-host pool sizes, e.g. HTTP_POOL_SIZES="earthengine.googleapis.com=64,nominatim.openstreetmap.org=4"
+HOST_POOL_SIZES = {
+    'earthengine.googleapis.com': 64,  # tile proxy fans out dozens of requests per map pan
+}
+for _entry in os.getenv('HTTP_POOL_SIZES', '').split(','):
+    if '=' in _entry:
+        _host, _size = _entry.split('=', 1)
+        HOST_POOL_SIZES[_host.strip()] = int(_size)
+
+# Hedged GETs: after this many seconds without an answer, send a duplicate of an idempotent
+# request and use whichever answers first, e.g. HTTP_HEDGE_AFTER="ee_tile=0.5,pollen=1.5".
+# Off by default for billed APIs (Solar) and rate-limited ones (Nominatim).
+HEDGE_AFTER = {}
+for _entry in os.getenv('HTTP_HEDGE_AFTER', 'ee_tile=0.5').split(','):
+    if '=' in _entry:
+        _upstream, _seconds = _entry.split('=', 1)
+        HEDGE_AFTER[_upstream.strip()] = float(_seconds)
+_hedge_executor = ThreadPoolExecutor(max_workers=int(os.getenv('HTTP_HEDGE_WORKERS', 32)), thread_name_prefix='hedge')
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+
+def get_session(url):
+    """Return the keep-alive session for the URL's host, creating its pool on first use."""
+    host = urlsplit(url).netloc
+    session = _sessions.get(host)
+    if session is not None:
+        return session
+    with _sessions_lock:
+        session = _sessions.get(host)
+        if session is None:
+            pool_size = HOST_POOL_SIZES.get(host, POOL_MAXSIZE)
+            adapter = HTTPAdapter(pool_connections=POOL_CONNECTIONS, pool_maxsize=pool_size)
+            session = requests.Session()
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            _sessions[host] = session
+            print(f"[DEBUG] Opened HTTP pool for {host} (maxsize={pool_size})")
+    return session
+
+
+def _close_response(future):
+    # The slower copy of a hedged GET; a streamed body would otherwise hold its pooled connection
+    if future.exception() is None:
+        future.result().close()
+
+
+def _hedged_get(session, url, upstream, hedge_after, kwargs):
+    """Send the GET; if it hasn't answered within `hedge_after` seconds, race a duplicate and take the first good answer."""
+    first = _hedge_executor.submit(session.get, url, **kwargs)
+    try:
+        return first.result(timeout=hedge_after)
+    except FutureTimeout:
+        pass
+    metrics.UPSTREAM_HEDGES.inc(upstream)
+    second = _hedge_executor.submit(session.get, url, **kwargs)
+    done, _ = wait([first, second], return_when=FIRST_COMPLETED)
+    winner = done.pop()
+    if winner.exception() is None:
+        (second if winner is first else first).add_done_callback(_close_response)
+        return winner.result()
+    # The faster one failed; the other one is our only chance (and raises if it fails too)
+    return (second if winner is first else first).result()
+
+
+def get(url, upstream=None, **kwargs):
+    """
+    Pooled drop-in for `requests.get` that always applies a timeout. With
+    `upstream` set, the call also goes through that upstream's circuit breaker
+    (raising resilience.CircuitOpenError while it is open), its read timeout
+    is capped by the current request's remaining budget, slow calls may be
+    hedged, and latency and outcome are recorded under that name.
+    """
+    if upstream is None:
+        kwargs.setdefault('timeout', (CONNECT_TIMEOUT, READ_TIMEOUT))
+        return get_session(url).get(url, **kwargs)
+
+    requested = kwargs.pop('timeout', None)
+    if isinstance(requested, tuple):
+        requested = requested[1]
+    kwargs['timeout'] = (CONNECT_TIMEOUT, resilience.upstream_timeout(upstream, requested) or READ_TIMEOUT)
+    circuit = resilience.breaker(upstream)
+    circuit.check()
+
+    session = get_session(url)
+    hedge_after = HEDGE_AFTER.get(upstream)
+    started = time.perf_counter()
+    try:
+        if hedge_after is not None:
+            response = _hedged_get(session, url, upstream, hedge_after, kwargs)
+        else:
+            response = session.get(url, **kwargs)
+    except requests.Timeout:
+        circuit.record_failure()
+        metrics.observe_upstream(upstream, time.perf_counter() - started, 'timeout')
+        raise
+    except Exception:
+        circuit.record_failure()
+        metrics.observe_upstream(upstream, time.perf_counter() - started, 'error')
+        raise
+    except BaseException:
+        circuit.release_trial()
+        raise
+    # Throttling and server errors count against the upstream's health; other 4xx are our problem
+    if response.status_code >= 500 or response.status_code == 429:
+        circuit.record_failure()
+    else:
+        circuit.record_success()
+    outcome = 'error' if response.status_code >= 500 else 'ok'
+    metrics.observe_upstream(upstream, time.perf_counter() - started, outcome)
+    return response
+
+
+def iter_stream(response, chunk_size=STREAM_CHUNK_SIZE):
+    """Yield a streamed response body chunk by chunk, releasing the connection back to the pool at the end."""
+    try:
+        for chunk in response.iter_content(chunk_size=chunk_size):
+            if chunk:
+                yield chunk
+    finally:
+        response.close()
+
+
+# Anything that means "the upstream can't answer right now", for callers with a fallback
+UNAVAILABLE_ERRORS = (requests.RequestException, resilience.CircuitOpenError, resilience.DeadlineExceeded)
@@ -0,0 +1,89 @@
+import os
+import re
+import json
+import hashlib
+import threading
+
+import metrics
+from cache_utils import LRUCache, MISSING
+
+# Completions are deterministic enough per (model, canonical inputs) to be reused for a while
+completion_cache = LRUCache(
+    max_entries=int(os.getenv('LLM_CACHE_SIZE', 2000)),
+    ttl=int(os.getenv('LLM_CACHE_TTL_SECONDS', 6 * 3600)),
+    name="LLM completion cache"
+)
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_client(api_key):
+    """Reuse one Groq client (and its connection pool) per API key."""
+    from groq import Groq  # Deferred: the SDK is slow to import and only needed on a cache miss
+    with _clients_lock:
+        client = _clients.get(api_key)
+        if client is None:
+            client = _clients[api_key] = Groq(api_key=api_key)
+        return client
+
+
+def normalize_prompt(prompt):
+    return re.sub(r'\s+', ' ', prompt).strip()
+
+
+def completion_key(model, prompt, key_parts=None):
+    """
+    Cache key for a completion. Callers pass `key_parts` built from rounded
+    inputs (zone, temperature to 0.1 °C, asset counts, ...) so near-identical
+    requests share an answer; otherwise the whitespace-normalized prompt is used.
+    """
+    if key_parts is not None:
+        payload = {'model': model, 'parts': key_parts}
+    else:
+        payload = {'model': model, 'prompt': normalize_prompt(prompt)}
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+
+def complete(prompt, model, api_key, key_parts=None):
+    """Single-prompt chat completion, served from cache when an equivalent request was answered recently."""
+    def call():
+        with metrics.timed('groq'):
+            response = get_client(api_key).chat.completions.create(
+                messages=[{"role": "user", "content": prompt}],
+                model=model,
+            )
+        return response.choices[0].message.content
+
+    return completion_cache.get_or_load(completion_key(model, prompt, key_parts), call)
+
+
+def round_or_none(value, digits=1):
+    return round(value, digits) if value is not None else None
+
+
+def stream_complete(prompt, model, api_key, key_parts=None):
+    """
+    Streaming variant of `complete`: yields text deltas as the model produces
+    them. A cached answer is replayed as a single chunk, and a fully streamed
+    answer is added to the cache.
+    """
+    key = completion_key(model, prompt, key_parts)
+    cached = completion_cache.get(key, MISSING)
+    if cached is not MISSING:
+        yield cached
+        return
+    parts = []
+    # Timed from request to the last token; a client disconnect mid-stream is not recorded
+    with metrics.timed('groq_stream'):
+        stream = get_client(api_key).chat.completions.create(
+            messages=[{"role": "user", "content": prompt}],
+            model=model,
+            stream=True,
+        )
+        for chunk in stream:
+            delta = chunk.choices[0].delta.content if chunk.choices else None
+            if delta:
+                parts.append(delta)
+                yield delta
+    completion_cache.set(key, ''.join(parts))
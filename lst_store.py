@@ -0,0 +1,177 @@
+import os
+import sys
+import json
+import math
+import time
+import datetime
+import tempfile
+import threading
+
+import numpy as np
+
+import metrics
+from startup import ee
+
+# MODIS LST_Day_1km is a ~926 m grid, i.e. 30 arc-seconds
+LST_PIXEL_DEG = 1.0 / 120
+LST_NODATA = 0
+MODIS_FIRST_YEAR = 2000  # MOD11A2 starts in March 2000
+# Don't re-download a year whose ingest failed on every miss
+INGEST_RETRY_SECONDS = 600
+
+
+def is_lst_year(year):
+    """Whether MODIS has LST for `year` (the current year's mean is partial)."""
+    return MODIS_FIRST_YEAR <= year <= datetime.date.today().year
+
+
+def build_annual_lst_image(year):
+    """Annual mean of MODIS LST_Day_1km for a year (raw units: Kelvin / 0.02)."""
+    return ee.ImageCollection('MODIS/061/MOD11A2') \
+        .filter(ee.Filter.date(f'{year}-01-01', f'{year}-12-31')) \
+        .select('LST_Day_1km') \
+        .mean()
+
+
+def build_lst_series_image(years):
+    """
+    One band per year ("LST_<year>") of annual means, so a single sample call
+    returns a whole series. Masked pixels become LST_NODATA rather than dropping the point.
+    """
+    image = None
+    for year in years:
+        band = build_annual_lst_image(year).unmask(LST_NODATA).rename(f'LST_{year}')
+        image = band if image is None else image.addBands(band)
+    return image
+
+
+class LSTRasterStore:
+    """
+    Local snapshots of the annual mean LST raster for a bounding box, one
+    memory-mapped uint16 array per year plus a JSON geotransform. Point
+    lookups become an array index instead of an Earth Engine round trip.
+    """
+
+    def __init__(self, directory, bbox, pixel_deg=LST_PIXEL_DEG):
+        self.directory = directory
+        self.bbox = bbox  # [west, south, east, north]
+        self.pixel_deg = pixel_deg
+        self._rasters = {}  # year -> (array, transform)
+        self._ingesting = set()
+        self._failed_at = {}  # year -> time.monotonic() of the last failed ingest
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _paths(self, year):
+        base = os.path.join(self.directory, f"lst_{year}")
+        return base + ".npy", base + ".json"
+
+    def _open(self, year):
+        with self._lock:
+            if year in self._rasters:
+                return self._rasters[year]
+        array_path, meta_path = self._paths(year)
+        raster = None
+        if os.path.exists(array_path) and os.path.exists(meta_path):
+            with open(meta_path, 'r') as f:
+                transform = json.load(f)
+            raster = (np.load(array_path, mmap_mode='r'), transform)
+        with self._lock:
+            # Misses are remembered too, until ingest() replaces them
+            self._rasters[year] = raster
+        return raster
+
+    def has_year(self, year):
+        return self._open(year) is not None
+
+    def lookup(self, year, lat, lng):
+        """Return the raw LST value at a point, or None if it is outside the snapshot or has no data."""
+        raster = self._open(year)
+        if raster is None:
+            return None
+        array, t = raster
+        col = math.floor((lng - t['west']) / t['pixel_deg'])
+        row = math.floor((t['north'] - lat) / t['pixel_deg'])
+        if not (0 <= row < t['height'] and 0 <= col < t['width']):
+            return None
+        value = int(array[row, col])
+        return value if value != LST_NODATA else None
+
+    def ingest(self, year):
+        """Download the annual mean for `year` over the bbox and write it to disk atomically."""
+        west, south, east, north = self.bbox
+        width = math.ceil((east - west) / self.pixel_deg)
+        height = math.ceil((north - south) / self.pixel_deg)
+        with metrics.timed('ee_compute_pixels'):
+            pixels = ee.data.computePixels({
+                'expression': build_annual_lst_image(year),
+                'fileFormat': 'NUMPY_NDARRAY',
+                'grid': {
+                    'dimensions': {'width': width, 'height': height},
+                    'affineTransform': {
+                        'scaleX': self.pixel_deg, 'shearX': 0, 'translateX': west,
+                        'shearY': 0, 'scaleY': -self.pixel_deg, 'translateY': north,
+                    },
+                    'crsCode': 'EPSG:4326',
+                },
+            })
+        values = np.nan_to_num(np.asarray(pixels['LST_Day_1km'], dtype=np.float64), nan=LST_NODATA)
+        array = np.clip(np.rint(values), 0, np.iinfo(np.uint16).max).astype(np.uint16)
+        transform = {
+            'west': west, 'north': north, 'pixel_deg': self.pixel_deg,
+            'width': width, 'height': height, 'year': year,
+            'created': datetime.datetime.utcnow().isoformat() + 'Z',
+        }
+
+        array_path, meta_path = self._paths(year)
+        fd, tmp_array = tempfile.mkstemp(dir=self.directory, suffix='.npy')
+        with os.fdopen(fd, 'wb') as f:
+            np.save(f, array)
+        fd, tmp_meta = tempfile.mkstemp(dir=self.directory, suffix='.json')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(transform, f)
+        os.replace(tmp_array, array_path)
+        os.replace(tmp_meta, meta_path)
+        with self._lock:
+            self._rasters.pop(year, None)
+        print(f"[DEBUG] LST store: ingested {year} ({width}x{height} px)")
+        return array.shape
+
+    def ingest_in_background(self, year):
+        """Snapshot a closed year on first miss without blocking the request that missed."""
+        if not is_lst_year(year) or year >= datetime.date.today().year:
+            return  # No MODIS data, or the current year's mean is still changing
+        with self._lock:
+            if year in self._ingesting:
+                return
+            if time.monotonic() - self._failed_at.get(year, -INGEST_RETRY_SECONDS) < INGEST_RETRY_SECONDS:
+                return
+            self._ingesting.add(year)
+
+        def run():
+            try:
+                self.ingest(year)
+            except Exception as e:
+                print(f"[DEBUG] LST store: ingest of {year} failed: {e}")
+                with self._lock:
+                    self._failed_at[year] = time.monotonic()
+            finally:
+                # A failed year is retried on a miss after INGEST_RETRY_SECONDS; a finished one is found by has_year()
+                with self._lock:
+                    self._ingesting.discard(year)
+
+        threading.Thread(target=run, daemon=True).start()
+
+
+if __name__ == '__main__':
+    # Usage: python lst_store.py 2019 2020 2021 ...
+    import server  # Snapshot directory and bbox configuration
+    import startup
+    if not startup.ensure_ee():
+        sys.exit(f"Earth Engine is not available: {startup.ee_status()['error']}")
+    years = [int(arg) for arg in sys.argv[1:]] or list(range(2001, datetime.date.today().year))
+    for ingest_year in years:
+        try:
+            server.lst_store.ingest(ingest_year)
+        except Exception as e:
+            print(f"Failed to ingest {ingest_year}: {e}")
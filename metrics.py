@@ -0,0 +1,191 @@
+import time
+import threading
+import socket
+from contextlib import contextmanager
+from concurrent.futures import TimeoutError as FutureTimeout
+
+import requests
+from flask import g, request, Response
+
+from cache_utils import cache_stats, single_flight_stats
+
+# Latency buckets in seconds: sub-10 ms cache hits up to slow LLM completions and EE reductions
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+TIMEOUT_ERRORS = (requests.Timeout, FutureTimeout, socket.timeout, TimeoutError)
+
+
+def _format_labels(names, values):
+    if not names:
+        return ''
+    pairs = []
+    for name, value in zip(names, values):
+        escaped = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        pairs.append(f'{name}="{escaped}"')
+    return '{' + ','.join(pairs) + '}'
+
+
+class Counter:
+    """Monotonic counter with a fixed set of label names."""
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help_text = help_text
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for label_values, value in items:
+            lines.append(f"{self.name}{_format_labels(self.labels, label_values)} {value}")
+        return lines
+
+
+class Histogram:
+    """Cumulative-bucket histogram with a fixed set of label names."""
+
+    def __init__(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._series = {}  # label values -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def observe(self, value, *label_values):
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = sorted((k, list(v)) for k, v in self._series.items())
+        names = self.labels + ('le',)
+        for label_values, series in items:
+            for bound, count in zip(self.buckets, series):
+                lines.append(f"{self.name}_bucket{_format_labels(names, label_values + (bound,))} {count}")
+            lines.append(f"{self.name}_bucket{_format_labels(names, label_values + ('+Inf',))} {series[-1]}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labels, label_values)} {series[-2]:.6f}")
+            lines.append(f"{self.name}_count{_format_labels(self.labels, label_values)} {series[-1]}")
+        return lines
+
+
+_registry = []
+_collectors = []  # Callables returning extra exposition lines at scrape time
+
+REQUEST_LATENCY = Histogram(
+    'geocortex_http_request_duration_seconds',
+    'Time to produce a response per Flask route (time to first byte for streamed responses).',
+    labels=('route', 'method', 'status')
+)
+UPSTREAM_LATENCY = Histogram(
+    'geocortex_upstream_duration_seconds',
+    'Latency of calls to external services.',
+    labels=('upstream', 'outcome')
+)
+UPSTREAM_FAILURES = Counter(
+    'geocortex_upstream_failures_total',
+    'Upstream calls that raised, timed out, returned an HTTP 5xx or were refused by an open circuit.',
+    labels=('upstream', 'kind')
+)
+UPSTREAM_HEDGES = Counter(
+    'geocortex_upstream_hedged_total',
+    'Duplicate requests sent because the first one was slow.',
+    labels=('upstream',)
+)
+
+
+def register_collector(collector):
+    _collectors.append(collector)
+
+
+def observe_upstream(upstream, seconds, outcome):
+    """Record one upstream call; `outcome` is "ok", "error" or "timeout"."""
+    UPSTREAM_LATENCY.observe(seconds, upstream, outcome)
+    if outcome != 'ok':
+        UPSTREAM_FAILURES.inc(upstream, outcome)
+
+
+@contextmanager
+def timed(upstream):
+    """Time the enclosed upstream call, classifying exceptions as errors or timeouts."""
+    started = time.perf_counter()
+    try:
+        yield
+    except TIMEOUT_ERRORS:
+        observe_upstream(upstream, time.perf_counter() - started, 'timeout')
+        raise
+    except Exception:
+        observe_upstream(upstream, time.perf_counter() - started, 'error')
+        raise
+    observe_upstream(upstream, time.perf_counter() - started, 'ok')
+
+
+def _render_cache_metrics():
+    lines = [
+        "# HELP geocortex_cache_requests_total Cache lookups by result.",
+        "# TYPE geocortex_cache_requests_total counter",
+    ]
+    ratios = [
+        "# HELP geocortex_cache_hit_ratio Fraction of cache lookups served from cache.",
+        "# TYPE geocortex_cache_hit_ratio gauge",
+    ]
+    for name, entry in sorted(cache_stats().items()):
+        lines.append(f"geocortex_cache_requests_total{_format_labels(('cache', 'result'), (name, 'hit'))} {entry['hits']}")
+        lines.append(f"geocortex_cache_requests_total{_format_labels(('cache', 'result'), (name, 'miss'))} {entry['misses']}")
+        ratios.append(f"geocortex_cache_hit_ratio{_format_labels(('cache',), (name,))} {entry['hit_rate']}")
+
+    flights = [
+        "# HELP geocortex_single_flight_calls_total Calls into a single-flight group, by whether they did the work.",
+        "# TYPE geocortex_single_flight_calls_total counter",
+    ]
+    for name, entry in sorted(single_flight_stats().items()):
+        flights.append(f"geocortex_single_flight_calls_total{_format_labels(('name', 'result'), (name, 'executed'))} {entry['executions']}")
+        flights.append(f"geocortex_single_flight_calls_total{_format_labels(('name', 'result'), (name, 'coalesced'))} {entry['coalesced']}")
+    return lines + ratios + flights
+
+
+def render():
+    """All metrics in the Prometheus text exposition format."""
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    lines.extend(_render_cache_metrics())
+    for collector in _collectors:
+        lines.extend(collector())
+    return '\n'.join(lines) + '\n'
+
+
+def instrument_app(app):
+    """Time every request per route and serve the registry at /metrics."""
+
+    @app.before_request
+    def _start_timer():
+        g._metrics_started = time.perf_counter()
+
+    @app.after_request
+    def _record_latency(response):
+        started = g.pop('_metrics_started', None)
+        if started is not None:
+            route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+            REQUEST_LATENCY.observe(time.perf_counter() - started, route, request.method, str(response.status_code))
+        return response
+
+    @app.route('/metrics', methods=['GET'])
+    def prometheus_metrics():
+        return Response(render(), mimetype='text/plain; version=0.0.4')
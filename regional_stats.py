@@ -0,0 +1,191 @@
+import os
+import math
+import time
+import threading
+
+import numpy as np
+
+import metrics
+from startup import ee
+from lst_store import LST_PIXEL_DEG, LST_NODATA, build_annual_lst_image
+
+# Metres per degree of latitude (spherical approximation, good enough at 1 km pixels)
+M_PER_DEG = 111320.0
+# Don't retry a failed engine build on every request
+BUILD_RETRY_SECONDS = 600
+
+
+def integral_image(values):
+    """Summed-area table with a zero row/column prepended, so S[r, c] = sum(values[:r, :c])."""
+    table = np.zeros((values.shape[0] + 1, values.shape[1] + 1), dtype=np.float64)
+    table[1:, 1:] = values.cumsum(axis=0).cumsum(axis=1)
+    return table
+
+
+class RegionalStatsEngine:
+    """
+    Integral images over an LST raster (°C) and its co-registered WorldCover
+    class raster. Mean LST over any rectangle, overall and per land-cover
+    class, is a constant-time lookup; circles are answered exactly at pixel
+    resolution as one O(1) strip per raster row, vectorized in NumPy.
+    """
+
+    def __init__(self, lst_c, landcover, transform):
+        self.transform = transform  # {'west', 'north', 'pixel_deg', 'width', 'height'}
+        valid = ~np.isnan(lst_c)
+        values = np.where(valid, lst_c, 0.0)
+        self.classes = [int(c) for c in np.unique(landcover[valid])]
+        # Layer 0 is "all pixels", then one layer per class; sums and counts side by side
+        masks = [valid] + [valid & (landcover == c) for c in self.classes]
+        self._sums = np.stack([integral_image(values * m) for m in masks])
+        self._counts = np.stack([integral_image(m.astype(np.float64)) for m in masks])
+
+    def covers(self, lat, lng, radius_m=0):
+        t = self.transform
+        dlat = radius_m / M_PER_DEG
+        dlng = radius_m / (M_PER_DEG * math.cos(math.radians(lat)))
+        east = t['west'] + t['width'] * t['pixel_deg']
+        south = t['north'] - t['height'] * t['pixel_deg']
+        return (t['west'] <= lng - dlng and lng + dlng <= east and
+                south <= lat - dlat and lat + dlat <= t['north'])
+
+    def _strip_totals(self, rows, col0, col1):
+        """Sum of every layer over half-open strips rows x [col0, col1), for arrays of rows."""
+        totals = []
+        for table in (self._sums, self._counts):
+            strips = (table[:, rows + 1, col1] - table[:, rows, col1]
+                      - table[:, rows + 1, col0] + table[:, rows, col0])
+            totals.append(strips.sum(axis=1))
+        return totals
+
+    def _to_means(self, sums, counts):
+        means = np.divide(sums, counts, out=np.full_like(sums, np.nan), where=counts > 0)
+        regional = None if np.isnan(means[0]) else float(means[0])
+        class_means = {
+            code: float(mean)
+            for code, mean in zip(self.classes, means[1:])
+            if not np.isnan(mean)
+        }
+        return regional, class_means
+
+    def rect_stats(self, west, south, east, north):
+        """Mean LST over a lat/lng rectangle: (regional_mean, {class_code: mean})."""
+        t = self.transform
+        col0 = int(np.clip(math.floor((west - t['west']) / t['pixel_deg']), 0, t['width']))
+        col1 = int(np.clip(math.ceil((east - t['west']) / t['pixel_deg']), 0, t['width']))
+        row0 = int(np.clip(math.floor((t['north'] - north) / t['pixel_deg']), 0, t['height']))
+        row1 = int(np.clip(math.ceil((t['north'] - south) / t['pixel_deg']), 0, t['height']))
+        sums = (self._sums[:, row1, col1] - self._sums[:, row0, col1]
+                - self._sums[:, row1, col0] + self._sums[:, row0, col0])
+        counts = (self._counts[:, row1, col1] - self._counts[:, row0, col1]
+                  - self._counts[:, row1, col0] + self._counts[:, row0, col0])
+        return self._to_means(sums, counts)
+
+    def circle_stats(self, lat, lng, radius_m):
+        """Mean LST over pixels whose centres fall within `radius_m` of the point."""
+        t = self.transform
+        px = t['pixel_deg']
+        m_per_col = px * M_PER_DEG * math.cos(math.radians(lat))
+        m_per_row = px * M_PER_DEG
+        center_row = (t['north'] - lat) / px
+        center_col = (lng - t['west']) / px
+
+        rows = np.arange(
+            max(math.floor(center_row - radius_m / m_per_row), 0),
+            min(math.ceil(center_row + radius_m / m_per_row), t['height'])
+        )
+        # Half-width of the circle at each row's pixel-centre latitude, in columns
+        dy = (rows + 0.5 - center_row) * m_per_row
+        half = np.sqrt(np.clip(radius_m ** 2 - dy ** 2, 0, None)) / m_per_col
+        col0 = np.clip(np.ceil(center_col - half - 0.5), 0, t['width']).astype(int)
+        col1 = np.clip(np.floor(center_col + half - 0.5) + 1, 0, t['width']).astype(int)
+        keep = col1 > col0
+        if not keep.any():
+            return None, {}
+        sums, counts = self._strip_totals(rows[keep], col0[keep], col1[keep])
+        return self._to_means(sums, counts)
+
+
+class RegionalStatsEngines:
+    """
+    Per-year engines over a padded bbox. The two rasters are fetched once with
+    a single computePixels call, cached as .npz next to the LST snapshots, and
+    the integral images are rebuilt in memory on load. Engines are built in a
+    background thread; until one is ready, callers fall back to Earth Engine.
+    """
+
+    def __init__(self, directory, bbox, pad_deg=0.1, pixel_deg=LST_PIXEL_DEG):
+        west, south, east, north = bbox
+        self.bbox = [west - pad_deg, south - pad_deg, east + pad_deg, north + pad_deg]
+        self.directory = directory
+        self.pixel_deg = pixel_deg
+        self._engines = {}
+        self._loading = set()
+        self._failed_at = {}
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def get(self, year):
+        """Return the engine for `year`, or None while it is still being built."""
+        with self._lock:
+            engine = self._engines.get(year)
+            if engine is not None or year in self._loading:
+                return engine
+            if time.monotonic() - self._failed_at.get(year, -BUILD_RETRY_SECONDS) < BUILD_RETRY_SECONDS:
+                return None
+            self._loading.add(year)
+        threading.Thread(target=self._build, args=(year,), daemon=True).start()
+        return None
+
+    def _build(self, year):
+        try:
+            path = os.path.join(self.directory, f"regional_{year}.npz")
+            if not os.path.exists(path):
+                self._download(year, path)
+            with np.load(path) as data:
+                lst_raw = data['lst'].astype(np.float64)
+                landcover = data['landcover']
+                transform = {k: float(data[k]) for k in ('west', 'north', 'pixel_deg')}
+            transform['height'], transform['width'] = lst_raw.shape
+            lst_c = np.where(lst_raw > LST_NODATA, lst_raw * 0.02 - 273.15, np.nan)
+            engine = RegionalStatsEngine(lst_c, landcover, transform)
+            with self._lock:
+                self._engines[year] = engine
+            print(f"[DEBUG] Regional stats engine for {year} ready ({lst_raw.shape[1]}x{lst_raw.shape[0]} px)")
+        except Exception as e:
+            print(f"[DEBUG] Regional stats engine for {year} failed: {e}")
+            with self._lock:
+                self._failed_at[year] = time.monotonic()
+        finally:
+            with self._lock:
+                self._loading.discard(year)
+
+    def _download(self, year, path):
+        west, south, east, north = self.bbox
+        width = math.ceil((east - west) / self.pixel_deg)
+        height = math.ceil((north - south) / self.pixel_deg)
+        image = build_annual_lst_image(year).rename('lst').addBands(
+            ee.ImageCollection("ESA/WorldCover/v200").first().rename('landcover')
+        )
+        with metrics.timed('ee_compute_pixels'):
+            pixels = ee.data.computePixels({
+                'expression': image,
+                'fileFormat': 'NUMPY_NDARRAY',
+                'grid': {
+                    'dimensions': {'width': width, 'height': height},
+                    'affineTransform': {
+                        'scaleX': self.pixel_deg, 'shearX': 0, 'translateX': west,
+                        'shearY': 0, 'scaleY': -self.pixel_deg, 'translateY': north,
+                    },
+                    'crsCode': 'EPSG:4326',
+                },
+            })
+        lst = np.nan_to_num(np.asarray(pixels['lst'], dtype=np.float64), nan=LST_NODATA)
+        tmp_path = path + '.tmp.npz'
+        np.savez_compressed(
+            tmp_path,
+            lst=np.clip(np.rint(lst), 0, np.iinfo(np.uint16).max).astype(np.uint16),
+            landcover=np.asarray(pixels['landcover']).astype(np.uint8),
+            west=west, north=north, pixel_deg=self.pixel_deg
+        )
+        os.replace(tmp_path, path)
@@ -0,0 +1,217 @@
+import os
+import re
+import time
+import threading
+import contextvars
+from contextlib import contextmanager
+
+import requests
+
+import metrics
+
+# Whole-request time budget; upstream timeouts and fan-out deadlines are capped by what is left of it
+REQUEST_BUDGET_SECONDS = float(os.getenv('REQUEST_BUDGET_SECONDS', 25))
+# Read timeout per upstream when the budget allows it, e.g. UPSTREAM_TIMEOUTS="solar=8,pollen=3"
+UPSTREAM_TIMEOUTS = {
+    'nominatim': 5,
+    'solar': 10,
+    'pollen': 5,
+    'aerial_view': 10,
+    'ee_tile': 10,
+}
+for _entry in os.getenv('UPSTREAM_TIMEOUTS', '').split(','):
+    if '=' in _entry:
+        _name, _seconds = _entry.split('=', 1)
+        UPSTREAM_TIMEOUTS[_name.strip()] = float(_seconds)
+# Never start an upstream call with less than this left
+MIN_UPSTREAM_TIMEOUT = 0.25
+
+BREAKER_FAILURES = int(os.getenv('BREAKER_FAILURES', 5))
+BREAKER_RESET_SECONDS = float(os.getenv('BREAKER_RESET_SECONDS', 30))
+
+# Error text from SDKs that don't expose an HTTP status (the EE client raises EEException with the
+# server's message): throttling, overload and transport trouble, as opposed to bad input
+UPSTREAM_FAULT_MESSAGES = re.compile(
+    r'too many|rate limit|quota exceeded|internal error|backend error|service unavailable|'
+    r'temporarily unavailable|timed out|deadline exceeded|connection (?:reset|aborted|refused)|unable to find the server|'
+    r'\b(?:429|500|502|503|504)\b',
+    re.IGNORECASE
+)
+
+_deadline = contextvars.ContextVar('request_deadline', default=None)
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling an upstream whose circuit breaker is open."""
+
+
+class DeadlineExceeded(TimeoutError):
+    """The request's time budget ran out before an upstream call could start."""
+
+
+# --- Request budget ---
+
+def start_budget(seconds=REQUEST_BUDGET_SECONDS):
+    _deadline.set(time.monotonic() + seconds)
+
+
+def remaining(default=None):
+    """Seconds left in the current request's budget, or `default` outside a request."""
+    deadline = _deadline.get()
+    if deadline is None:
+        return default
+    return deadline - time.monotonic()
+
+
+def upstream_timeout(upstream, requested=None):
+    """Read timeout for a call to `upstream`: its configured limit, capped by the remaining budget."""
+    timeout = requested if requested is not None else UPSTREAM_TIMEOUTS.get(upstream)
+    left = remaining()
+    if left is None:
+        return timeout
+    if left < MIN_UPSTREAM_TIMEOUT:
+        raise DeadlineExceeded(f"No time left in the request budget for {upstream}")
+    return min(timeout, left) if timeout is not None else left
+
+
+def install(app):
+    """Give every request a fresh time budget."""
+
+    @app.before_request
+    def _start_request_budget():
+        start_budget()
+
+
+# --- Circuit breakers ---
+
+class CircuitBreaker:
+    """
+    Consecutive-failure breaker. After `failure_threshold` failures in a row the
+    circuit opens and calls fail fast for `reset_timeout` seconds; then a single
+    trial call is let through and its outcome closes or re-opens the circuit.
+    """
+
+    def __init__(self, name, failure_threshold=BREAKER_FAILURES, reset_timeout=BREAKER_RESET_SECONDS):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = 'closed'
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.state == 'closed':
+                return True
+            if self.state == 'open' and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self.state = 'half_open'
+                self._trial_in_flight = False
+            if self.state == 'half_open' and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            if self.state != 'closed':
+                print(f"[DEBUG] Circuit for {self.name} closed")
+            self.state = 'closed'
+            self._failures = 0
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self.state == 'half_open' or self._failures >= self.failure_threshold:
+                if self.state != 'open':
+                    print(f"[DEBUG] Circuit for {self.name} opened after {self._failures} failures")
+                self.state = 'open'
+                self._opened_at = time.monotonic()
+                self._trial_in_flight = False
+
+    def release_trial(self):
+        """
+        End a half-open trial that finished without a verdict (our deadline,
+        cancellation), so the next call can be the trial instead.
+        """
+        with self._lock:
+            self._trial_in_flight = False
+
+    def check(self):
+        """Raise CircuitOpenError if the call should not be attempted."""
+        if not self.allow():
+            metrics.UPSTREAM_FAILURES.inc(self.name, 'circuit_open')
+            raise CircuitOpenError(f"{self.name} is unavailable (circuit open)")
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def breaker(name):
+    with _breakers_lock:
+        circuit = _breakers.get(name)
+        if circuit is None:
+            circuit = _breakers[name] = CircuitBreaker(name)
+        return circuit
+
+
+def is_upstream_failure(exc):
+    """
+    Whether an exception says the upstream is unhealthy: transport errors,
+    timeouts, 5xx and 429. Errors caused by the request itself (a year with
+    no data, an invalid geometry) are not held against the upstream.
+    """
+    if isinstance(exc, DeadlineExceeded):
+        return False  # Our budget, not the upstream's health
+    # Not `or`: a requests.Response with an error status is falsy
+    response = getattr(exc, 'response', None)
+    if response is None:
+        response = getattr(exc, 'resp', None)
+    status = getattr(response, 'status_code', None) or getattr(response, 'status', None)
+    if isinstance(status, int):
+        return status >= 500 or status == 429
+    if isinstance(exc, metrics.TIMEOUT_ERRORS + (ConnectionError, requests.ConnectionError)):
+        return True
+    return bool(UPSTREAM_FAULT_MESSAGES.search(str(exc)))
+
+
+@contextmanager
+def guard(name):
+    """
+    Fail fast if `name`'s circuit is open; otherwise count the enclosed call's
+    outcome. Only upstream failures (see is_upstream_failure) count against it.
+    """
+    circuit = breaker(name)
+    circuit.check()
+    recorded = False
+    try:
+        yield
+        circuit.record_success()
+        recorded = True
+    except Exception as e:
+        if is_upstream_failure(e):
+            circuit.record_failure()
+            recorded = True
+        raise
+    finally:
+        if not recorded:
+            circuit.release_trial()
+
+
+def _render_breakers():
+    lines = [
+        "# HELP geocortex_circuit_open Whether an upstream's circuit breaker is open (1) or half-open (0.5).",
+        "# TYPE geocortex_circuit_open gauge",
+    ]
+    with _breakers_lock:
+        circuits = sorted(_breakers.items())
+    values = {'closed': 0, 'half_open': 0.5, 'open': 1}
+    for name, circuit in circuits:
+        lines.append(f'geocortex_circuit_open{{upstream="{name}"}} {values[circuit.state]}')
+    return lines
+
+
+metrics.register_collector(_render_breakers)
@@ -1,80 +1,75 @@
 import os
+import re
 import json
-import ee
-from groq import Groq
+import math
+import time
+import unicodedata
+import contextvars
+import datetime
+import tempfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import startup
+import numpy as np
 from flask import Flask, jsonify, request, send_from_directory, Response
 from flask_cors import CORS
-from dotenv import load_dotenv
-import requests
-from solar_engine import analyze_solar_potential, analyze_solar_potential_with_ai
+import http_client
+import llm_client
+import metrics
+import resilience
+from fanout import fan_out, Branch
+from factor_store import RegionalFactorStore
+from regional_stats import RegionalStatsEngines
+from solar_engine import (
+    analyze_solar_potential, analyze_solar_potential_with_ai, analyze_solar_portfolio,
+    fetch_site_potential, sensitivity_surface, build_batch_report,
+    PANEL_COST_INR, TARIFF_INR_PER_KWH, PANEL_DEGRADATION, SYSTEM_LIFETIME_YEARS, DISCOUNT_RATE
+)
+from cache_utils import RefreshingTTLCache, DiskLRUCache, LRUCache, SQLiteStore, SingleFlight, single_flight_stats, MISSING
+from lst_store import LSTRasterStore, LST_NODATA, MODIS_FIRST_YEAR, is_lst_year, build_annual_lst_image, build_lst_series_image
+from startup import ee
+
+startup.mark('imports')
 
 # Load .env from the same directory as server.py
-env_path = os.path.join(os.path.dirname(__file__), '.env')
-
-# Fix BOM issue: Read file, strip BOM, and write back if needed
-try:
-    with open(env_path, 'r', encoding='utf-8-sig') as f:  # utf-8-sig automatically strips BOM
-        content = f.read()
-    # Check if original file has BOM by reading with regular utf-8
-    with open(env_path, 'rb') as f:
-        raw = f.read(3)
-        if raw.startswith(b'\xef\xbb\xbf'):
-            print("[DEBUG] BOM detected in .env file, creating clean version...")
-            # Write back without BOM
-            with open(env_path, 'w', encoding='utf-8') as f:
-                f.write(content)
-            print("[DEBUG] .env file cleaned of BOM")
-except Exception as e:
-    print(f"[DEBUG] Error handling .env BOM: {e}")
-
-load_dotenv(env_path)
+startup.load_env(os.path.join(os.path.dirname(__file__), '.env'))
 print(f"[DEBUG] GROQ_API_KEY present: {bool(os.getenv('GROQ_API_KEY'))}")
 if os.getenv('GROQ_API_KEY'):
     print(f"[DEBUG] GROQ_API_KEY loaded successfully")
+startup.mark('env')
 
 app = Flask(__name__, static_folder='client/dist', static_url_path='')
 CORS(app)  # Enable CORS for all routes - required for Cloud Run + Firebase frontend
+metrics.instrument_app(app)  # Per-route latency histograms, served with upstream and cache metrics at /metrics
+resilience.install(app)  # Per-request time budget that caps upstream timeouts and fan-out deadlines
 
-# Initialize Earth Engine
-try:
-    # Check for Cloud Run mounted secret first, then fallback to local file
-    # Cloud Run typically mounts secrets to /secrets/<secret-name> or custom path
-    credentials_paths = [
-        os.environ.get('GOOGLE_APPLICATION_CREDENTIALS'),  # Environment variable path
-        '/secrets/earthengine-credentials',  # User's Cloud Run secret mount path
-        '/secrets/credentials.json',  # Common Cloud Run secret mount path
-        '/secrets/credentials/credentials.json',  # Alternative mount path
-        os.path.join(os.path.dirname(__file__), 'credentials.json')  # Local development
-    ]
-    
-    credentials_data = None
-    for cred_path in credentials_paths:
-        if cred_path and os.path.exists(cred_path):
-            print(f"[DEBUG] Found credentials at: {cred_path}")
-            with open(cred_path, 'r') as f:
-                credentials_data = json.load(f)
-            break
-    
-    if not credentials_data:
-        raise FileNotFoundError("No credentials.json found in any expected location")
-    
-    creds = ee.ServiceAccountCredentials(
-        credentials_data['client_email'],
-        key_data=json.dumps(credentials_data)
-    )
-    ee.Initialize(creds)
-    print("Earth Engine initialized successfully")
-except Exception as e:
-    print(f"Earth Engine initialization failed: {e}")
+# Earth Engine is initialized on a warm-up thread (or on first use) so the container serves right away
+startup.start()
 
 @app.route('/health', methods=['GET'])
 def health_check():
     return jsonify({'status': 'online'})
 
+@app.route('/ready', methods=['GET'])
+def readiness_check():
+    """Readiness: 200 once Earth Engine is initialized, 503 while it is starting or if it failed."""
+    ee_state = startup.ee_status()
+    body = {
+        'ready': ee_state['state'] == 'ready',
+        'startup_mode': startup.STARTUP_MODE,
+        'earth_engine': ee_state,
+        'phases': startup.startup_phases(),
+    }
+    return jsonify(body), 200 if body['ready'] else 503
+
 @app.route('/ping', methods=['GET'])
 def ping():
     return jsonify({'pong': True})
 
+@app.route('/api/stats/coalescing', methods=['GET'])
+def coalescing_stats():
+    """Single-flight counters: how many identical in-flight requests were served by another call."""
+    return jsonify(single_flight_stats())
+
 # --- Solar analysis endpoint is disabled ---
 # @app.route('/api/analyze_solar', methods=['POST'])
 # def solar_analysis():
@@ -123,42 +118,110 @@ def ping():
 #         traceback.print_exc()
 #         return jsonify({"error": str(e)}), 500
 
+# Bangalore bounding box (approximate) and palette used for the heat layer
+HEAT_BBOX = [77.4, 12.8, 77.75, 13.15]
+HEAT_PALETTE = [
+    "040274", "040281", "0502a3", "0502b8", "0502ce", "0502e6",
+    "0602ff", "235cb1", "307ef3", "269db1", "30c8e2", "32d3ef",
+    "3be285", "3ff38f", "86e26f", "3ae237", "b5e22e", "d6e21f",
+    "fff705", "ffd611", "ffb613", "ff8b13", "ff6e08", "ff500d",
+    "ff0000", "de0101", "c21301", "a71001", "911001"
+]
+
+def build_heat_tile_url(year):
+    """Build the MODIS LST annual mean for a year and return its EE tile URL template."""
+    bangalore_bbox = ee.Geometry.Rectangle(HEAT_BBOX)
+    image = build_annual_lst_image(year)
+
+    # Compute min/max for Bangalore (LST is in Kelvin*100)
+    stats = image.reduceRegion(
+        reducer=ee.Reducer.minMax(),
+        geometry=bangalore_bbox,
+        scale=1000,
+        maxPixels=1e9
+    )
+    min_val = stats.get('LST_Day_1km_min')
+    max_val = stats.get('LST_Day_1km_max')
+    # Fallback if stats are not available
+    min_val = ee.Algorithms.If(min_val, min_val, 13000)
+    max_val = ee.Algorithms.If(max_val, max_val, 16500)
+
+    vis_params = {
+        'min': min_val,
+        'max': max_val,
+        'palette': HEAT_PALETTE
+    }
+    with resilience.guard('ee'), metrics.timed('ee_getmapid'):
+        map_id = image.getMapId(vis_params)
+    print(f"[DEBUG] Created heat layer map ID for {year}")
+    return map_id['tile_fetcher'].url_format
+
+# Local snapshots of the annual LST mean over the heat bbox, filled by `python lst_store.py <years>`
+lst_store = LSTRasterStore(
+    os.getenv('LST_STORE_DIR', os.path.join(tempfile.gettempdir(), 'geocortex_lst')),
+    bbox=HEAT_BBOX
+)
+
+sample_flight = SingleFlight("EE point sample")
+MAX_PREDICTION_YEAR = 2100
+
+def parse_lst_year(value, future_ok=False):
+    """
+    Year from a request body. Raises ValueError unless MODIS LST covers it, so bad
+    input is rejected before it reaches Earth Engine; `future_ok` allows prediction years.
+    """
+    if isinstance(value, bool) or (isinstance(value, float) and not value.is_integer()):
+        raise ValueError('year must be an integer')
+    year = int(value)
+    if not (is_lst_year(year) or (future_ok and datetime.date.today().year < year <= MAX_PREDICTION_YEAR)):
+        latest = MAX_PREDICTION_YEAR if future_ok else datetime.date.today().year
+        raise ValueError(f'year must be between {MODIS_FIRST_YEAR} and {latest}')
+    return year
+
+def parse_coordinates(lat, lng):
+    """(lat, lng) as floats from a request body; raises ValueError unless both are valid degrees."""
+    if lat is None or lng is None:
+        raise ValueError('lat and lng required')
+    if isinstance(lat, bool) or isinstance(lng, bool):
+        raise ValueError('lat and lng must be numbers')
+    lat, lng = float(lat), float(lng)
+    if not (-90 <= lat <= 90 and -180 <= lng <= 180):
+        raise ValueError('lat must be within [-90, 90] and lng within [-180, 180]')
+    return lat, lng
+
+def sample_lst_raw(year, lat, lng):
+    """Raw MODIS LST value (Kelvin / 0.02) at a point, read locally when the snapshot covers it."""
+    year = int(year)
+    lst_value = lst_store.lookup(year, lat, lng)
+    if lst_value is not None:
+        return lst_value
+    if not lst_store.has_year(year):
+        lst_store.ingest_in_background(year)
+    # Outside the snapshot (or not ingested yet): sample Earth Engine directly
+    def sample():
+        point = ee.Geometry.Point([lng, lat])
+        image = build_annual_lst_image(year)
+        with resilience.guard('ee'), metrics.timed('ee_getinfo'):
+            return image.sample(point, scale=1000).first().get('LST_Day_1km').getInfo()
+
+    # Identical concurrent samples (~1 m precision key) share one EE call
+    return sample_flight.do((year, round(float(lat), 5), round(float(lng), 5)), sample)
+
+# EE map IDs expire, so cache them per year and refresh in the background before they go stale
+heat_tile_urls = RefreshingTTLCache(
+    build_heat_tile_url,
+    ttl=int(os.getenv('HEAT_MAPID_TTL_SECONDS', 6 * 3600)),
+    refresh_after=int(os.getenv('HEAT_MAPID_REFRESH_SECONDS', 5 * 3600)),
+    name="heat map IDs"
+)
+
 @app.route('/api/heat/<int:year>')
 def get_heat_layer(year):
+    if not is_lst_year(year):
+        return jsonify({'error': f'year must be between {MODIS_FIRST_YEAR} and {datetime.date.today().year}'}), 400
     try:
-        # Define Bangalore bounding box (approximate)
-        bangalore_bbox = ee.Geometry.Rectangle([77.4, 12.8, 77.75, 13.15])
-        image = ee.ImageCollection('MODIS/061/MOD11A2') \
-            .filter(ee.Filter.date(f'{year}-01-01', f'{year}-12-31')) \
-            .select('LST_Day_1km') \
-            .mean()
-
-        # Compute min/max for Bangalore (LST is in Kelvin*100)
-        stats = image.reduceRegion(
-            reducer=ee.Reducer.minMax(),
-            geometry=bangalore_bbox,
-            scale=1000,
-            maxPixels=1e9
-        )
-        min_val = stats.get('LST_Day_1km_min')
-        max_val = stats.get('LST_Day_1km_max')
-        # Fallback if stats are not available
-        min_val = ee.Algorithms.If(min_val, min_val, 13000)
-        max_val = ee.Algorithms.If(max_val, max_val, 16500)
-
-        vis_params = {
-            'min': min_val,
-            'max': max_val,
-            'palette': [
-                "040274", "040281", "0502a3", "0502b8", "0502ce", "0502e6",
-                "0602ff", "235cb1", "307ef3", "269db1", "30c8e2", "32d3ef",
-                "3be285", "3ff38f", "86e26f", "3ae237", "b5e22e", "d6e21f",
-                "fff705", "ffd611", "ffb613", "ff8b13", "ff6e08", "ff500d",
-                "ff0000", "de0101", "c21301", "a71001", "911001"
-            ]
-        }
-        map_id = image.getMapId(vis_params)
-        tile_url = map_id['tile_fetcher'].url_format
+        # Warm the map ID cache so the first tile request doesn't pay for it
+        heat_tile_urls.get(year)
 
         # Return a proxy URL for tiles
         proxy_tile_url = f"/api/heat/tile/{year}/{{z}}/{{x}}/{{y}}"
@@ -167,239 +230,908 @@ def get_heat_layer(year):
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+# Tiles are kept on local disk: past years' for good, the current year's per map ID
+HEAT_PALETTE_ID = DiskLRUCache.make_key(*HEAT_PALETTE)[:12]
+heat_tile_store = DiskLRUCache(
+    os.getenv('TILE_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'geocortex_tiles')),
+    max_bytes=int(os.getenv('TILE_CACHE_MAX_MB', 256)) * 1024 * 1024,
+    name="heat tile cache"
+)
+
+def heat_tile_response(body, etag, closed_year, content_type='image/png'):
+    """Build a tile response with ETag and Cache-Control, or a 304 if the client copy is current."""
+    if etag and request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        response = Response(body, content_type=content_type)
+    if etag:
+        response.set_etag(etag)
+    if closed_year:
+        response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+    else:
+        # Current year's mean still changes as new 8-day composites arrive
+        response.headers['Cache-Control'] = 'public, max-age=3600'
+    return response
+
+tile_flight = SingleFlight("heat tile fetch")
+
+def fetch_heat_tile(year, z, x, y, store_key):
+    """
+    Fetch one tile from Earth Engine into the tile store, streaming it to disk as it
+    arrives; returns (status, content_type, error body, etag).
+    """
+    tile_url = heat_tile_urls.get(year)
+    real_tile_url = tile_url.replace('{z}', str(z)).replace('{x}', str(x)).replace('{y}', str(y))
+    r = http_client.get(real_tile_url, upstream='ee_tile', stream=True)
+    if r.status_code in (401, 403, 404):
+        # Map ID was revoked or expired early; rebuild it on the next request
+        heat_tile_urls.invalidate(year)
+    content_type = r.headers.get('Content-Type', 'image/png')
+    if not r.ok:
+        return r.status_code, content_type, r.content, None
+    return 200, content_type, None, heat_tile_store.put_stream(store_key, http_client.iter_stream(r))
+
 # Proxy endpoint for Earth Engine tiles
-import requests
 @app.route('/api/heat/tile/<int:year>/<int:z>/<int:x>/<int:y>')
 def proxy_heat_tile(year, z, x, y):
+    if not is_lst_year(year):
+        return jsonify({'error': f'year must be between {MODIS_FIRST_YEAR} and {datetime.date.today().year}'}), 400
     try:
-        bangalore_bbox = ee.Geometry.Rectangle([77.4, 12.8, 77.75, 13.15])
-        image = ee.ImageCollection('MODIS/061/MOD11A2') \
-            .filter(ee.Filter.date(f'{year}-01-01', f'{year}-12-31')) \
-            .select('LST_Day_1km') \
-            .mean()
-        stats = image.reduceRegion(
-            reducer=ee.Reducer.minMax(),
-            geometry=bangalore_bbox,
-            scale=1000,
-            maxPixels=1e9
-        )
-        min_val = stats.get('LST_Day_1km_min')
-        max_val = stats.get('LST_Day_1km_max')
-        min_val = ee.Algorithms.If(min_val, min_val, 13000)
-        max_val = ee.Algorithms.If(max_val, max_val, 16500)
-        vis_params = {
-            'min': min_val,
-            'max': max_val,
-            'palette': [
-                "040274", "040281", "0502a3", "0502b8", "0502ce", "0502e6",
-                "0602ff", "235cb1", "307ef3", "269db1", "30c8e2", "32d3ef",
-                "3be285", "3ff38f", "86e26f", "3ae237", "b5e22e", "d6e21f",
-                "fff705", "ffd611", "ffb613", "ff8b13", "ff6e08", "ff500d",
-                "ff0000", "de0101", "c21301", "a71001", "911001"
-            ]
-        }
-        map_id = image.getMapId(vis_params)
-        tile_url = map_id['tile_fetcher'].url_format
-        real_tile_url = tile_url.replace('{z}', str(z)).replace('{x}', str(x)).replace('{y}', str(y))
-        r = requests.get(real_tile_url)
-        return Response(r.content, content_type=r.headers.get('Content-Type', 'image/png'))
+        closed_year = year < datetime.date.today().year
+        if closed_year:
+            cache_key = DiskLRUCache.make_key(year, z, x, y, HEAT_PALETTE_ID)
+        else:
+            # The current year's mean still changes, so its tiles are only reused under the map ID that drew them
+            cache_key = DiskLRUCache.make_key(heat_tile_urls.get(year), z, x, y)
+
+        # Revalidation can be answered from the index without touching the file
+        etag = heat_tile_store.etag(cache_key)
+        if etag and request.if_none_match.contains(etag):
+            return heat_tile_response(None, etag, closed_year)
+        content_type = 'image/png'
+        cached = heat_tile_store.stream(cache_key)
+        if cached is None:
+            # Identical concurrent tile requests (e.g. many users loading the same map) share one
+            # fetch, which streams the tile to disk; each of them then streams it from there
+            status, content_type, error_body, _ = tile_flight.do(
+                cache_key,
+                lambda: fetch_heat_tile(year, z, x, y, cache_key)
+            )
+            if status != 200:
+                return Response(error_body, status=status, content_type=content_type)
+            cached = heat_tile_store.stream(cache_key)
+            if cached is None:
+                # Evicted before it could be read: the store is far too small for the traffic
+                return jsonify({'error': 'Tile cache overflow, retry'}), 503, {'Retry-After': '1'}
+        chunks, etag = cached
+        return heat_tile_response(chunks, etag, closed_year, content_type)
+    except resilience.CircuitOpenError as e:
+        # Let the map retry the tile later instead of queueing behind a failing upstream
+        return jsonify({'error': str(e)}), 503, {'Retry-After': str(int(resilience.BREAKER_RESET_SECONDS))}
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/analyze', methods=['POST'])
-def analyze_location():
+# Zone classification based on ACTUAL TEMPERATURE
+# Updated thresholds to match the visual heat map color gradient (upper bounds of zones 1-4)
+ZONE_THRESHOLDS = [26, 27.5, 28.7, 29.5]
+ZONES = {
+    1: {  # Cool - water bodies, deep shade, well-vegetated areas (Blue: 20-26°C)
+        "name": "Blue Zone (Cool Areas)",
+        "status": "✅ Healthy / Protected",
+        "color": "#0502ff",
+        "suggestions": [
+            "Preservation: Maintain the current state of this area.",
+            "Monitor Water Quality (if water body present).",
+            "Prevent Encroachment (no new construction).",
+            "Biodiversity Check (high ecological value)."
+        ]
+    },
+    2: {  # Comfortable - well-shaded urban areas (Cyan: 26-27.5°C)
+        "name": "Cyan Zone (Comfortable Urban Areas)",
+        "status": "🟢 Stable",
+        "color": "#30c8e2",
+        "suggestions": [
+            "Maintain Green Cover (protect existing trees).",
+            "Rainwater Harvesting (groundwater recharge)."
+        ]
+    },
+    3: {  # Warming - transition areas with sparse vegetation (Green: 27.5-28.7°C)
+        "name": "Green Zone (Transition Areas)",
+        "status": "⚠️ At Risk",
+        "color": "#3ae237",
+        "suggestions": [
+            "Canopy Upgrade (plant tall trees, not just grass).",
+            "Soil Moisture Retention (mulching, prevent drying)."
+        ]
+    },
+    4: {  # Hot - roads, dense residential, parking lots (Yellow/Orange: 28.7-29.5°C)
+        "name": "Yellow/Orange Zone (Warning Zone)",
+        "status": "🟠 Mitigation Required",
+        "color": "#ff8b13",
+        "suggestions": [
+            "Street Avenue Planting (trees along roads).",
+            "Cool Pavements (replace asphalt with permeable pavers).",
+            "Vertical Gardens (green walls on pillars/fences)."
+        ]
+    },
+    5: {  # Extreme heat - industrial, large roofs, highways (Red: >29.5°C)
+        "name": "Red Zone (Critical Heat Island)",
+        "status": "🚨 CRITICAL INTERVENTION",
+        "color": "#ff0000",
+        "suggestions": [
+            "Priority 1: Cool Roofing (paint black roofs white).",
+            "Priority 2: Miyawaki Forest (ultra-dense forest buffer if possible).",
+            "Priority 3: Mist Cooling Systems (for plazas where trees can't grow)."
+        ]
+    }
+}
+ZONE_EMOJI = {
+    1: '💧',
+    2: '🟦',
+    3: '🟩',
+    4: '🟨',
+    5: '🟥'
+}
+
+def classify_zones(temps_c):
+    """Vectorized zone lookup: array of °C (NaN = unknown) -> array of zone numbers (0 = unknown)."""
+    temps_c = np.asarray(temps_c, dtype=np.float64)
+    zones = np.digitize(temps_c, ZONE_THRESHOLDS) + 1
+    zones[np.isnan(temps_c)] = 0
+    return zones
+
+def classify_zone(temp_c):
+    """Return (zone, zone_info) for a temperature in °C, or (None, None) if unknown."""
+    if temp_c is None:
+        return None, None
+    zone = int(classify_zones([temp_c])[0])
+    return zone, ZONES[zone]
+
+def raw_lst_to_celsius(lst_value):
+    """Convert a raw MODIS LST value to Celsius (MODIS LST scale factor is 0.02)."""
+    if lst_value is None or lst_value <= 0:
+        return None
+    return lst_value * 0.02 - 273.15
+
+def sample_lst_raw_batch(year, points):
+    """Raw LST values for many (lat, lng) points: snapshot first, the rest in a single EE sampleRegions call."""
+    year = int(year)
+    values = [lst_store.lookup(year, lat, lng) for lat, lng in points]
+    missing = [i for i, v in enumerate(values) if v is None]
+    if missing:
+        if not lst_store.has_year(year):
+            lst_store.ingest_in_background(year)
+        features = ee.FeatureCollection([
+            ee.Feature(ee.Geometry.Point([points[i][1], points[i][0]]), {'idx': i})
+            for i in missing
+        ])
+        with resilience.guard('ee'), metrics.timed('ee_getinfo'):
+            samples = build_annual_lst_image(year).sampleRegions(
+                collection=features,
+                scale=1000,
+                geometries=False
+            ).getInfo()
+        # Masked pixels are dropped by sampleRegions and stay None
+        for feature in samples.get('features', []):
+            props = feature.get('properties', {})
+            values[props['idx']] = props.get('LST_Day_1km')
+    return values
+
+# Annual LST per (year, ~11 m point) in SQLite: closed years never change so they are kept forever,
+# the current year's partial mean only for a day
+LST_SERIES_FIRST_YEAR = 2001  # First full year of MODIS Terra LST
+LST_SERIES_CURRENT_YEAR_TTL = int(os.getenv('LST_SERIES_CURRENT_YEAR_TTL_SECONDS', 86400))
+LST_SERIES_GRID_DECIMALS = 4  # Cache key precision, ~11 m: well inside one ~1 km MODIS pixel
+lst_series_cache = LRUCache(
+    max_entries=int(os.getenv('LST_SERIES_CACHE_SIZE', 100000)),
+    store=SQLiteStore(
+        os.getenv('LST_SERIES_CACHE_DB', os.path.join(tempfile.gettempdir(), 'geocortex_lst_series.sqlite')),
+        table='annual_lst'
+    ),
+    name="LST series cache"
+)
+
+def sample_lst_series_raw(years, points):
+    """
+    Raw annual LST for every (point, year) as a len(points) x len(years) float
+    array (nan = no data). Snapshots and cached years are read locally; whatever
+    is left comes from one sampleRegions call on a band-per-year image.
+    """
+    current_year = datetime.date.today().year
+    grid = [(round(lat, LST_SERIES_GRID_DECIMALS), round(lng, LST_SERIES_GRID_DECIMALS)) for lat, lng in points]
+    raw = np.full((len(points), len(years)), np.nan)
+    missing = {}  # point index -> [year column, ...]
+    for i, (lat, lng) in enumerate(points):
+        for j, year in enumerate(years):
+            value = lst_store.lookup(year, lat, lng)
+            if value is None:
+                value = lst_series_cache.get(f"{year}:{grid[i][0]}:{grid[i][1]}", MISSING)
+            if value is MISSING:
+                missing.setdefault(i, []).append(j)
+            elif value is not None:
+                raw[i, j] = value
+
+    if missing:
+        fetch_years = sorted({years[j] for columns in missing.values() for j in columns})
+        features = ee.FeatureCollection([
+            ee.Feature(ee.Geometry.Point([points[i][1], points[i][0]]), {'idx': i})
+            for i in missing
+        ])
+        with resilience.guard('ee'), metrics.timed('ee_getinfo'):
+            samples = build_lst_series_image(fetch_years).sampleRegions(
+                collection=features,
+                scale=1000,
+                geometries=False
+            ).getInfo()
+        closed, current = [], []
+        for feature in samples.get('features', []):
+            props = feature.get('properties', {})
+            i = props['idx']
+            for j in missing[i]:
+                year = years[j]
+                value = props.get(f'LST_{year}')
+                value = value if value and value > LST_NODATA else None
+                # No data is remembered too, so empty pixels aren't re-fetched
+                (current if year >= current_year else closed).append((f"{year}:{grid[i][0]}:{grid[i][1]}", value))
+                if value is not None:
+                    raw[i, j] = value
+        # One SQLite transaction per lifetime rather than a commit per value
+        lst_series_cache.set_many(closed)
+        lst_series_cache.set_many(current, ttl=LST_SERIES_CURRENT_YEAR_TTL)
+    return raw
+
+def lst_series_stats(years, temps_c, baseline):
+    """
+    Per-point least-squares trend and anomalies for a points x years matrix of
+    °C (nan = no data); the fitted line is reported at the first year.
+    Anomalies are relative to the mean over the `baseline`
+    (start, end) years; z-scores use the baseline's standard deviation.
+    """
+    x = np.asarray(years, dtype=np.float64)[None, :]
+    valid = ~np.isnan(temps_c)
+    n = valid.sum(axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        x_mean = np.where(valid, x, 0).sum(axis=1) / n
+        y_mean = np.nansum(temps_c, axis=1) / n
+        dx = np.where(valid, x - x_mean[:, None], 0)
+        dy = np.where(valid, temps_c - y_mean[:, None], 0)
+        sxx = (dx * dx).sum(axis=1)
+        slope = (dx * dy).sum(axis=1) / sxx
+        syy = (dy * dy).sum(axis=1)
+        r_squared = np.where(syy > 0, (dx * dy).sum(axis=1) ** 2 / (sxx * syy), np.nan)
+        slope[n < 2] = np.nan
+
+        in_baseline = (x >= baseline[0]) & (x <= baseline[1]) & valid
+        base = np.where(in_baseline, temps_c, np.nan)
+        base_n = in_baseline.sum(axis=1)
+        base_mean = np.nansum(base, axis=1) / base_n
+        base_std = np.sqrt(np.nansum((base - base_mean[:, None]) ** 2, axis=1) / (base_n - 1))
+        anomalies = temps_c - base_mean[:, None]
+        z_scores = anomalies / base_std[:, None]
+    return {
+        'years_with_data': n,
+        'slope': slope,
+        'fitted_start': y_mean - slope * (x_mean - years[0]),
+        'r_squared': r_squared,
+        'baseline_mean': base_mean,
+        'baseline_std': base_std,
+        'anomalies': anomalies,
+        'z_scores': z_scores,
+    }
+
+# Reverse geocodes are cached per ~11 m grid cell (Nominatim zoom 18 is building level)
+GEOCODE_GRID_DECIMALS = 4
+geocode_cache = LRUCache(
+    max_entries=int(os.getenv('GEOCODE_CACHE_SIZE', 10000)),
+    ttl=int(os.getenv('GEOCODE_CACHE_TTL_DAYS', 30)) * 86400,
+    store=SQLiteStore(os.getenv('GEOCODE_CACHE_DB'), table='reverse_geocode') if os.getenv('GEOCODE_CACHE_DB') else None,
+    name="reverse geocode cache"
+)
+
+def fetch_location_name(lat, lng):
+    """Call Nominatim and build a location name from address components. Raises on failure."""
+    geocode_url = f"https://nominatim.openstreetmap.org/reverse?format=json&lat={lat}&lon={lng}&zoom=18&addressdetails=1"
+    geocode_headers = {'User-Agent': 'GeoCortex/1.0'}
+    geocode_response = http_client.get(geocode_url, upstream='nominatim', headers=geocode_headers, timeout=5)
+    geocode_response.raise_for_status()
+    geocode_data = geocode_response.json()
+    address = geocode_data.get('address', {})
+    # Build location name from address components
+    parts = []
+    if 'neighbourhood' in address:
+        parts.append(address['neighbourhood'])
+    elif 'suburb' in address:
+        parts.append(address['suburb'])
+    elif 'road' in address:
+        parts.append(address['road'])
+    if 'city' in address:
+        parts.append(address['city'])
+    elif 'town' in address:
+        parts.append(address['town'])
+    if 'state' in address:
+        parts.append(address['state'])
+    location_name = ', '.join(parts) if parts else geocode_data.get('display_name', 'Unknown Location')
+    print(f"Reverse geocoded location: {location_name}")
+    return location_name
+
+def reverse_geocode(lat, lng):
+    """Get actual location name using reverse geocoding, cached per grid cell."""
     try:
-        data = request.json
-        lat = data.get('lat')
-        lng = data.get('lng')
+        cell_lat = round(float(lat), GEOCODE_GRID_DECIMALS)
+        cell_lng = round(float(lng), GEOCODE_GRID_DECIMALS)
+        cell = f"{cell_lat:.{GEOCODE_GRID_DECIMALS}f},{cell_lng:.{GEOCODE_GRID_DECIMALS}f}"
+        # Concurrent misses for the same cell share one Nominatim request; failures are not cached
+        return geocode_cache.get_or_load(cell, lambda: fetch_location_name(cell_lat, cell_lng))
+    except Exception as geo_error:
+        print(f"Geocoding error: {geo_error}")
+        return "Unknown Location"
 
-        # Get actual location name using reverse geocoding
-        location_name = "Unknown Location"
-        try:
-            geocode_url = f"https://nominatim.openstreetmap.org/reverse?format=json&lat={lat}&lon={lng}&zoom=18&addressdetails=1"
-            geocode_headers = {'User-Agent': 'GeoCortex/1.0'}
-            geocode_response = requests.get(geocode_url, headers=geocode_headers, timeout=5)
-            if geocode_response.ok:
-                geocode_data = geocode_response.json()
-                address = geocode_data.get('address', {})
-                # Build location name from address components
-                parts = []
-                if 'neighbourhood' in address:
-                    parts.append(address['neighbourhood'])
-                elif 'suburb' in address:
-                    parts.append(address['suburb'])
-                elif 'road' in address:
-                    parts.append(address['road'])
-                if 'city' in address:
-                    parts.append(address['city'])
-                elif 'town' in address:
-                    parts.append(address['town'])
-                if 'state' in address:
-                    parts.append(address['state'])
-                location_name = ', '.join(parts) if parts else geocode_data.get('display_name', 'Unknown Location')
-                print(f"Reverse geocoded location: {location_name}")
-        except Exception as geo_error:
-            print(f"Geocoding error: {geo_error}")
+def build_heat_analysis_prompt(location_name, lat, lng, temperature_c, zone_info):
+    """Enhanced prompt with actual location name and zone suggestions."""
+    return (
+        f"Analyze the urban heat island effect at {location_name} (coordinates: {lat}, {lng}).\n\n"
+        f"Land Surface Temperature: {round(temperature_c, 2) if temperature_c is not None else 'N/A'}°C\n"
+        + (
+            f"\nGeoCortex Zone: {zone_info['name']}\nStatus: {zone_info['status']}\nAI Suggestions for this zone:\n- "
+            + "\n- ".join(zone_info['suggestions']) + "\n" if zone_info else ""
+        )
+        + "\nPlease provide:\n"
+        "1. Current temperature analysis.\n"
+        "2. What is causing heat in this region (urban factors, land use, etc.).\n"
+        "3. Three specific actionable ways to reduce heat in this region.\n\n"
+        "Keep the response concise and specific to this location."
+    )
 
-        temperature_c = None
-        try:
-            # Get temperature from Earth Engine for the given point
-            point = ee.Geometry.Point([lng, lat])
-            
-            # Get the same image collection used for visualization
-            image = ee.ImageCollection('MODIS/061/MOD11A2') \
-                .filter(ee.Filter.date(f'{data.get("year", 2025)}-01-01', f'{data.get("year", 2025)}-12-31')) \
-                .select('LST_Day_1km') \
-                .mean()
-            
-            # Sample temperature at the clicked point
-            lst_value = image.sample(point, scale=1000).first().get('LST_Day_1km').getInfo()
-            
-            if lst_value is not None and lst_value > 0:
-                # Convert to Celsius (MODIS LST scale factor is 0.02)
-                temperature_k = lst_value * 0.02
-                temperature_c = temperature_k - 273.15
-                
-                print(f"LST raw value: {lst_value}, Kelvin: {temperature_k}, Celsius: {temperature_c}")
-        except Exception as ee_error:
-            print(f"Earth Engine error: {ee_error}")
+HEAT_ANALYSIS_GRID_DECIMALS = 4  # Cache key precision, ~11 m: the prompt quotes the coordinates
+
+def heat_analysis_key_parts(location_name, lat, lng, zone, temperature_c):
+    """Cache key for heat analysis narratives (coordinates rounded to ~11 m, temperature to 0.1 °C)."""
+    return [
+        'heat_analysis', location_name,
+        round(float(lat), HEAT_ANALYSIS_GRID_DECIMALS), round(float(lng), HEAT_ANALYSIS_GRID_DECIMALS),
+        zone, llm_client.round_or_none(temperature_c)
+    ]
 
+def format_ai_content(ai_content):
+    """Format AI content for frontend display: bold, emojis, spacing."""
+    # Convert markdown bold to HTML bold
+    ai_content = re.sub(r'\*\*(.*?)\*\*', r'<b>\1</b>', ai_content)
+    # Add spacing after numbered points
+    ai_content = re.sub(r'(\d+\.)', r'<br><span style="font-size:1.1rem;font-weight:bold;">\1</span>', ai_content)
+    # Add emoji for each section if not present
+    ai_content = re.sub(r'1\.', '1️⃣.', ai_content)
+    ai_content = re.sub(r'2\.', '2️⃣.', ai_content)
+    ai_content = re.sub(r'3\.', '3️⃣.', ai_content)
+    # Add extra spacing between sections
+    ai_content = ai_content.replace('<br><span', '<br><br><span')
+    # Ensure bullet points are spaced
+    ai_content = ai_content.replace('<br>\t*', '<br>&nbsp;&nbsp;• ')
+    # Remove double <br>
+    ai_content = re.sub(r'(<br>\s*){2,}', '<br><br>', ai_content)
+    return ai_content
+
+def build_zone_insights_html(zone, zone_info, ai_content):
+    """Compose a styled HTML block for AI Insights with color indicator."""
+    zone_label = zone_info['name'] if zone_info else 'Unknown Zone'
+    zone_status = zone_info['status'] if zone_info else ''
+    zone_color = zone_info.get('color', '#888888') if zone_info else '#888888'
+    zone_color_emoji = ZONE_EMOJI.get(zone, '❓')
+    return f"""
+        <div style='font-size:1.1rem;margin-bottom:0.5rem;'><b>Zone:</b> <span style='font-size:1.15rem;'>{zone_color_emoji} {zone_label}</span> <span style='display:inline-block;width:20px;height:20px;background:{zone_color};border-radius:50%;margin-left:8px;vertical-align:middle;border:2px solid #fff;'></span></div>
+        <div style='font-size:1rem;margin-bottom:0.5rem;'><b>Status:</b> {zone_status}</div>
+        <div style='font-size:1rem;line-height:1.7;margin-top:0.5rem;white-space:pre-line;'>{ai_content}</div>
+        """
+
+def sse_event(event, payload):
+    """Format one Server-Sent Events message with a JSON payload."""
+    return f"event: {event}\ndata: {json.dumps(payload)}\n\n"
+
+def sse_response(events):
+    return Response(events, mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'  # Don't let proxies buffer the stream
+    })
+
+# Per-branch deadlines for the concurrent upstream fetches
+GEOCODE_DEADLINE = float(os.getenv('GEOCODE_DEADLINE_SECONDS', 6))
+EE_SAMPLE_DEADLINE = float(os.getenv('EE_SAMPLE_DEADLINE_SECONDS', 15))
+EE_REDUCE_DEADLINE = float(os.getenv('EE_REDUCE_DEADLINE_SECONDS', 30))
+
+def build_heat_analysis_context(data):
+    """Everything /api/analyze needs before the LLM call: location, temperature, zone and prompt."""
+    lat = data.get('lat')
+    lng = data.get('lng')
+
+    def fetch_temperature():
+        # Sample temperature at the clicked point from the same annual mean used for visualization
+        lst_value = sample_lst_raw(data.get("year", 2025), lat, lng)
+        print(f"LST raw value: {lst_value}")
+        return raw_lst_to_celsius(lst_value)
+
+    # Geocoding and the EE sample are independent; overlap them and join before the LLM step
+    upstream = fan_out({
+        'location_name': Branch(lambda: reverse_geocode(lat, lng), GEOCODE_DEADLINE, "Unknown Location"),
+        'temperature_c': Branch(fetch_temperature, EE_SAMPLE_DEADLINE, None)
+    }, label="analyze")
+    location_name = upstream['location_name']
+    temperature_c = upstream['temperature_c']
+
+    zone, zone_info = classify_zone(temperature_c)
+    return {
+        'lat': lat,
+        'lng': lng,
+        'location_name': location_name,
+        'temperature_c': temperature_c,
+        'zone': zone,
+        'zone_info': zone_info,
+        'prompt': build_heat_analysis_prompt(location_name, lat, lng, temperature_c, zone_info),
+        'key_parts': heat_analysis_key_parts(location_name, lat, lng, zone, temperature_c)
+    }
+
+def heat_analysis_summary(ctx):
+    """Numeric part of the /api/analyze response."""
+    zone_info = ctx['zone_info']
+    temperature_c = ctx['temperature_c']
+    return {
+        'temperature': round(temperature_c, 2) if temperature_c is not None else None,
+        'coordinates': {'lat': ctx['lat'], 'lng': ctx['lng']},
+        'location_name': ctx['location_name'],
+        'zone': zone_info['name'] if zone_info else 'Unknown Zone',
+        'zone_status': zone_info['status'] if zone_info else ''
+    }
+
+@app.route('/api/analyze', methods=['POST'])
+def analyze_location():
+    try:
         # Use Groq API key from environment only
         api_key = os.getenv("GROQ_API_KEY")
         if not api_key:
             raise RuntimeError("GROQ_API_KEY is not set in the environment. Please add it to your .env file.")
-        client = Groq(api_key=api_key)
-        
-        # Zone classification based on ACTUAL TEMPERATURE
-        # Updated thresholds to match the visual heat map color gradient
-        zone = None
-        zone_info = None
-        temp_c = temperature_c if temperature_c is not None else None
-        
-        if temp_c is not None:
-            if temp_c < 26:  # Cool - water bodies, deep shade, well-vegetated areas (Blue: 20-26°C)
-                zone = 1
-                zone_info = {
-                    "name": "Blue Zone (Cool Areas)",
-                    "status": "✅ Healthy / Protected",
-                    "color": "#0502ff",
-                    "suggestions": [
-                        "Preservation: Maintain the current state of this area.",
-                        "Monitor Water Quality (if water body present).",
-                        "Prevent Encroachment (no new construction).",
-                        "Biodiversity Check (high ecological value)."
-                    ]
-                }
-            elif temp_c < 27.5:  # Comfortable - well-shaded urban areas (Cyan: 26-27.5°C)
-                zone = 2
-                zone_info = {
-                    "name": "Cyan Zone (Comfortable Urban Areas)",
-                    "status": "🟢 Stable",
-                    "color": "#30c8e2",
-                    "suggestions": [
-                        "Maintain Green Cover (protect existing trees).",
-                        "Rainwater Harvesting (groundwater recharge)."
-                    ]
-                }
-            elif temp_c < 28.7:  # Warming - transition areas with sparse vegetation (Green: 27.5-28.7°C)
-                zone = 3
-                zone_info = {
-                    "name": "Green Zone (Transition Areas)",
-                    "status": "⚠️ At Risk",
-                    "color": "#3ae237",
-                    "suggestions": [
-                        "Canopy Upgrade (plant tall trees, not just grass).",
-                        "Soil Moisture Retention (mulching, prevent drying)."
-                    ]
-                }
-            elif temp_c < 29.5:  # Hot - roads, dense residential, parking lots (Yellow/Orange: 28.7-29.5°C)
-                zone = 4
-                zone_info = {
-                    "name": "Yellow/Orange Zone (Warning Zone)",
-                    "status": "🟠 Mitigation Required",
-                    "color": "#ff8b13",
-                    "suggestions": [
-                        "Street Avenue Planting (trees along roads).",
-                        "Cool Pavements (replace asphalt with permeable pavers).",
-                        "Vertical Gardens (green walls on pillars/fences)."
-                    ]
-                }
-            else:  # Extreme heat - industrial, large roofs, highways (Red: >29.5°C)
-                zone = 5
-                zone_info = {
-                    "name": "Red Zone (Critical Heat Island)",
-                    "status": "🚨 CRITICAL INTERVENTION",
-                    "color": "#ff0000",
-                    "suggestions": [
-                        "Priority 1: Cool Roofing (paint black roofs white).",
-                        "Priority 2: Miyawaki Forest (ultra-dense forest buffer if possible).",
-                        "Priority 3: Mist Cooling Systems (for plazas where trees can't grow)."
-                    ]
-                }
-        # Enhanced prompt with actual location name and zone suggestions
-        prompt = (
-            f"Analyze the urban heat island effect at {location_name} (coordinates: {lat}, {lng}).\n\n"
-            f"Land Surface Temperature: {round(temperature_c, 2) if temperature_c is not None else 'N/A'}°C\n"
-            + (
-                f"\nGeoCortex Zone: {zone_info['name']}\nStatus: {zone_info['status']}\nAI Suggestions for this zone:\n- "
-                + "\n- ".join(zone_info['suggestions']) + "\n" if zone_info else ""
-            )
-            + "\nPlease provide:\n"
-            "1. Current temperature analysis.\n"
-            "2. What is causing heat in this region (urban factors, land use, etc.).\n"
-            "3. Three specific actionable ways to reduce heat in this region.\n\n"
-            "Keep the response concise and specific to this location."
-        )
-        
-        response = client.chat.completions.create(
-            messages=[{"role": "user", "content": prompt}],
+
+        data = request.json or {}
+        try:
+            lat, lng = parse_coordinates(data.get('lat'), data.get('lng'))
+            data = dict(data, year=parse_lst_year(data.get('year', 2025)), lat=lat, lng=lng)
+        except (TypeError, ValueError) as e:
+            return jsonify({'error': str(e)}), 400
+        ctx = build_heat_analysis_context(data)
+        ai_content = llm_client.complete(
+            ctx['prompt'],
             model="llama-3.3-70b-versatile",
+            api_key=api_key,
+            key_parts=ctx['key_parts']
         )
 
         # Format AI Insights with emojis, font sizes, and bold for frontend display
-        # Format AI content: bold, emojis, spacing
-        import re
-        ai_content = response.choices[0].message.content
-        # Convert markdown bold to HTML bold
-        ai_content = re.sub(r'\*\*(.*?)\*\*', r'<b>\1</b>', ai_content)
-        # Add spacing after numbered points
-        ai_content = re.sub(r'(\d+\.)', r'<br><span style="font-size:1.1rem;font-weight:bold;">\1</span>', ai_content)
-        # Add emoji for each section if not present
-        ai_content = re.sub(r'1\.', '1️⃣.', ai_content)
-        ai_content = re.sub(r'2\.', '2️⃣.', ai_content)
-        ai_content = re.sub(r'3\.', '3️⃣.', ai_content)
-        # Add extra spacing between sections
-        ai_content = ai_content.replace('<br><span', '<br><br><span')
-        # Ensure bullet points are spaced
-        ai_content = ai_content.replace('<br>\t*', '<br>&nbsp;&nbsp;• ')
-        # Remove double <br>
-        ai_content = re.sub(r'(<br>\s*){2,}', '<br><br>', ai_content)
-        zone_label = zone_info['name'] if zone_info else 'Unknown Zone'
-        zone_status = zone_info['status'] if zone_info else ''
-        zone_color = zone_info.get('color', '#888888') if zone_info else '#888888'
-        zone_color_emoji = {
-            1: '💧',
-            2: '🟦',
-            3: '🟩',
-            4: '🟨',
-            5: '🟥'
-        }.get(zone, '❓')
-        # Compose a styled HTML block for AI Insights with color indicator
-        ai_insights_html = f"""
-        <div style='font-size:1.1rem;margin-bottom:0.5rem;'><b>Zone:</b> <span style='font-size:1.15rem;'>{zone_color_emoji} {zone_label}</span> <span style='display:inline-block;width:20px;height:20px;background:{zone_color};border-radius:50%;margin-left:8px;vertical-align:middle;border:2px solid #fff;'></span></div>
-        <div style='font-size:1rem;margin-bottom:0.5rem;'><b>Status:</b> {zone_status}</div>
-        <div style='font-size:1rem;line-height:1.7;margin-top:0.5rem;white-space:pre-line;'>{ai_content}</div>
-        """
+        ai_content = format_ai_content(ai_content)
+        ai_insights_html = build_zone_insights_html(ctx['zone'], ctx['zone_info'], ai_content)
+        return jsonify({'analysis': ai_insights_html, **heat_analysis_summary(ctx)})
+    except Exception as e:
+        print(f"Error in analyze_location: {e}")
+        import traceback
+        traceback.print_exc()
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/analyze/stream', methods=['POST'])
+def analyze_location_stream():
+    """
+    SSE variant of /api/analyze. Emits `result` with the numeric analysis first,
+    then `token` events as the LLM writes, then `done` with the formatted HTML.
+    """
+    api_key = os.getenv("GROQ_API_KEY")
+    if not api_key:
+        return jsonify({'error': 'GROQ_API_KEY is not set in the environment. Please add it to your .env file.'}), 500
+    data = request.json or {}
+    try:
+        lat, lng = parse_coordinates(data.get('lat'), data.get('lng'))
+        data = dict(data, year=parse_lst_year(data.get('year', 2025)), lat=lat, lng=lng)
+    except (TypeError, ValueError) as e:
+        return jsonify({'error': str(e)}), 400
+
+    def generate():
+        try:
+            ctx = build_heat_analysis_context(data)
+            yield sse_event('result', heat_analysis_summary(ctx))
+            parts = []
+            for delta in llm_client.stream_complete(
+                ctx['prompt'],
+                model="llama-3.3-70b-versatile",
+                api_key=api_key,
+                key_parts=ctx['key_parts']
+            ):
+                parts.append(delta)
+                yield sse_event('token', {'text': delta})
+            # The regex formatting needs the whole text, so it is applied once at the end
+            ai_content = format_ai_content(''.join(parts))
+            yield sse_event('done', {
+                'analysis': build_zone_insights_html(ctx['zone'], ctx['zone_info'], ai_content)
+            })
+        except Exception as e:
+            print(f"Error in analyze_location_stream: {e}")
+            yield sse_event('error', {'error': str(e)})
+
+    return sse_response(generate())
+
+MAX_BATCH_POINTS = int(os.getenv('MAX_BATCH_POINTS', 1000))
+BATCH_LLM_WORKERS = int(os.getenv('BATCH_LLM_WORKERS', 4))
+
+@app.route('/api/analyze/batch', methods=['POST'])
+def analyze_batch():
+    """
+    Analyze many points at once: temperatures come from one EE request and zones from
+    one vectorized pass. Results are streamed back as NDJSON, one line per point.
+    Body: {"points": [{"lat", "lng"}, ...], "year": 2025, "narrative": false}
+    """
+    try:
+        data = request.json or {}
+        raw_points = data.get('points') or []
+        narrative = bool(data.get('narrative', False))
+        try:
+            year = parse_lst_year(data.get('year', 2025))
+        except (TypeError, ValueError) as e:
+            return jsonify({'error': str(e)}), 400
+
+        if not raw_points:
+            return jsonify({'error': 'points required'}), 400
+        if len(raw_points) > MAX_BATCH_POINTS:
+            return jsonify({'error': f'At most {MAX_BATCH_POINTS} points per batch'}), 400
+        try:
+            points = [parse_coordinates(p['lat'], p['lng']) for p in raw_points]
+        except (KeyError, TypeError, ValueError):
+            return jsonify({'error': 'Each point needs numeric lat and lng'}), 400
+
+        api_key = os.getenv("GROQ_API_KEY")
+        if narrative and not api_key:
+            return jsonify({'error': 'GROQ_API_KEY not set'}), 500
+
+        print(f"[DEBUG] Batch analysis of {len(points)} points for {year}")
+        lst_values = sample_lst_raw_batch(year, points)
+        raw = np.array([v if v is not None else np.nan for v in lst_values], dtype=np.float64)
+        temps_c = np.where(raw > 0, raw * 0.02 - 273.15, np.nan)
+        zones = classify_zones(temps_c)
+
+        def base_result(i):
+            lat, lng = points[i]
+            zone_info = ZONES.get(int(zones[i]))
+            return {
+                'index': i,
+                'coordinates': {'lat': lat, 'lng': lng},
+                'temperature': None if np.isnan(temps_c[i]) else round(float(temps_c[i]), 2),
+                'zone': zone_info['name'] if zone_info else 'Unknown Zone',
+                'zone_status': zone_info['status'] if zone_info else ''
+            }
+
+        def with_narrative(i):
+            result = base_result(i)
+            lat, lng = points[i]
+            zone = int(zones[i])
+            zone_info = ZONES.get(zone)
+            temperature_c = None if np.isnan(temps_c[i]) else float(temps_c[i])
+            try:
+                location_name = reverse_geocode(lat, lng)
+                prompt = build_heat_analysis_prompt(location_name, lat, lng, temperature_c, zone_info)
+                ai_content = llm_client.complete(
+                    prompt,
+                    model="llama-3.3-70b-versatile",
+                    api_key=api_key,
+                    key_parts=heat_analysis_key_parts(location_name, lat, lng, zone, temperature_c)
+                )
+                ai_content = format_ai_content(ai_content)
+                result['location_name'] = location_name
+                result['analysis'] = build_zone_insights_html(zone, zone_info, ai_content)
+            except Exception as e:
+                result['analysis_error'] = str(e)
+            return result
+
+        def generate():
+            if not narrative:
+                for i in range(len(points)):
+                    yield json.dumps(base_result(i)) + '\n'
+                return
+            # LLM narratives are the slow part; emit each line as soon as its completion lands
+            with ThreadPoolExecutor(max_workers=BATCH_LLM_WORKERS) as pool:
+                futures = [pool.submit(with_narrative, i) for i in range(len(points))]
+                for future in as_completed(futures):
+                    yield json.dumps(future.result()) + '\n'
+
+        return Response(generate(), mimetype='application/x-ndjson')
+    except Exception as e:
+        print(f"Error in analyze_batch: {e}")
+        import traceback
+        traceback.print_exc()
+        return jsonify({'error': str(e)}), 500
+
+MAX_TIMESERIES_POINTS = int(os.getenv('MAX_TIMESERIES_POINTS', 200))
+
+def rounded_or_none(value, digits):
+    return None if value is None or not np.isfinite(value) else round(float(value), digits)
+
+@app.route('/api/lst/timeseries', methods=['POST'])
+def lst_timeseries():
+    """
+    Annual mean LST from start_year to end_year for one point or many, with a
+    linear trend and anomalies per point. All years missing from the local
+    stores are fetched in a single Earth Engine request.
+    Body: {"lat", "lng"} or {"points": [{"lat", "lng"}, ...]}, plus optional
+    "start_year", "end_year" and "baseline": [start, end] for the anomaly reference.
+    """
+    try:
+        data = request.json or {}
+        raw_points = data.get('points') or ([data] if data.get('lat') is not None else [])
+        if not raw_points:
+            return jsonify({'error': 'lat/lng or points required'}), 400
+        if len(raw_points) > MAX_TIMESERIES_POINTS:
+            return jsonify({'error': f'At most {MAX_TIMESERIES_POINTS} points per request'}), 400
+        try:
+            points = [(float(p['lat']), float(p['lng'])) for p in raw_points]
+            current_year = datetime.date.today().year
+            start_year = int(data.get('start_year', LST_SERIES_FIRST_YEAR))
+            end_year = int(data.get('end_year', current_year - 1))
+            baseline = [int(y) for y in data.get('baseline', [start_year, end_year])]
+        except (KeyError, TypeError, ValueError):
+            return jsonify({'error': 'Points need numeric lat and lng; years must be integers'}), 400
+        if not LST_SERIES_FIRST_YEAR <= start_year <= end_year <= current_year:
+            return jsonify({'error': f'Years must satisfy {LST_SERIES_FIRST_YEAR} <= start_year <= end_year <= {current_year}'}), 400
+        if len(baseline) != 2 or baseline[0] > baseline[1]:
+            return jsonify({'error': 'baseline must be [start, end]'}), 400
+
+        years = list(range(start_year, end_year + 1))
+        print(f"[DEBUG] LST time series {start_year}-{end_year} for {len(points)} points")
+        raw = sample_lst_series_raw(years, points)
+        temps_c = np.where(raw > 0, raw * 0.02 - 273.15, np.nan)
+        stats = lst_series_stats(years, temps_c, baseline)
+
+        results = []
+        for i, (lat, lng) in enumerate(points):
+            series = [{
+                'year': year,
+                'temperature': rounded_or_none(temps_c[i, j], 2),
+                'anomaly': rounded_or_none(stats['anomalies'][i, j], 2),
+                'z_score': rounded_or_none(stats['z_scores'][i, j], 2),
+                'partial': year == current_year,
+            } for j, year in enumerate(years)]
+            measured = [entry for entry in series if entry['temperature'] is not None]
+            slope = stats['slope'][i]
+            results.append({
+                'coordinates': {'lat': lat, 'lng': lng},
+                'series': series,
+                'trend': {
+                    'slope_c_per_year': rounded_or_none(slope, 4),
+                    'slope_c_per_decade': rounded_or_none(slope * 10, 3),
+                    'fitted_start_c': rounded_or_none(stats['fitted_start'][i], 2),
+                    'r_squared': rounded_or_none(stats['r_squared'][i], 3),
+                    'years_with_data': int(stats['years_with_data'][i]),
+                },
+                'anomalies': {
+                    'baseline': baseline,
+                    'baseline_mean_c': rounded_or_none(stats['baseline_mean'][i], 2),
+                    'baseline_std_c': rounded_or_none(stats['baseline_std'][i], 3),
+                    'warmest': max(measured, key=lambda e: e['temperature'])['year'] if measured else None,
+                    'coolest': min(measured, key=lambda e: e['temperature'])['year'] if measured else None,
+                    'latest_anomaly_c': measured[-1]['anomaly'] if measured else None,
+                },
+            })
+
+        return jsonify({'start_year': start_year, 'end_year': end_year, 'results': results})
+    except Exception as e:
+        print(f"Error in lst_timeseries: {e}")
+        import traceback
+        traceback.print_exc()
+        return jsonify({'error': str(e)}), 500
+
+MAX_PORTFOLIO_SITES = int(os.getenv('MAX_PORTFOLIO_SITES', 1000))
+
+@app.route('/api/solar/portfolio', methods=['POST'])
+def solar_portfolio():
+    """
+    Rooftop solar assessment for a portfolio of buildings, streamed as NDJSON:
+    one progress line per site as its building insights arrive, then a final
+    line with the ranked table and portfolio totals.
+    Body: {"sites": [{"lat", "lng", "id"?}, ...]}
+    """
+    data = request.json or {}
+    raw_sites = data.get('sites') or []
+    if not raw_sites:
+        return jsonify({'error': 'sites required'}), 400
+    if len(raw_sites) > MAX_PORTFOLIO_SITES:
+        return jsonify({'error': f'At most {MAX_PORTFOLIO_SITES} sites per portfolio'}), 400
+    try:
+        sites = [dict(s, lat=float(s['lat']), lng=float(s['lng'])) for s in raw_sites]
+    except (KeyError, TypeError, ValueError):
+        return jsonify({'error': 'Each site needs numeric lat and lng'}), 400
+
+    solar_api_key = os.getenv('GOOGLE_SOLAR_API_KEY')
+    if not solar_api_key:
+        return jsonify({'error': 'GOOGLE_SOLAR_API_KEY not set'}), 500
+
+    print(f"[DEBUG] Solar portfolio analysis of {len(sites)} sites")
+
+    def generate():
+        try:
+            for event in analyze_solar_portfolio(sites, solar_api_key):
+                yield json.dumps(event) + '\n'
+        except Exception as e:
+            print(f"Error in solar_portfolio: {e}")
+            yield json.dumps({'type': 'error', 'error': str(e)}) + '\n'
+
+    return Response(generate(), mimetype='application/x-ndjson')
+
+MAX_REPORT_SITES = int(os.getenv('MAX_REPORT_SITES', 200))
+REPORT_CHUNK_BYTES = 64 * 1024
+
+def temp_file_response(path, mimetype, headers):
+    """
+    Stream a temp file in chunks and remove it when the response is closed, which
+    the WSGI server does whether the body was sent, cut off, or never read at all.
+    """
+    try:
+        f = open(path, 'rb')
+    except OSError:
+        os.remove(path)
+        raise
+
+    def cleanup():
+        f.close()
+        os.remove(path)
+
+    try:
+        response = Response(
+            iter(lambda: f.read(REPORT_CHUNK_BYTES), b''),
+            mimetype=mimetype,
+            headers=dict(headers, **{'Content-Length': str(os.fstat(f.fileno()).st_size)})
+        )
+    except BaseException:
+        cleanup()
+        raise
+    response.call_on_close(cleanup)
+    return response
+
+@app.route('/api/solar/report/batch', methods=['POST'])
+def solar_batch_report():
+    """
+    Portfolio handout: one PDF with a page per site, or a ZIP with one PDF per site.
+    Body: {"sites": [{"lat", "lng", "id"?}, ...], "bundle": "pdf" | "zip"}
+    """
+    data = request.json or {}
+    raw_sites = data.get('sites') or []
+    bundle = data.get('bundle', 'pdf')
+    if not raw_sites:
+        return jsonify({'error': 'sites required'}), 400
+    if len(raw_sites) > MAX_REPORT_SITES:
+        return jsonify({'error': f'At most {MAX_REPORT_SITES} sites per report'}), 400
+    if bundle not in ('pdf', 'zip'):
+        return jsonify({'error': 'bundle must be "pdf" or "zip"'}), 400
+    try:
+        sites = [dict(s, lat=float(s['lat']), lng=float(s['lng'])) for s in raw_sites]
+    except (KeyError, TypeError, ValueError):
+        return jsonify({'error': 'Each site needs numeric lat and lng'}), 400
+
+    solar_api_key = os.getenv('GOOGLE_SOLAR_API_KEY')
+    if not solar_api_key:
+        return jsonify({'error': 'GOOGLE_SOLAR_API_KEY not set'}), 500
+
+    try:
+        print(f"[DEBUG] Rendering {bundle} report for {len(sites)} sites")
+        path = build_batch_report(sites, solar_api_key, bundle=bundle)
+    except TimeoutError as e:
+        print(f"Error in solar_batch_report: {e}")
+        return jsonify({'error': str(e)}), 504
+    except Exception as e:
+        print(f"Error in solar_batch_report: {e}")
+        return jsonify({'error': str(e)}), 500
+
+    filename = f"geocortex_solar_reports.{bundle}"
+    return temp_file_response(
+        path,
+        'application/pdf' if bundle == 'pdf' else 'application/zip',
+        {'Content-Disposition': f'attachment; filename="{filename}"'}
+    )
+
+MAX_SENSITIVITY_SCENARIOS = int(os.getenv('MAX_SENSITIVITY_SCENARIOS', 200000))
+
+def parse_axis(spec, default, limit=MAX_SENSITIVITY_SCENARIOS):
+    """
+    A sweep axis is a list of values, {"start", "stop", "steps"} (inclusive), or a single number.
+    Sizes are checked against `limit` before anything is allocated; raises ValueError on bad input.
+    """
+    if spec is None:
+        return np.array([default], dtype=np.float64)
+    if isinstance(spec, dict):
+        steps = spec.get('steps', 10)
+        if isinstance(steps, bool) or not isinstance(steps, (int, float)) or not math.isfinite(steps) or steps != int(steps):
+            raise ValueError('steps must be an integer')
+        if not 1 <= steps <= limit:
+            raise ValueError(f'steps must be between 1 and {limit}')
+        start, stop = float(spec['start']), float(spec['stop'])
+        if not (math.isfinite(start) and math.isfinite(stop)):
+            raise ValueError('start and stop must be finite')
+        return np.linspace(start, stop, int(steps))
+    if isinstance(spec, (int, float)) and not isinstance(spec, bool):
+        values = [spec]
+    elif isinstance(spec, list):
+        if not 1 <= len(spec) <= limit:
+            raise ValueError(f'axis must have between 1 and {limit} values')
+        values = spec
+    else:
+        raise ValueError('axis must be a number, a list or {start, stop, steps}')
+    values = np.array([float(v) for v in values], dtype=np.float64)
+    if not np.isfinite(values).all():
+        raise ValueError('axis values must be finite')
+    return values
+
+def finite_or_none(values, digits):
+    """Round an array to nested lists for JSON, with inf/nan (never pays back) as null."""
+    rounded = np.round(values, digits).astype(object)
+    rounded[~np.isfinite(values)] = None
+    return rounded.tolist()
+
+@app.route('/api/solar/sensitivity', methods=['POST'])
+def solar_sensitivity():
+    """
+    Financial sensitivity surface for one roof: break-even, NPV and lifetime CO₂
+    over every combination of panel count, tariff, panel cost and degradation.
+    Body: {"lat", "lng"} (or "energy_per_panel_kwh"), plus optional axes
+    "panel_counts", "tariffs", "panel_costs", "degradations", and scalars
+    "years", "discount_rate".
+    """
+    try:
+        data = request.json or {}
+        simulated = False
+        potential = {}
+        if data.get('energy_per_panel_kwh') is not None:
+            energy_per_panel = float(data['energy_per_panel_kwh'])
+        elif data.get('lat') is not None and data.get('lng') is not None:
+            solar_api_key = os.getenv('GOOGLE_SOLAR_API_KEY')
+            if not solar_api_key:
+                return jsonify({'error': 'GOOGLE_SOLAR_API_KEY not set'}), 500
+            potential, simulated = fetch_site_potential(float(data['lat']), float(data['lng']), solar_api_key)
+            panels = potential.get('maxArrayPanelsCount', 0)
+            if not panels:
+                return jsonify({'error': 'No usable roof area at this location'}), 404
+            energy_per_panel = potential.get('yearlyEnergyDcKwh', 0) / panels
+        else:
+            return jsonify({'error': 'lat/lng or energy_per_panel_kwh required'}), 400
+
+        try:
+            axes = {
+                'panel_counts': parse_axis(data.get('panel_counts'), potential.get('maxArrayPanelsCount', 20)),
+                'tariffs': parse_axis(data.get('tariffs'), TARIFF_INR_PER_KWH),
+                'panel_costs': parse_axis(data.get('panel_costs'), PANEL_COST_INR),
+                'degradations': parse_axis(data.get('degradations'), PANEL_DEGRADATION),
+            }
+            years = int(data.get('years', SYSTEM_LIFETIME_YEARS))
+            discount_rate = float(data.get('discount_rate', DISCOUNT_RATE))
+        except (KeyError, TypeError, ValueError) as e:
+            return jsonify({'error': 'Axes must be numbers, lists of numbers or {start, stop, steps}', 'details': str(e)}), 400
+        # Outside these ranges the closed-form model divides by zero or returns nonsense
+        degradations = axes['degradations']
+        if not ((degradations >= 0) & (degradations < 1)).all():
+            return jsonify({'error': 'degradations must be at least 0 and below 1'}), 400
+        if years < 1:
+            return jsonify({'error': 'years must be at least 1'}), 400
+        if not (math.isfinite(discount_rate) and discount_rate >= 0):
+            return jsonify({'error': 'discount_rate must be a non-negative number'}), 400
+        axes['panel_counts'] = np.round(axes['panel_counts'])
+
+        scenarios = int(np.prod([a.size for a in axes.values()]))
+        if scenarios > MAX_SENSITIVITY_SCENARIOS:
+            return jsonify({'error': f'At most {MAX_SENSITIVITY_SCENARIOS} scenarios per request'}), 400
+
+        surface = sensitivity_surface(energy_per_panel, years=years, discount_rate=discount_rate, **axes)
         return jsonify({
-            'analysis': ai_insights_html,
-            'temperature': round(temperature_c, 2) if temperature_c is not None else None,
-            'coordinates': {'lat': lat, 'lng': lng},
-            'location_name': location_name,
-            'zone': zone_label,
-            'zone_status': zone_status
+            'energy_per_panel_kwh': round(energy_per_panel, 2),
+            'simulated': simulated,
+            'years': years,
+            'discount_rate': discount_rate,
+            'axes': {name: values.tolist() for name, values in axes.items()},
+            'axis_order': list(axes),
+            'scenarios': scenarios,
+            'breakeven_years': finite_or_none(surface['breakeven_years'], 2),
+            'npv': finite_or_none(surface['npv'], 0),
+            'lifetime_co2_kg': finite_or_none(surface['lifetime_co2_kg'], 1),
         })
     except Exception as e:
-        print(f"Error in analyze_location: {e}")
+        print(f"Error in solar_sensitivity: {e}")
         import traceback
         traceback.print_exc()
         return jsonify({'error': str(e)}), 500
@@ -410,172 +1142,299 @@ def serve():
     return jsonify({"status": "ok", "service": "GeoCortex API"})
 
 
+def build_chatbot_context(data):
+    """Predict LST for the question's location/year and compose the Groq prompt."""
+    question = data.get('question')
+    lat = data.get('lat')
+    lng = data.get('lng')
+    year = data.get('year', 2030)
+    trees = data.get('trees', 0)
+
+    # Predict LST for the given year and location; future years start from the latest complete year
+    try:
+        temperature_c = raw_lst_to_celsius(sample_lst_raw(min(year, datetime.date.today().year - 1), lat, lng))
+    except Exception as e:
+        temperature_c = None
+
+    # Simulate tree planting impact (simple model: each tree reduces LST by 0.05°C)
+    tree_impact = trees * 0.05
+    predicted_lst = temperature_c - tree_impact if temperature_c is not None else None
+
+    # Compose prompt for Groq API
+    prompt = (
+        f"User question: {question}\n"
+        f"Location: ({lat}, {lng})\n"
+        f"Year: {year}\n"
+        f"Predicted LST (before trees): {round(temperature_c,2) if temperature_c is not None else 'N/A'}°C\n"
+        f"Number of trees to plant: {trees}\n"
+        f"Predicted LST (after trees): {round(predicted_lst,2) if predicted_lst is not None else 'N/A'}°C\n"
+        "Answer the user's question using the above data, Google Earth Engine prediction, and explain the impact of tree planting on LST."
+    )
+    return {
+        'prompt': prompt,
+        'key_parts': [
+            'chatbot', llm_client.normalize_prompt(question).lower(),
+            round(float(lat), 3), round(float(lng), 3), year, trees,
+            llm_client.round_or_none(temperature_c)
+        ],
+        'summary': {
+            'predicted_lst': round(predicted_lst,2) if predicted_lst is not None else None,
+            'temperature_c': round(temperature_c,2) if temperature_c is not None else None
+        }
+    }
+
 # Chatbot endpoint for AI consultant
 @app.route('/api/chatbot', methods=['POST'])
 def chatbot():
     try:
         data = request.json
-        question = data.get('question')
-        lat = data.get('lat')
-        lng = data.get('lng')
-        year = data.get('year', 2030)
-        trees = data.get('trees', 0)
-
-        if not question or lat is None or lng is None:
+        if not data.get('question') or data.get('lat') is None or data.get('lng') is None:
             return jsonify({'error': 'Question, lat, and lng required'}), 400
-
-        # Predict LST for the given year and location
-        point = ee.Geometry.Point([lng, lat])
-        image = ee.ImageCollection('MODIS/061/MOD11A2') \
-            .filter(ee.Filter.date(f'{year}-01-01', f'{year}-12-31')) \
-            .select('LST_Day_1km') \
-            .mean()
         try:
-            lst_value = image.sample(point, scale=1000).first().get('LST_Day_1km').getInfo()
-            if lst_value is not None and lst_value > 0:
-                temperature_k = lst_value * 0.02
-                temperature_c = temperature_k - 273.15
-            else:
-                temperature_c = None
-        except Exception as e:
-            temperature_c = None
-
-        # Simulate tree planting impact (simple model: each tree reduces LST by 0.05°C)
-        tree_impact = trees * 0.05
-        predicted_lst = temperature_c - tree_impact if temperature_c is not None else None
-
-        # Compose prompt for Groq API
-        prompt = (
-            f"User question: {question}\n"
-            f"Location: ({lat}, {lng})\n"
-            f"Year: {year}\n"
-            f"Predicted LST (before trees): {round(temperature_c,2) if temperature_c is not None else 'N/A'}°C\n"
-            f"Number of trees to plant: {trees}\n"
-            f"Predicted LST (after trees): {round(predicted_lst,2) if predicted_lst is not None else 'N/A'}°C\n"
-            "Answer the user's question using the above data, Google Earth Engine prediction, and explain the impact of tree planting on LST."
-        )
+            data = dict(data, year=parse_lst_year(data.get('year', 2030), future_ok=True))
+        except (TypeError, ValueError) as e:
+            return jsonify({'error': str(e)}), 400
 
         api_key = os.getenv("GROQ_API_KEY")
         if not api_key:
             return jsonify({'error': 'GROQ_API_KEY not set'}), 500
-        client = Groq(api_key=api_key)
-        response = client.chat.completions.create(
-            messages=[{"role": "user", "content": prompt}],
+
+        ctx = build_chatbot_context(data)
+        answer = llm_client.complete(
+            ctx['prompt'],
             model="llama-3.1-8b-instant",
+            api_key=api_key,
+            key_parts=ctx['key_parts']
         )
-        answer = response.choices[0].message.content
-        return jsonify({
-            'answer': answer,
-            'predicted_lst': round(predicted_lst,2) if predicted_lst is not None else None,
-            'temperature_c': round(temperature_c,2) if temperature_c is not None else None
-        })
+        return jsonify({'answer': answer, **ctx['summary']})
     except Exception as e:
         import traceback
         traceback.print_exc()
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/chatbot/stream', methods=['POST'])
+def chatbot_stream():
+    """SSE variant of /api/chatbot: `result` (predicted LST), then `token` events, then `done`."""
+    data = request.json
+    if not data or not data.get('question') or data.get('lat') is None or data.get('lng') is None:
+        return jsonify({'error': 'Question, lat, and lng required'}), 400
+    try:
+        data = dict(data, year=parse_lst_year(data.get('year', 2030), future_ok=True))
+    except (TypeError, ValueError) as e:
+        return jsonify({'error': str(e)}), 400
+    api_key = os.getenv("GROQ_API_KEY")
+    if not api_key:
+        return jsonify({'error': 'GROQ_API_KEY not set'}), 500
+
+    def generate():
+        try:
+            ctx = build_chatbot_context(data)
+            yield sse_event('result', ctx['summary'])
+            parts = []
+            for delta in llm_client.stream_complete(
+                ctx['prompt'],
+                model="llama-3.1-8b-instant",
+                api_key=api_key,
+                key_parts=ctx['key_parts']
+            ):
+                parts.append(delta)
+                yield sse_event('token', {'text': delta})
+            yield sse_event('done', {'answer': ''.join(parts)})
+        except Exception as e:
+            print(f"Error in chatbot_stream: {e}")
+            yield sse_event('error', {'error': str(e)})
+
+    return sse_response(generate())
+
+# ESA WorldCover v200 class codes
+WORLDCOVER_CLASSES = {
+    10: 'tree',
+    20: 'shrubland',
+    30: 'grassland',
+    40: 'cropland',
+    50: 'built',
+    60: 'bare',
+    70: 'snow',
+    80: 'water',
+    90: 'wetland',
+    95: 'mangroves',
+    100: 'moss'
+}
+PLANNING_LST_YEAR = 2023 # Use 2023 for stability or current year
+PLANNING_RADIUS_M = 5000
+
+def fetch_regional_lst_stats(lat, lng, lst_year=PLANNING_LST_YEAR, radius_m=PLANNING_RADIUS_M):
+    """
+    Mean LST (°C) around a point, overall and per WorldCover class, in a single EE round trip.
+    Returns (regional_mean, {class_code: mean}); classes absent from the region are omitted.
+    """
+    region_geometry = ee.Geometry.Point([lng, lat]).buffer(radius_m)
+
+    # Load LST (annual mean), converted to Celsius
+    lst_image = build_annual_lst_image(lst_year).multiply(0.02).subtract(273.15)
+
+    # Load Land Cover (ESA WorldCover 2021)
+    landcover = ee.ImageCollection("ESA/WorldCover/v200").first().rename('landcover')
+
+    regional_stats = lst_image.reduceRegion(
+        reducer=ee.Reducer.mean(),
+        geometry=region_geometry,
+        scale=1000,
+        maxPixels=1e9
+    )
+    # Mean LST grouped by land-cover class (band 1 of the stacked image)
+    class_stats = lst_image.addBands(landcover).reduceRegion(
+        reducer=ee.Reducer.mean().group(groupField=1, groupName='landcover'),
+        geometry=region_geometry,
+        scale=1000,
+        maxPixels=1e9
+    )
+    with resilience.guard('ee'), metrics.timed('ee_getinfo'):
+        result = ee.Dictionary({
+            'region': regional_stats.get('LST_Day_1km'),
+            'groups': class_stats.get('groups')
+        }).getInfo()
+
+    class_means = {
+        int(group['landcover']): group['mean']
+        for group in result.get('groups') or []
+        if group.get('mean') is not None
+    }
+    return result.get('region'), class_means
+
+# Regional stats per ~1 km grid cell, persisted in SQLite (fill a city with `python factor_store.py`)
+factor_store = RegionalFactorStore(
+    os.getenv('FACTOR_STORE_DB', os.path.join(tempfile.gettempdir(), 'geocortex_factors.sqlite')),
+    compute=fetch_regional_lst_stats
+)
+
+# In-memory integral images over the city for arbitrary-radius queries
+regional_engines = RegionalStatsEngines(lst_store.directory, HEAT_BBOX)
+MIN_PLANNING_RADIUS_M = 500
+MAX_PLANNING_RADIUS_M = 20000
+MAX_PLANNING_RADII = 8
+
+def clamp_radius(value):
+    """Analysis radius in metres, clamped to the supported range. Raises ValueError if not a finite number."""
+    if isinstance(value, bool):
+        raise ValueError('radius must be a number')
+    radius = float(value)
+    if not math.isfinite(radius):
+        raise ValueError('radius must be finite')
+    return int(max(MIN_PLANNING_RADIUS_M, min(radius, MAX_PLANNING_RADIUS_M)))
+
+def get_regional_stats(lat, lng, radius_m=PLANNING_RADIUS_M):
+    """Regional LST stats for a circle: local integral images when loaded, else the per-cell factor store."""
+    engine = regional_engines.get(PLANNING_LST_YEAR)
+    if engine is not None and engine.covers(lat, lng, radius_m):
+        regional_mean, class_means = engine.circle_stats(lat, lng, radius_m)
+        if regional_mean is not None:
+            return regional_mean, class_means
+    return factor_store.get(lat, lng, PLANNING_LST_YEAR, radius_m)
+
+def planning_factors(regional_mean_temp, class_means):
+    """Apply the missing-data fallbacks and express class means relative to the regional average."""
+    tree_mean = class_means.get(10)
+    water_mean = class_means.get(80)
+    built_mean = class_means.get(50)
+
+    # Fallbacks if data is missing (e.g., no water in 5km)
+    if regional_mean_temp is None: regional_mean_temp = 30.0
+    if tree_mean is None: tree_mean = regional_mean_temp - 2.0
+    if water_mean is None: water_mean = regional_mean_temp - 3.0
+    if built_mean is None: built_mean = regional_mean_temp + 2.0
+
+    print(f"[DEBUG] Stats: Region={regional_mean_temp:.2f}, Tree={tree_mean:.2f}, Water={water_mean:.2f}, Built={built_mean:.2f}")
+
+    # Calculate Factors (Impact relative to regional average)
+    # Negative = Cooling, Positive = Heating
+    return {
+        'regional_mean_temp': regional_mean_temp,
+        'tree': tree_mean - regional_mean_temp,
+        'water': water_mean - regional_mean_temp,
+        'built': built_mean - regional_mean_temp,
+        # Observed factor for every WorldCover class present in the region
+        'landcover': {
+            WORLDCOVER_CLASSES.get(code, str(code)): mean - regional_mean_temp
+            for code, mean in class_means.items()
+        }
+    }
+
+# Planning asset -> (land-cover factor it takes after, relative effectiveness)
+PLANNING_ASSETS = {
+    'Tree': ('tree', 1.0),
+    'Plant': ('tree', 0.5),  # Plants are less effective than trees
+    'Pond': ('water', 1.0),
+    'Building': ('built', 1.0),
+    'Road': ('built', 1.2),  # Roads often hotter than general built-up (asphalt)
+}
+# One asset != one 1 km pixel, so each contributes a tenth of its class factor (visible, but not a whole forest)
+PLANNING_ASSET_WEIGHT = 0.1
+# Cap on the total change of a layout (°C)
+PLANNING_MAX_CHANGE_C = 5.0
+
+def planning_asset_map(factors):
+    """Local factor (°C relative to the regional mean) for each asset type."""
+    return {label: factors[factor] * scale for label, (factor, scale) in PLANNING_ASSETS.items()}
+
 @app.route('/api/planning/analyze', methods=['POST'])
 def planning_analysis():
     print("[DEBUG] /api/planning/analyze endpoint called")
     try:
-        data = request.json
-        lat = data.get('lat')
-        lng = data.get('lng')
+        data = request.json or {}
+        try:
+            lat, lng = parse_coordinates(data.get('lat'), data.get('lng'))
+        except (TypeError, ValueError) as e:
+            return jsonify({"error": "Valid coordinates required", "details": str(e)}), 400
         # items = [{'label': 'Tree', ...}, ...]
         items = data.get('items', [])
-        
-        if not lat or not lng:
-            return jsonify({"error": "Coordinates required"}), 400
-            
-        # 1. Get Regional Stats from Earth Engine (5km radius)
-        print(f"[DEBUG] Fetching regional stats for {lat}, {lng}")
-        region_geometry = ee.Geometry.Point([lng, lat]).buffer(5000) # 5km radius
-        
-        # Load LST (Latest available year)
-        lst_year = 2023 # Use 2023 for stability or current year
-        lst_image = ee.ImageCollection('MODIS/061/MOD11A2') \
-            .filter(ee.Filter.date(f'{lst_year}-01-01', f'{lst_year}-12-31')) \
-            .select('LST_Day_1km') \
-            .mean() \
-            .multiply(0.02).subtract(273.15) # Convert to Celsius
-            
-        # Load Land Cover (ESA WorldCover 2021)
-        # Class mapping: 10=Tree, 50=Built-up, 80=Water
-        landcover = ee.ImageCollection("ESA/WorldCover/v200").first()
-        
-        # Calculate Mean LST for the whole region
-        regional_stats = lst_image.reduceRegion(
-            reducer=ee.Reducer.mean(),
-            geometry=region_geometry,
-            scale=1000,
-            maxPixels=1e9
-        )
-        regional_mean_temp = regional_stats.get('LST_Day_1km').getInfo()
-        
-        # Calculate Mean LST for specific masks
-        def get_class_mean(class_val):
-            mask = landcover.eq(class_val)
-            masked_lst = lst_image.updateMask(mask)
-            stats = masked_lst.reduceRegion(
-                reducer=ee.Reducer.mean(),
-                geometry=region_geometry,
-                scale=1000,
-                maxPixels=1e9
-            )
-            return stats.get('LST_Day_1km').getInfo()
 
-        tree_mean = get_class_mean(10)
-        water_mean = get_class_mean(80)
-        built_mean = get_class_mean(50)
-        
-        # Fallbacks if data is missing (e.g., no water in 5km)
-        if regional_mean_temp is None: regional_mean_temp = 30.0
-        if tree_mean is None: tree_mean = regional_mean_temp - 2.0
-        if water_mean is None: water_mean = regional_mean_temp - 3.0
-        if built_mean is None: built_mean = regional_mean_temp + 2.0
-        
-        # Calculate Factors (Impact relative to regional average)
-        # Negative = Cooling, Positive = Heating
-        tree_factor = tree_mean - regional_mean_temp
-        water_factor = water_mean - regional_mean_temp
-        built_factor = built_mean - regional_mean_temp
+        # Radius of the analysis circle, plus optional extra radii to compare (metres)
+        extra_radii = data.get('radii') or []
+        if not isinstance(extra_radii, list) or len(extra_radii) > MAX_PLANNING_RADII:
+            return jsonify({"error": f"radii must be a list of at most {MAX_PLANNING_RADII} numbers"}), 400
+        try:
+            radius_m = clamp_radius(data.get('radius', PLANNING_RADIUS_M))
+            radii = sorted({clamp_radius(r) for r in extra_radii} | {radius_m})
+        except (TypeError, ValueError):
+            return jsonify({"error": "radius and radii must be numbers (metres)"}), 400
+
+        # 1. Get Regional Stats (5km radius by default)
+        print(f"[DEBUG] Fetching regional stats for {lat}, {lng} at radii {radii}")
+        stats = fan_out({
+            r: Branch(lambda r=r: get_regional_stats(lat, lng, r), EE_REDUCE_DEADLINE, (None, {}))
+            for r in radii
+        }, label="planning stats")
+        factors_by_radius = {r: planning_factors(*stats[r]) for r in radii}
+        factors = factors_by_radius[radius_m]
+        regional_mean_temp = factors['regional_mean_temp']
+        tree_factor = factors['tree']
+        water_factor = factors['water']
+        built_factor = factors['built']
         
         # Add slight damping for single assets (we aren't planting a whole forest pixel)
         # But we want to show the POTENTIAL of that asset type in this region.
         # Let's use the full factor as "Local Efficiency" but scale slightly for total project impact if count is low.
         
-        print(f"[DEBUG] Stats: Region={regional_mean_temp:.2f}, Tree={tree_mean:.2f}, Water={water_mean:.2f}, Built={built_mean:.2f}")
-        
         # 2. Calculate Total Impact
         total_impact = 0
         item_details = {}
         
-        asset_map = {
-            'Tree': tree_factor,
-            'Plant': tree_factor * 0.5, # Plants are less effective than trees
-            'Pond': water_factor,
-            'Building': built_factor,
-            'Road': built_factor * 1.2 # Roads often hotter than general built-up (asphalt)
-        }
+        asset_map = planning_asset_map(factors)
         
         for item in items:
             itype = item.get('label')
             if not itype: continue
             
-            # Use the calculated local factor
-            # We scale it down because one asset != one 1km pixel
-            # But we accumulated it. Let's say 1 asset provides 0.05% of the pixel's potential differentiation?
-            # Or just sum them up up to a cap?
-            # Let's use a weight of 0.1 for visibility.
-            
+            # Use the calculated local factor, scaled down because one asset != one 1km pixel
             raw_factor = asset_map.get(itype, 0)
-            impact = raw_factor * 0.1 
+            impact = raw_factor * PLANNING_ASSET_WEIGHT
             
             total_impact += impact
             item_details[itype] = item_details.get(itype, 0) + 1
             
         # Cap the total change to reasonable limits (e.g., +/- 5 degrees C)
-        total_impact = max(min(total_impact, 5.0), -5.0)
+        total_impact = max(min(total_impact, PLANNING_MAX_CHANGE_C), -PLANNING_MAX_CHANGE_C)
         projected_temp_c = regional_mean_temp + total_impact
         
         # 3. Generate AI Report via Groq
@@ -586,7 +1445,6 @@ def planning_analysis():
             print("[ERROR] GROQ_API_KEY is not set in environment variables")
             ai_insights = "AI Insights unavailable: GROQ_API_KEY is not configured. Please add it to your .env file."
         else:
-            client = Groq(api_key=api_key)
             item_summary = ", ".join([f"{v} {k}(s)" for k, v in item_details.items()])
             
             prompt = (
@@ -604,11 +1462,17 @@ def planning_analysis():
             )
             
             try:
-                response = client.chat.completions.create(
-                    messages=[{"role": "user", "content": prompt}],
+                ai_insights = llm_client.complete(
+                    prompt,
                     model="llama-3.3-70b-versatile",
+                    api_key=api_key,
+                    key_parts=[
+                        'planning', round(float(lat), 3), round(float(lng), 3),
+                        round(regional_mean_temp, 1), round(tree_factor, 1),
+                        round(water_factor, 1), round(built_factor, 1),
+                        sorted(item_details.items())
+                    ]
                 )
-                ai_insights = response.choices[0].message.content
             except Exception as e:
                 print(f"[ERROR] Groq API Error: {e}")
                 import traceback
@@ -624,6 +1488,20 @@ def planning_analysis():
                 "water": round(water_factor, 2),
                 "built": round(built_factor, 2)
             },
+            "radius_m": radius_m,
+            "landcover_factors": {k: round(v, 2) for k, v in factors['landcover'].items()},
+            "radius_comparison": [
+                {
+                    "radius_m": r,
+                    "base_temp": round(f['regional_mean_temp'], 2),
+                    "factors": {
+                        "tree": round(f['tree'], 2),
+                        "water": round(f['water'], 2),
+                        "built": round(f['built'], 2)
+                    }
+                }
+                for r, f in factors_by_radius.items()
+            ],
             "item_summary": item_details,
             "ai_report_text": ai_insights
         })
@@ -633,6 +1511,263 @@ def planning_analysis():
         traceback.print_exc()
         return jsonify({'error': str(e)}), 500
 
+# Rough installed cost per asset (INR) for ranking sweep layouts; override per request with "costs"
+PLANNING_ASSET_COSTS_INR = {'Tree': 3000, 'Plant': 500, 'Pond': 150000, 'Building': 0, 'Road': 0}
+MAX_SWEEP_SCENARIOS = int(os.getenv('MAX_SWEEP_SCENARIOS', 200000))
+MAX_SWEEP_MATCHES = 50
+
+def planning_sweep_surface(asset_map, axes, costs):
+    """
+    Net change (°C, capped) and cost of every layout in the grid spanned by
+    `axes` ({asset: counts}), one array dimension per asset in axes order.
+    """
+    ndim = len(axes)
+    net_change = np.zeros([1] * ndim)
+    cost = np.zeros([1] * ndim)
+    for dim, (label, counts) in enumerate(axes.items()):
+        shape = [1] * ndim
+        shape[dim] = counts.size
+        counts = counts.reshape(shape)
+        net_change = net_change + counts * (asset_map[label] * PLANNING_ASSET_WEIGHT)
+        cost = cost + counts * costs[label]
+    return np.clip(net_change, -PLANNING_MAX_CHANGE_C, PLANNING_MAX_CHANGE_C), cost
+
+@app.route('/api/planning/sweep', methods=['POST'])
+def planning_sweep():
+    """
+    What-if analysis over many asset layouts at once. Regional factors are
+    looked up once; every combination of asset counts is scored in one NumPy
+    pass with the same weights and cap as /api/planning/analyze (no LLM call).
+    Body: {"lat", "lng", "radius"?, "axes": {"Tree": {start, stop, steps} | [counts] | n, ...},
+           "target"? (°C, e.g. -1), "costs"? ({asset: INR}), "limit"?}
+    """
+    try:
+        data = request.json or {}
+        try:
+            lat, lng = parse_coordinates(data.get('lat'), data.get('lng'))
+        except (TypeError, ValueError) as e:
+            return jsonify({'error': 'Valid coordinates required', 'details': str(e)}), 400
+        spec = data.get('axes') or {}
+        unknown = [label for label in spec if label not in PLANNING_ASSETS] if isinstance(spec, dict) else [spec]
+        if not spec or unknown:
+            return jsonify({'error': f'axes must map asset types ({", ".join(PLANNING_ASSETS)}) to counts'}), 400
+        try:
+            radius_m = clamp_radius(data.get('radius', PLANNING_RADIUS_M))
+            axes = {
+                label: np.unique(np.maximum(np.round(parse_axis(values, 0, limit=MAX_SWEEP_SCENARIOS)), 0))
+                for label, values in spec.items()
+            }
+            costs = {**PLANNING_ASSET_COSTS_INR, **{k: float(v) for k, v in (data.get('costs') or {}).items()}}
+            target = float(data['target']) if data.get('target') is not None else None
+            limit = max(1, min(int(data.get('limit', 10)), MAX_SWEEP_MATCHES))
+        except (KeyError, TypeError, ValueError) as e:
+            return jsonify({'error': 'Axes must be numbers, lists of numbers or {start, stop, steps}', 'details': str(e)}), 400
+
+        scenarios = int(np.prod([a.size for a in axes.values()]))
+        if scenarios > MAX_SWEEP_SCENARIOS:
+            return jsonify({'error': f'At most {MAX_SWEEP_SCENARIOS} scenarios per request'}), 400
+
+        stats = fan_out({
+            radius_m: Branch(lambda: get_regional_stats(lat, lng, radius_m), EE_REDUCE_DEADLINE, (None, {}))
+        }, label="planning sweep stats")
+        factors = planning_factors(*stats[radius_m])
+        regional_mean_temp = factors['regional_mean_temp']
+        asset_map = planning_asset_map(factors)
+
+        net_change, cost = planning_sweep_surface(asset_map, axes, costs)
+        labels = list(axes)
+
+        def layout(flat_index):
+            index = np.unravel_index(flat_index, net_change.shape)
+            return {
+                'counts': {label: int(axes[label][i]) for label, i in zip(labels, index)},
+                'net_change': round(float(net_change[index]), 3),
+                'projected_temp': round(regional_mean_temp + float(net_change[index]), 2),
+                'cost_inr': round(float(cost[index]), 2),
+            }
+
+        result = {
+            'base_temp': round(regional_mean_temp, 2),
+            'radius_m': radius_m,
+            'factors': {k: round(factors[k], 2) for k in ('tree', 'water', 'built')},
+            'impact_per_asset': {label: round(asset_map[label] * PLANNING_ASSET_WEIGHT, 4) for label in labels},
+            'costs_inr': {label: costs[label] for label in labels},
+            'axes': {label: values.astype(int).tolist() for label, values in axes.items()},
+            'axis_order': labels,
+            'scenarios': scenarios,
+            'net_change': np.round(net_change, 3).tolist(),
+            'cost_inr': np.round(cost, 2).tolist(),
+            'coolest': layout(int(np.argmin(net_change))),
+        }
+        if target is not None:
+            # Layouts whose net change reaches the target, cheapest first (ties: more cooling, then fewer assets)
+            flat_change = net_change.ravel()
+            matches = np.flatnonzero(flat_change <= target)
+            total_assets = sum(
+                np.broadcast_to(values.reshape([-1 if d == dim else 1 for d in range(len(labels))]), net_change.shape)
+                for dim, values in enumerate(axes.values())
+            ).ravel()
+            order = matches[np.lexsort((total_assets[matches], flat_change[matches], cost.ravel()[matches]))]
+            result['target'] = target
+            result['layouts_meeting_target'] = int(matches.size)
+            result['cheapest'] = [layout(int(i)) for i in order[:limit]]
+        return jsonify(result)
+    except Exception as e:
+        print(f"Error in planning_sweep: {e}")
+        import traceback
+        traceback.print_exc()
+        return jsonify({'error': str(e)}), 500
+
+# Pollen forecasts are daily and spatially coarse: cache one answer per grid cell per forecast
+# day, expiring at local midnight (IST by default, the planning area's timezone)
+POLLEN_CELL_DEG = float(os.getenv('POLLEN_CELL_DEG', 0.05))  # ~5.5 km
+POLLEN_TZ = datetime.timezone(datetime.timedelta(hours=float(os.getenv('POLLEN_UTC_OFFSET_HOURS', 5.5))))
+MAX_POLLEN_BATCH = int(os.getenv('MAX_POLLEN_BATCH', 1000))
+POLLEN_BATCH_WORKERS = int(os.getenv('POLLEN_BATCH_WORKERS', 4))
+pollen_cache = LRUCache(max_entries=int(os.getenv('POLLEN_CACHE_SIZE', 5000)), name="pollen forecast cache")
+
+class UncacheableResponse(Exception):
+    """An upstream answer that must not be reused (upstream error or outage fallback)."""
+
+    def __init__(self, body, status):
+        super().__init__(body.get('error') or body.get('message'))
+        self.body = body
+        self.status = status
+
+def pollen_cell(lat, lng):
+    """Grid cell containing a point, and the cell centre the forecast is looked up at."""
+    row = math.floor(float(lat) / POLLEN_CELL_DEG)
+    col = math.floor(float(lng) / POLLEN_CELL_DEG)
+    return (row, col), (round((row + 0.5) * POLLEN_CELL_DEG, 5), round((col + 0.5) * POLLEN_CELL_DEG, 5))
+
+def seconds_until_local_midnight():
+    now = datetime.datetime.now(POLLEN_TZ)
+    midnight = datetime.datetime.combine(now.date() + datetime.timedelta(days=1), datetime.time(), tzinfo=POLLEN_TZ)
+    return max((midnight - now).total_seconds(), 1)
+
+def fetch_pollen_verdict(lat, lng, api_key):
+    """
+    Ask the Pollen API about grass pollen at a point and turn the answer into
+    the planting verdict. Returns the response body; raises UncacheableResponse
+    for answers that shouldn't be reused.
+    """
+    # Pollen API uses GET with query parameters, not POST
+    # Format: GET /v1/forecast:lookup?key=KEY&location.latitude=LAT&location.longitude=LNG&days=1
+    params = {
+        'key': api_key,
+        'location.latitude': lat,
+        'location.longitude': lng,
+        'days': 1,
+        'plantsDescription': True
+    }
+
+    url = "https://pollen.googleapis.com/v1/forecast:lookup"
+
+    print(f"[DEBUG] Checking pollen for {lat}, {lng}")
+    try:
+        response = http_client.get(url, upstream='pollen', params=params)
+    except http_client.UNAVAILABLE_ERRORS as e:
+        # Pollen service down, slow or circuit open - default to safe (allow planting)
+        print(f"[DEBUG] Pollen API unavailable: {e}")
+        raise UncacheableResponse({
+            'safe': True,
+            'level': 'Unknown',
+            'value': 0,
+            'message': 'Pollen data temporarily unavailable. Planting allowed.'
+        }, 200)
+
+    if not response.ok:
+        print(f"[DEBUG] Pollen API Error: {response.text}")
+
+        # Handle 400 errors (location not covered) gracefully
+        if response.status_code == 400:
+            try:
+                response.json()
+                # Location not covered - default to safe (allow planting)
+                return {
+                    'safe': True,
+                    'level': 'Unknown',
+                    'value': 0,
+                    'message': f'Pollen data unavailable for this location. Planting allowed.'
+                }
+            except ValueError:
+                pass
+
+        raise UncacheableResponse({'error': 'Failed to fetch pollen data', 'details': response.text}, response.status_code)
+
+    pollen_data = response.json()
+
+    # Extract Grass Pollen Index
+    # Response structure: dailyInfo[0] -> pollenTypeInfo -> list of types
+    # We look for code: "GRASS"
+
+    day_info = pollen_data.get('dailyInfo', [])
+    if not day_info:
+        return {'safe': True, 'message': 'No pollen data available for this location', 'level': 'Unknown'}
+
+    pollen_types = day_info[0].get('pollenTypeInfo', [])
+
+    # Try to find GRASS pollen first
+    grass_pollen = next((p for p in pollen_types if p.get('code') == 'GRASS'), None)
+
+    # Fallback: if no GRASS, try GRAMINALES (grasses)
+    if not grass_pollen:
+        grass_pollen = next((p for p in pollen_types if p.get('code') == 'GRAMINALES'), None)
+
+    if not grass_pollen:
+        # No grass pollen data at all - default to safe
+        return {'safe': True, 'message': 'No grass pollen data available for this location', 'level': 'Unknown'}
+
+    # Index info: value (0-5), category (Low, Moderate, High, Very High)
+    # UPI (Universal Pollen Index)
+    index_info = grass_pollen.get('indexInfo', {})
+    value = index_info.get('value')
+    category = index_info.get('category')
+
+    # Handle None values (no data for this season/location)
+    if value is None or category is None:
+        print(f"[DEBUG] Grass Pollen data exists but no index values (likely off-season)")
+        return {
+            'safe': True,
+            'level': 'Low',
+            'value': 0,
+            'message': 'Grass pollen levels are currently very low (off-season)'
+        }
+
+    print(f"[DEBUG] Grass Pollen: Value={value}, Category={category}")
+
+    # Logic: Safe if value < 3 (Low=0-2? Actually API usually 0-5 scale: 0-1 Low, 2 Moderate, 3 High, 4 Very High, 5 Extreme)
+    # User said "High" should be removed.
+    # Let's assume High(3), Very High(4), Extreme(5) are unsafe.
+    # Moderate(2) and Low(1,0) are safe.
+    # Adjust based on standard UPI if needed, but High is usually bad.
+    is_safe = value < 3
+
+    return {
+        'safe': is_safe,
+        'level': category,
+        'value': value,
+        'message': f"Grass Pollen Level is {category}"
+    }
+
+def pollen_verdict(lat, lng, api_key):
+    """Planting verdict for a point as (body, status), shared by every point in its grid cell today."""
+    cell, (cell_lat, cell_lng) = pollen_cell(lat, lng)
+    forecast_date = datetime.datetime.now(POLLEN_TZ).date().isoformat()
+    try:
+        body = pollen_cache.get_or_load(
+            f"{forecast_date}:{cell[0]}:{cell[1]}",
+            lambda: fetch_pollen_verdict(cell_lat, cell_lng, api_key),
+            ttl=seconds_until_local_midnight()
+        )
+        return body, 200
+    except UncacheableResponse as e:
+        return e.body, e.status
+
+def pollen_api_key():
+    api_key = os.getenv('GOOGLE_POLLEN_API_KEY')
+    return api_key.strip() if api_key else None
+
 @app.route('/api/check_pollen', methods=['POST'])
 def check_pollen():
     try:
@@ -643,114 +1778,135 @@ def check_pollen():
         if not lat or not lng:
             return jsonify({'error': 'Coordinates required'}), 400
 
-        api_key = os.getenv('GOOGLE_POLLEN_API_KEY')
+        api_key = pollen_api_key()
         if not api_key:
             # If key is missing, fail safe? Or block?
             # User specifically asked for this feature, so let's error if missing to alert dev.
             return jsonify({'error': 'Pollen API key not configured'}), 500
-            
-        api_key = api_key.strip()
 
-        # Pollen API uses GET with query parameters, not POST
-        # Format: GET /v1/forecast:lookup?key=KEY&location.latitude=LAT&location.longitude=LNG&days=1
-        params = {
-            'key': api_key,
-            'location.latitude': lat,
-            'location.longitude': lng,
-            'days': 1,
-            'plantsDescription': True
-        }
-        
-        url = "https://pollen.googleapis.com/v1/forecast:lookup"
-        
-        print(f"[DEBUG] Checking pollen for {lat}, {lng}")
-        response = requests.get(url, params=params)
-        
-        if not response.ok:
-            print(f"[DEBUG] Pollen API Error: {response.text}")
-            
-            # Handle 400 errors (location not covered) gracefully
-            if response.status_code == 400:
-                try:
-                    error_data = response.json()
-                    error_msg = error_data.get('error', {}).get('message', 'Location not covered')
-                    
-                    # Location not covered - default to safe (allow planting)
-                    return jsonify({
-                        'safe': True,
-                        'level': 'Unknown',
-                        'value': 0,
-                        'message': f'Pollen data unavailable for this location. Planting allowed.'
-                    })
-                except:
-                    pass
-            
-            return jsonify({'error': 'Failed to fetch pollen data', 'details': response.text}), response.status_code
-            
-        pollen_data = response.json()
-        
-        # Extract Grass Pollen Index
-        # Response structure: dailyInfo[0] -> pollenTypeInfo -> list of types
-        # We look for code: "GRASS"
-        
-        day_info = pollen_data.get('dailyInfo', [])
-        if not day_info:
-             return jsonify({'safe': True, 'message': 'No pollen data available for this location', 'level': 'Unknown'})
-             
-        pollen_types = day_info[0].get('pollenTypeInfo', [])
-        
-        # Try to find GRASS pollen first
-        grass_pollen = next((p for p in pollen_types if p.get('code') == 'GRASS'), None)
-        
-        # Fallback: if no GRASS, try GRAMINALES (grasses)
-        if not grass_pollen:
-            grass_pollen = next((p for p in pollen_types if p.get('code') == 'GRAMINALES'), None)
-        
-        if not grass_pollen:
-             # No grass pollen data at all - default to safe
-             return jsonify({'safe': True, 'message': 'No grass pollen data available for this location', 'level': 'Unknown'})
-        
-        # Index info: value (0-5), category (Low, Moderate, High, Very High)
-        # UPI (Universal Pollen Index)
-        index_info = grass_pollen.get('indexInfo', {})
-        value = index_info.get('value')
-        category = index_info.get('category')
-        
-        # Handle None values (no data for this season/location)
-        if value is None or category is None:
-            print(f"[DEBUG] Grass Pollen data exists but no index values (likely off-season)")
-            return jsonify({
-                'safe': True,
-                'level': 'Low',
-                'value': 0,
-                'message': 'Grass pollen levels are currently very low (off-season)'
-            })
-        
-        print(f"[DEBUG] Grass Pollen: Value={value}, Category={category}")
-        
-        # Logic: Safe if value < 3 (Low=0-2? Actually API usually 0-5 scale: 0-1 Low, 2 Moderate, 3 High, 4 Very High, 5 Extreme)
-        # User said "High" should be removed.
-        # Let's assume High(3), Very High(4), Extreme(5) are unsafe.
-        # Moderate(2) and Low(1,0) are safe.
-        # Adjust based on standard UPI if needed, but High is usually bad.
-        
+        body, status = pollen_verdict(lat, lng, api_key)
+        return jsonify(body), status
+
+    except Exception as e:
+        print(f"Error in check_pollen: {e}")
+        import traceback
+        traceback.print_exc()
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/check_pollen/batch', methods=['POST'])
+def check_pollen_batch():
+    """
+    Pollen verdicts for every placement in a planning layout. Placements are
+    grouped by forecast grid cell, so the upstream is called at most once per cell.
+    Body: {"items": [{"lat", "lng", "id"?}, ...]}
+    """
+    try:
+        data = request.json or {}
+        items = data.get('items') or []
+        if not items:
+            return jsonify({'error': 'items required'}), 400
+        if len(items) > MAX_POLLEN_BATCH:
+            return jsonify({'error': f'At most {MAX_POLLEN_BATCH} items per batch'}), 400
+        try:
+            points = [(float(item['lat']), float(item['lng'])) for item in items]
+        except (KeyError, TypeError, ValueError):
+            return jsonify({'error': 'Each item needs numeric lat and lng'}), 400
+
+        api_key = pollen_api_key()
+        if not api_key:
+            return jsonify({'error': 'Pollen API key not configured'}), 500
+
+        # One representative point per cell; pollen_verdict resolves it at the cell centre
+        cells = {}
+        for lat, lng in points:
+            cells.setdefault(pollen_cell(lat, lng)[0], (lat, lng))
+        with ThreadPoolExecutor(max_workers=POLLEN_BATCH_WORKERS) as pool:
+            # Each lookup runs in a copy of this request's context so it shares the time budget
+            futures = {
+                cell: pool.submit(contextvars.copy_context().run, pollen_verdict, lat, lng, api_key)
+                for cell, (lat, lng) in cells.items()
+            }
+            verdicts = {cell: future.result() for cell, future in futures.items()}
+
+        results = []
+        for i, (item, (lat, lng)) in enumerate(zip(items, points)):
+            body, status = verdicts[pollen_cell(lat, lng)[0]]
+            result = {'index': i, 'lat': lat, 'lng': lng, **body}
+            if 'id' in item:
+                result['id'] = item['id']
+            if status != 200:
+                result['status'] = status
+            results.append(result)
 
-        is_safe = value < 3 
-        
-        # Pollen check logic completed
         return jsonify({
-            'safe': is_safe,
-            'level': category,
-            'value': value,
-            'message': f"Grass Pollen Level is {category}"
+            'results': results,
+            'cells': len(cells),
+            'all_safe': all(r.get('safe', False) for r in results)
         })
-
     except Exception as e:
-        print(f"Error in check_pollen: {e}")
+        print(f"Error in check_pollen_batch: {e}")
         import traceback
         traceback.print_exc()
         return jsonify({'error': str(e)}), 500
 
+# Aerial View lookups per normalized address (and map location when the client sends it), in
+# memory and in SQLite. Entries expire well before the signed video URIs they contain do.
+AERIAL_VIEW_TTL = int(os.getenv('AERIAL_VIEW_CACHE_TTL_SECONDS', 3600))
+AERIAL_VIEW_PROCESSING_TTL = int(os.getenv('AERIAL_VIEW_PROCESSING_TTL_SECONDS', 600))
+AERIAL_VIEW_NOT_FOUND_TTL = int(os.getenv('AERIAL_VIEW_NOT_FOUND_TTL_SECONDS', 6 * 3600))
+AERIAL_VIEW_GRID_DECIMALS = 4  # Location key precision, ~11 m
+
+def aerial_view_ttl(result):
+    """Seconds left for a cached lookup: not-found and still-processing answers age differently."""
+    if result['status'] == 404:
+        lifetime = AERIAL_VIEW_NOT_FOUND_TTL
+    elif result['body'].get('state') == 'ACTIVE':
+        lifetime = AERIAL_VIEW_TTL
+    else:
+        lifetime = AERIAL_VIEW_PROCESSING_TTL
+    return lifetime - (time.time() - result['fetched_at'])
+
+aerial_view_cache = LRUCache(
+    max_entries=int(os.getenv('AERIAL_VIEW_CACHE_SIZE', 2000)),
+    ttl=aerial_view_ttl,
+    store=SQLiteStore(
+        os.getenv('AERIAL_VIEW_CACHE_DB', os.path.join(tempfile.gettempdir(), 'geocortex_aerial_view.sqlite')),
+        table='aerial_view'
+    ),
+    name="aerial view cache"
+)
+
+def normalize_address(address):
+    """Fold case, Unicode forms, punctuation and whitespace so spellings of one address share a key."""
+    folded = unicodedata.normalize('NFKC', address).casefold()
+    return re.sub(r'\s+', ' ', re.sub(r'[^\w\s]', ' ', folded)).strip()
+
+def fetch_aerial_view(address, api_key):
+    """Look up the Aerial View video for an address. Raises UncacheableResponse on errors other than not found."""
+    url = "https://aerialview.googleapis.com/v1/videos:lookupVideo"
+    params = {
+        'key': api_key,
+        'address': address
+    }
+
+    print(f"[DEBUG] Fetching Aerial View for: {address}")
+    response = http_client.get(url, upstream='aerial_view', params=params)
+
+    if not response.ok:
+        print(f"[ERROR] Aerial View API Error ({response.status_code}): {response.text}")
+        # Try to parse error response
+        try:
+            error_data = response.json()
+        except ValueError:
+            error_data = {'error': f'API request failed with status {response.status_code}', 'details': response.text}
+        if response.status_code != 404:
+            raise UncacheableResponse(error_data, response.status_code)
+        # No video for this address: remembered so the preview falls back without a round trip
+        return {'status': 404, 'body': error_data, 'fetched_at': time.time()}
+
+    print(f"[DEBUG] Aerial View API Success")
+    return {'status': 200, 'body': response.json(), 'fetched_at': time.time()}
+
 @app.route('/api/aerial_view', methods=['GET'])
 def aerial_view():
     try:
@@ -765,27 +1921,30 @@ def aerial_view():
             return jsonify({'error': 'Aerial View API key not configured on server'}), 500
             
         api_key = api_key.strip()
-        
-        url = "https://aerialview.googleapis.com/v1/videos:lookupVideo"
-        params = {
-            'key': api_key,
-            'address': address
-        }
-        
-        print(f"[DEBUG] Fetching Aerial View for: {address}")
-        response = requests.get(url, params=params)
-        
-        if not response.ok:
-            print(f"[ERROR] Aerial View API Error ({response.status_code}): {response.text}")
-            # Try to parse error response
-            try:
-                error_data = response.json()
-                return jsonify(error_data), response.status_code
-            except:
-                return jsonify({'error': f'API request failed with status {response.status_code}', 'details': response.text}), response.status_code
-            
-        print(f"[DEBUG] Aerial View API Success")
-        return jsonify(response.json())
+
+        # Optional geocoded location of the address, so differently worded addresses for one place share an entry
+        location_key = None
+        lat = request.args.get('lat', type=float)
+        lng = request.args.get('lng', type=float)
+        if lat is not None and lng is not None:
+            location_key = f"location:{round(lat, AERIAL_VIEW_GRID_DECIMALS)}:{round(lng, AERIAL_VIEW_GRID_DECIMALS)}"
+            result = aerial_view_cache.get(location_key)
+            if result is not None:
+                return jsonify(result['body']), result['status']
+
+        try:
+            result = aerial_view_cache.get_or_load(
+                f"address:{normalize_address(address)}",
+                lambda: fetch_aerial_view(address, api_key)
+            )
+        except resilience.CircuitOpenError as e:
+            return jsonify({'error': str(e)}), 503
+        except UncacheableResponse as e:
+            return jsonify(e.body), e.status
+
+        if location_key is not None:
+            aerial_view_cache.set(location_key, result)
+        return jsonify(result['body']), result['status']
         
     except Exception as e:
         print(f"Error in aerial_view: {e}")
@@ -793,6 +1952,8 @@ def aerial_view():
         traceback.print_exc()
         return jsonify({'error': str(e)}), 500
 
+startup.mark('routes_and_stores')
+
 if __name__ == '__main__':
     # Print all registered routes for debugging
     print("\n=== Registered Flask Routes ===")
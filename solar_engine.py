@@ -1,12 +1,23 @@
 
 import os
-import requests
+import time
+import re
+import http_client
 import io
 import random
-from groq import Groq
-from reportlab.lib.pagesizes import letter
-from reportlab.pdfgen import canvas
-from reportlab.lib import colors
+import shutil
+import zipfile
+import tempfile
+import threading
+import functools
+import multiprocessing
+import llm_client
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+from concurrent.futures import TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+from cache_utils import LRUCache, SingleFlight
+from fanout import TokenBucket
 import math
 
 # Calculate area from bounding box coordinates
@@ -26,6 +37,221 @@ def calculate_area_sqm(bounds):
     area = abs(width * height)
     return round(area, 2)
 
+# --- Building Insights cache ---
+# The analysis popup and the PDF download for the same roof share one billed Solar API call.
+# Lookups are keyed by rounded location (~11 m), which points at an entry keyed by building name.
+SOLAR_GRID_DECIMALS = int(os.getenv('SOLAR_GRID_DECIMALS', 4))
+SOLAR_CACHE_TTL = int(os.getenv('SOLAR_CACHE_TTL_SECONDS', 24 * 3600))
+# "Region not supported" answers change rarely; stop re-probing them on every click
+SOLAR_NEGATIVE_CACHE_TTL = int(os.getenv('SOLAR_NEGATIVE_CACHE_TTL_SECONDS', 7 * 24 * 3600))
+
+solar_location_cache = LRUCache(max_entries=20000, ttl=SOLAR_CACHE_TTL, name="solar location cache")
+solar_building_cache = LRUCache(max_entries=5000, ttl=SOLAR_CACHE_TTL, name="solar building cache")
+solar_flight = SingleFlight("solar building insights")
+
+# Every upstream call shares one token bucket so portfolio runs stay inside the project quota
+# (Google's default is 600 requests/minute). Cache hits don't consume tokens.
+SOLAR_API_QPS = float(os.getenv('SOLAR_API_QPS', 10))
+SOLAR_API_BURST = int(os.getenv('SOLAR_API_BURST', 10))
+solar_rate_limiter = TokenBucket(SOLAR_API_QPS, SOLAR_API_BURST)
+
+def fetch_building_insights(lat, lng, api_key):
+    """
+    Return the buildingInsights:findClosest JSON for a point, or the API's
+    {"error": ...} payload, serving repeat lookups for the same spot or
+    building from cache.
+    """
+    d = SOLAR_GRID_DECIMALS
+    location_key = f"{round(float(lat), d):.{d}f},{round(float(lng), d):.{d}f}"
+    entry = solar_location_cache.get(location_key)
+    if entry is not None:
+        if 'error' in entry:
+            print(f"[DEBUG] Solar API: cached negative result for {location_key}")
+            return {'error': entry['error']}
+        cached = solar_building_cache.get(entry['building'])
+        if cached is not None:
+            return cached
+
+    def load():
+        url = f"https://solar.googleapis.com/v1/buildingInsights:findClosest?location.latitude={lat}&location.longitude={lng}&requiredQuality=HIGH&key={api_key}"
+        solar_rate_limiter.acquire()
+        print(f"[DEBUG] Calling Google Solar API: {url[:100]}...")
+        response = http_client.get(url, upstream='solar')
+        print(f"[DEBUG] Google Solar API response status: {response.status_code}")
+        data = response.json()
+        if "error" in data:
+            # Only "no building / region not covered" (404 NOT_FOUND) is cached. Google also answers
+            # 400 for an invalid API key, which must not be remembered for a week.
+            if response.status_code == 404:
+                solar_location_cache.set(location_key, {'error': data['error']}, ttl=SOLAR_NEGATIVE_CACHE_TTL)
+            return data
+        building = data.get('name')
+        if building:
+            solar_building_cache.set(building, data)
+            solar_location_cache.set(location_key, {'building': building})
+        return data
+
+    return solar_flight.do(location_key, load)
+
+# --- Financial model ---
+# One vectorized model behind every figure we report: single roofs, portfolios and sensitivity sweeps.
+PANEL_COST_INR = 25000          # Installed cost per panel
+TARIFF_INR_PER_KWH = 8          # Grid tariff offset by solar generation
+CO2_KG_PER_KWH = 0.4            # Grid emission factor
+PANEL_DEGRADATION = 0.0         # Yearly output loss (0.005 = 0.5%/yr); 0 keeps the simple payback
+SYSTEM_LIFETIME_YEARS = 25
+DISCOUNT_RATE = 0.08
+
+def financial_model(yearly_energy, panels, tariff=TARIFF_INR_PER_KWH, panel_cost=PANEL_COST_INR,
+                    degradation=PANEL_DEGRADATION, years=SYSTEM_LIFETIME_YEARS, discount_rate=DISCOUNT_RATE):
+    """
+    Install cost, first-year savings, break-even, NPV and CO₂ offset. Every
+    argument may be a scalar or an array and they broadcast together, so a
+    whole parameter grid is evaluated in one NumPy pass. Output decays
+    geometrically with `degradation`, which keeps break-even and NPV in
+    closed form; break-even is inf when the system never pays back.
+    """
+    yearly_energy = np.asarray(yearly_energy, dtype=np.float64)
+    panels = np.asarray(panels, dtype=np.float64)
+    tariff = np.asarray(tariff, dtype=np.float64)
+    panel_cost = np.asarray(panel_cost, dtype=np.float64)
+    degradation = np.asarray(degradation, dtype=np.float64)
+
+    install_cost = panels * panel_cost
+    annual_savings = yearly_energy * tariff
+    no_decay = degradation <= 0
+    # Output in year t (from 0) is k^t of year one, with k = 1 - degradation
+    keep = 1.0 - degradation
+    q = keep / (1.0 + discount_rate)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # Cumulative savings after n years are S * (1 - k^n) / d; solve for n at the install cost
+        simple = install_cost / annual_savings
+        ratio = install_cost * degradation / annual_savings
+        decayed = np.where(ratio < 1, np.log1p(-ratio) / np.log1p(-degradation), np.inf)
+        # Discounted sum of k^t / (1 + r)^t over the system lifetime
+        annuity = np.where(np.isclose(q, 1.0), years, (1.0 - q ** years) / (1.0 - q))
+        lifetime_factor = np.where(no_decay, years, (1.0 - keep ** years) / degradation)
+    breakeven_years = np.where(annual_savings > 0, np.where(no_decay, simple, decayed), np.inf)
+    npv = annual_savings / (1.0 + discount_rate) * annuity - install_cost
+
+    return {
+        "install_cost": install_cost,
+        "annual_savings": annual_savings,
+        "breakeven_years": breakeven_years,
+        "npv": npv,
+        "co2_saved": yearly_energy * CO2_KG_PER_KWH,
+        "lifetime_co2_kg": yearly_energy * lifetime_factor * CO2_KG_PER_KWH,
+    }
+
+def site_financials(panels_count, yearly_energy):
+    """Scalar summary for one roof, in the shape the popup and PDF report expect."""
+    finance = financial_model(yearly_energy, panels_count)
+    breakeven = float(finance["breakeven_years"])
+    return {
+        "install_cost": round(float(finance["install_cost"])),
+        "annual_savings": round(float(finance["annual_savings"])),
+        "breakeven_years": round(breakeven, 1) if math.isfinite(breakeven) else 0,
+        "co2_saved": round(float(finance["co2_saved"]), 1),
+    }
+
+def sensitivity_surface(energy_per_panel, panel_counts, tariffs, panel_costs, degradations,
+                        years=SYSTEM_LIFETIME_YEARS, discount_rate=DISCOUNT_RATE):
+    """
+    Evaluate the financial model over the full grid of panel counts x tariffs
+    x panel costs x degradation rates. Arrays in the result are indexed in
+    that axis order.
+    """
+    panels, tariff, cost, degradation = np.ix_(
+        np.asarray(panel_counts, dtype=np.float64),
+        np.asarray(tariffs, dtype=np.float64),
+        np.asarray(panel_costs, dtype=np.float64),
+        np.asarray(degradations, dtype=np.float64),
+    )
+    return financial_model(panels * energy_per_panel, panels, tariff, cost, degradation, years, discount_rate)
+
+# --- Portfolio analysis ---
+SOLAR_PORTFOLIO_WORKERS = int(os.getenv('SOLAR_PORTFOLIO_WORKERS', 8))
+
+def fetch_site_potential(lat, lng, api_key):
+    """Solar potential for one site as (solarPotential, is_simulated), with the same fallback as the PDF path."""
+    try:
+        data = fetch_building_insights(lat, lng, api_key)
+        solar_potential = data.get("solarPotential") if "error" not in data else None
+        if solar_potential:
+            return solar_potential, False
+    except Exception as e:
+        print(f"[ERROR] fetch_site_potential({lat}, {lng}): {e}")
+    return generate_mock_solar_data(), True
+
+def analyze_solar_portfolio(sites, api_key, workers=SOLAR_PORTFOLIO_WORKERS):
+    """
+    Assess many rooftops at once. Building insights are fetched concurrently
+    (throttled by the shared Solar API rate limiter) and the financials are
+    computed for every site in one vectorized pass.
+
+    `sites` is a list of {"lat", "lng", "id"?}. This is a generator: it yields
+    {"type": "progress", ...} as each site is fetched, then a single
+    {"type": "result", "sites": [...], "totals": {...}} with the sites ranked
+    by break-even (simulated sites last).
+    """
+    total = len(sites)
+    potentials = [None] * total
+    simulated = np.zeros(total, dtype=bool)
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {
+            pool.submit(fetch_site_potential, site['lat'], site['lng'], api_key): i
+            for i, site in enumerate(sites)
+        }
+        for done, future in enumerate(as_completed(futures), 1):
+            i = futures[future]
+            potentials[i], simulated[i] = future.result()
+            yield {"type": "progress", "done": done, "total": total,
+                   "id": sites[i].get('id', i), "simulated": bool(simulated[i])}
+
+    panels = np.array([p.get("maxArrayPanelsCount", 0) for p in potentials], dtype=np.float64)
+    energy = np.array([p.get("yearlyEnergyDcKwh", 0) for p in potentials], dtype=np.float64)
+    finance = financial_model(energy, panels)
+    finance["breakeven_years"] = np.round(np.where(np.isfinite(finance["breakeven_years"]),
+                                                   finance["breakeven_years"], 0), 1)
+
+    # Simulated sites sort after measured ones; unprofitable sites (no savings) after profitable ones
+    no_savings = finance["annual_savings"] <= 0
+    order = np.lexsort((finance["breakeven_years"], no_savings, simulated))
+    ranked = []
+    for rank, i in enumerate(order, 1):
+        ranked.append({
+            "rank": rank,
+            "id": sites[i].get('id', int(i)),
+            "lat": sites[i]['lat'],
+            "lng": sites[i]['lng'],
+            "simulated": bool(simulated[i]),
+            "maxArrayPanelsCount": int(panels[i]),
+            "yearlyEnergyDcKwh": round(float(energy[i]), 1),
+            "install_cost": round(float(finance["install_cost"][i])),
+            "annual_savings": round(float(finance["annual_savings"][i])),
+            "breakeven_years": float(finance["breakeven_years"][i]),
+            "co2_saved": round(float(finance["co2_saved"][i]), 1),
+        })
+
+    # Portfolio totals only count measured sites; simulated numbers are placeholders
+    measured = ~simulated
+    total_cost = float(finance["install_cost"][measured].sum())
+    total_savings = float(finance["annual_savings"][measured].sum())
+    totals = {
+        "sites": total,
+        "measured_sites": int(measured.sum()),
+        "simulated_sites": int(simulated.sum()),
+        "panels": int(panels[measured].sum()),
+        "yearly_energy_kwh": round(float(energy[measured].sum()), 1),
+        "install_cost": round(total_cost),
+        "annual_savings": round(total_savings),
+        "breakeven_years": round(total_cost / total_savings, 1) if total_savings > 0 else 0,
+        "co2_saved": round(float(finance["co2_saved"][measured].sum()), 1),
+    }
+    yield {"type": "result", "sites": ranked, "totals": totals}
+
 # Enhanced Solar Analysis with Groq AI
 def analyze_solar_potential_with_ai(lat, lng, bounds, solar_api_key, groq_api_key):
     """
@@ -34,13 +260,14 @@ def analyze_solar_potential_with_ai(lat, lng, bounds, solar_api_key, groq_api_ke
     """
     area_sqm = calculate_area_sqm(bounds)
     area_sqft = round(area_sqm * 10.764, 2)
-    url = f"https://solar.googleapis.com/v1/buildingInsights:findClosest?location.latitude={lat}&location.longitude={lng}&requiredQuality=HIGH&key={solar_api_key}"
-    print(f"[DEBUG] Calling Google Solar API: {url[:100]}...")
     is_simulated = False
     try:
-        response = requests.get(url)
-        print(f"[DEBUG] Google Solar API response status: {response.status_code}")
-        data = response.json()
+        try:
+            data = fetch_building_insights(lat, lng, solar_api_key)
+        except http_client.UNAVAILABLE_ERRORS as e:
+            # Solar API down, slow or circuit open: same demo fallback as an unsupported region
+            print(f"[DEBUG] Solar API unavailable: {e}")
+            data = {"error": str(e)}
         print(f"[DEBUG] Google Solar API response keys: {list(data.keys())}")
         if "error" in data:
             print("Region not supported, switching to Simulation Mode")
@@ -55,11 +282,11 @@ def analyze_solar_potential_with_ai(lat, lng, bounds, solar_api_key, groq_api_ke
         panels_count = solar_potential.get("maxArrayPanelsCount", 0)
         yearly_energy = solar_potential.get("yearlyEnergyDcKwh", 0)
         panel_capacity_watts = solar_potential.get("panelCapacityWatts", 400)
-        install_cost = panels_count * 25000
-        annual_savings = yearly_energy * 8
-        breakeven_years = round(install_cost / annual_savings, 1) if annual_savings > 0 else 0
-        co2_saved = round(yearly_energy * 0.4, 1)
-        client = Groq(api_key=groq_api_key)
+        finance = site_financials(panels_count, yearly_energy)
+        install_cost = finance["install_cost"]
+        annual_savings = finance["annual_savings"]
+        breakeven_years = finance["breakeven_years"]
+        co2_saved = finance["co2_saved"]
         prompt = f"""Analyze this rooftop solar installation opportunity in India:
 
 Location: {lat}, {lng}
@@ -78,11 +305,15 @@ Provide a concise analysis with:
 3. Three actionable next steps for the property owner
 
 Keep it brief, practical, and India-focused."""
-        ai_response = client.chat.completions.create(
-            messages=[{"role": "user", "content": prompt}],
+        ai_analysis = llm_client.complete(
+            prompt,
             model="llama-3.3-70b-versatile",
+            api_key=groq_api_key,
+            key_parts=[
+                'solar', round(float(lat), 4), round(float(lng), 4), round(area_sqm),
+                panels_count, round(yearly_energy), panel_capacity_watts
+            ]
         )
-        ai_analysis = ai_response.choices[0].message.content
         sim_banner = ""
         if is_simulated:
             sim_banner = (
@@ -128,42 +359,28 @@ def generate_mock_solar_data():
     panels_count = random.randint(15, 40)
     panel_capacity_watts = 400
     yearly_energy = panels_count * random.randint(420, 480)  # kWh per panel
-    install_cost = panels_count * 25000
-    annual_savings = yearly_energy * 8
-    breakeven_years = round(install_cost / annual_savings, 1) if annual_savings > 0 else 0
-    co2_saved = round(yearly_energy * 0.4, 1)
     return {
         "maxArrayPanelsCount": panels_count,
         "yearlyEnergyDcKwh": yearly_energy,
         "panelCapacityWatts": panel_capacity_watts,
-        "install_cost": install_cost,
-        "annual_savings": annual_savings,
-        "breakeven_years": breakeven_years,
-        "co2_saved": co2_saved
+        **site_financials(panels_count, yearly_energy)
     }
 
+def site_report_data(lat, lng, api_key):
+    """Report values for one roof as (solar_data, is_simulated)."""
+    solar_potential, is_simulated = fetch_site_potential(lat, lng, api_key)
+    solar_data = {
+        "maxArrayPanelsCount": solar_potential.get("maxArrayPanelsCount", 0),
+        "yearlyEnergyDcKwh": solar_potential.get("yearlyEnergyDcKwh", 0),
+        "panelCapacityWatts": solar_potential.get("panelCapacityWatts", 400),
+    }
+    solar_data.update(site_financials(solar_data["maxArrayPanelsCount"], solar_data["yearlyEnergyDcKwh"]))
+    return solar_data, is_simulated
+
 def analyze_solar_potential(lat, lng, api_key):
     """PDF generation function with simulation fallback."""
-    url = f"https://solar.googleapis.com/v1/buildingInsights:findClosest?location.latitude={lat}&location.longitude={lng}&requiredQuality=HIGH&key={api_key}"
-    is_simulated = False
     try:
-        response = requests.get(url)
-        data = response.json()
-        if "error" in data:
-            print("Region not supported, switching to Simulation Mode")
-            solar_data = generate_mock_solar_data()
-            is_simulated = True
-        else:
-            solar_potential = data.get("solarPotential", {})
-            solar_data = {
-                "maxArrayPanelsCount": solar_potential.get("maxArrayPanelsCount", 0),
-                "yearlyEnergyDcKwh": solar_potential.get("yearlyEnergyDcKwh", 0),
-                "panelCapacityWatts": solar_potential.get("panelCapacityWatts", 400),
-            }
-            solar_data["install_cost"] = solar_data["maxArrayPanelsCount"] * 25000
-            solar_data["annual_savings"] = solar_data["yearlyEnergyDcKwh"] * 8
-            solar_data["breakeven_years"] = round(solar_data["install_cost"] / solar_data["annual_savings"], 1) if solar_data["annual_savings"] > 0 else 0
-            solar_data["co2_saved"] = round(solar_data["yearlyEnergyDcKwh"] * 0.4, 1)
+        solar_data, is_simulated = site_report_data(lat, lng, api_key)
         buffer = generate_pdf(lat, lng, solar_data, is_simulated)
         return buffer, None
     except Exception as e:
@@ -174,44 +391,170 @@ def analyze_solar_potential(lat, lng, api_key):
         buffer = generate_pdf(lat, lng, solar_data, is_simulated)
         return buffer, None
 
-def generate_pdf(lat, lng, solar_data, is_simulated=False):
-    """Generate a PDF report, marking DEMO MODE if simulated."""
-    buffer = io.BytesIO()
-    p = canvas.Canvas(buffer, pagesize=letter)
-    y = 750
+# --- PDF reports ---
+# Static page furniture (title, headings, labels, rule, footer) is drawn once per document
+# into a form XObject that is stamped on each of its pages; only the per-site values are
+# drawn per page.
+REPORT_FORM = "solar_report_furniture"
+REPORT_FONT = ("Helvetica", 12)
+SIMULATED_OFFSET = 30  # Demo banner pushes the page body down
+REPORT_FIELDS = [
+    # (x, y, static label, value template)
+    (100, 720, "Location Analysis: ", "{lat}, {lng}"),
+    (120, 660, "• Max Panels Fit: ", "{maxArrayPanelsCount}"),
+    (120, 640, "• Yearly Generation: ", "{yearlyEnergyDcKwh} kWh"),
+    (120, 620, "• CO2 Offset: ", "{co2_saved} kg/year"),
+    (120, 560, "• Est. Installation Cost: ₹ ", "{install_cost:,}"),
+    (120, 540, "• Annual Bill Savings: ₹ ", "{annual_savings:,}"),
+    (120, 520, "• ROI / Break-even: ", "{breakeven_years} Years"),
+]
+PDF_RENDER_WORKERS = int(os.getenv('PDF_RENDER_WORKERS', 2))
+# Longest a request waits for its documents before giving up with an error
+PDF_RENDER_TIMEOUT = float(os.getenv('PDF_RENDER_TIMEOUT_SECONDS', 120))
+
+_render_pool = None
+_render_pool_lock = threading.Lock()
+
+def _init_render_worker():
+    """Load reportlab and measure the labels once, when a render worker starts."""
+    from reportlab.pdfgen import canvas  # noqa: F401
+    _report_value_x()
+
+def get_render_pool():
+    """
+    Process pool for CPU-bound reportlab rendering, started on first use.
+    Workers are spawned rather than forked: forking while the warm-up thread
+    holds import locks (e.g. mid reportlab import) leaves children deadlocked.
+    """
+    global _render_pool
+    with _render_pool_lock:
+        if _render_pool is None:
+            _render_pool = ProcessPoolExecutor(
+                max_workers=PDF_RENDER_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_render_worker
+            )
+        return _render_pool
+
+def _discard_render_pool(pool):
+    """Drop a pool whose workers died or hung so the next report starts a fresh one."""
+    global _render_pool
+    with _render_pool_lock:
+        if _render_pool is pool:
+            _render_pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+def _draw_report_furniture(p):
+    p.setFont("Helvetica-Bold", 16)
+    p.drawString(100, 750, "GeoCortex Solar Intelligence Report")
+    p.setFont(*REPORT_FONT)
+    p.line(100, 710, 500, 710)
+    p.drawString(100, 680, "SOLAR POTENTIAL SUMMARY:")
+    p.drawString(100, 580, "FINANCIAL ESTIMATION (India):")
+    for x, y, label, _ in REPORT_FIELDS:
+        p.drawString(x, y, label)
+    p.setFont("Helvetica-Oblique", 10)
+    p.drawString(100, 480, "Generated by GeoCortex AI Engine using Google Solar API")
+
+@functools.lru_cache(maxsize=None)
+def _report_value_x():
+    """Values start where their label ends; measured once per process."""
+    from reportlab.pdfbase import pdfmetrics
+    return {label: x + pdfmetrics.stringWidth(label, *REPORT_FONT) for x, _, label, _ in REPORT_FIELDS}
+
+def _draw_report_page(p, lat, lng, solar_data, is_simulated):
+    from reportlab.lib import colors
+    value_x = _report_value_x()
+    p.saveState()
     if is_simulated:
         p.setFont("Helvetica-Bold", 14)
         p.setFillColor(colors.red)
-        p.drawString(100, y, "[DEMO MODE: SIMULATED DATA]")
+        p.drawString(100, 750, "[DEMO MODE: SIMULATED DATA]")
         p.setFillColor(colors.black)
-        y -= 30
-    p.setFont("Helvetica-Bold", 16)
-    p.drawString(100, y, "GeoCortex Solar Intelligence Report")
-    y -= 30
-    p.setFont("Helvetica", 12)
-    p.drawString(100, y, f"Location Analysis: {lat}, {lng}")
-    y -= 10
-    p.line(100, y, 500, y)
-    y -= 30
-    p.drawString(100, y, "SOLAR POTENTIAL SUMMARY:")
-    y -= 20
-    p.drawString(120, y, f"• Max Panels Fit: {solar_data['maxArrayPanelsCount']}")
-    y -= 20
-    p.drawString(120, y, f"• Yearly Generation: {solar_data['yearlyEnergyDcKwh']} kWh")
-    y -= 20
-    p.drawString(120, y, f"• CO2 Offset: {solar_data['co2_saved']} kg/year")
-    y -= 40
-    p.drawString(100, y, "FINANCIAL ESTIMATION (India):")
-    y -= 20
-    p.drawString(120, y, f"• Est. Installation Cost: ₹ {solar_data['install_cost']:,}")
-    y -= 20
-    p.drawString(120, y, f"• Annual Bill Savings: ₹ {solar_data['annual_savings']:,}")
-    y -= 20
-    p.drawString(120, y, f"• ROI / Break-even: {solar_data['breakeven_years']} Years")
-    y -= 40
-    p.setFont("Helvetica-Oblique", 10)
-    p.drawString(100, y, "Generated by GeoCortex AI Engine using Google Solar API")
+        p.translate(0, -SIMULATED_OFFSET)
+    p.doForm(REPORT_FORM)
+    p.setFont(*REPORT_FONT)
+    for _, y, label, template in REPORT_FIELDS:
+        p.drawString(value_x[label], y, template.format(lat=lat, lng=lng, **solar_data))
+    p.restoreState()
     p.showPage()
+
+def render_solar_report(target, pages):
+    """
+    Render one page per site into `target` (a path or binary file object).
+    `pages` is a list of (lat, lng, solar_data, is_simulated). Runs in the
+    render pool, so it only takes picklable arguments.
+    """
+    # reportlab is imported here rather than at module load to keep server start-up fast
+    from reportlab.lib.pagesizes import letter
+    from reportlab.pdfgen import canvas
+    p = canvas.Canvas(target, pagesize=letter)
+    p.beginForm(REPORT_FORM)
+    _draw_report_furniture(p)
+    p.endForm()
+    for lat, lng, solar_data, is_simulated in pages:
+        _draw_report_page(p, lat, lng, solar_data, is_simulated)
     p.save()
+
+def generate_pdf(lat, lng, solar_data, is_simulated=False):
+    """Generate a PDF report, marking DEMO MODE if simulated."""
+    buffer = io.BytesIO()
+    render_solar_report(buffer, [(lat, lng, solar_data, is_simulated)])
     buffer.seek(0)
     return buffer
+
+def build_batch_report(sites, api_key, bundle="pdf", workers=SOLAR_PORTFOLIO_WORKERS):
+    """
+    Multi-site report written to a temp file; the caller streams and deletes it.
+    Site data is fetched on threads, then pages are rendered in the process
+    pool: one document with a page per site (bundle="pdf"), or one document
+    per site collected into a ZIP (bundle="zip"). Returns the file path.
+    """
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        reports = list(pool.map(lambda site: site_report_data(site['lat'], site['lng'], api_key), sites))
+    pages = [(site['lat'], site['lng'], solar_data, is_simulated)
+             for site, (solar_data, is_simulated) in zip(sites, reports)]
+    render_pool = get_render_pool()
+    deadline = time.monotonic() + PDF_RENDER_TIMEOUT
+
+    def wait(future):
+        try:
+            return future.result(timeout=max(deadline - time.monotonic(), 0))
+        except FutureTimeout:
+            _discard_render_pool(render_pool)
+            raise TimeoutError(f"PDF rendering did not finish within {PDF_RENDER_TIMEOUT:.0f}s")
+        except BrokenProcessPool:
+            _discard_render_pool(render_pool)
+            raise
+
+    if bundle == "pdf":
+        fd, path = tempfile.mkstemp(prefix="geocortex_report_", suffix=".pdf")
+        os.close(fd)
+        try:
+            wait(render_pool.submit(render_solar_report, path, pages))
+        except Exception:
+            os.remove(path)
+            raise
+        return path
+
+    work_dir = tempfile.mkdtemp(prefix="geocortex_reports_")
+    fd, path = tempfile.mkstemp(prefix="geocortex_reports_", suffix=".zip")
+    os.close(fd)
+    try:
+        futures = []
+        for i, (site, page) in enumerate(zip(sites, pages)):
+            name = re.sub(r'[^A-Za-z0-9_.-]', '_', str(site.get('id', i + 1)))
+            page_path = os.path.join(work_dir, f"{i:04d}.pdf")
+            futures.append((f"solar_report_{name}.pdf", page_path,
+                            render_pool.submit(render_solar_report, page_path, [page])))
+        # PDFs are already compressed; store them as-is
+        with zipfile.ZipFile(path, "w", zipfile.ZIP_STORED) as archive:
+            for arcname, page_path, future in futures:
+                wait(future)
+                archive.write(page_path, arcname)
+    except Exception:
+        os.remove(path)
+        raise
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    return path
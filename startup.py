@@ -0,0 +1,186 @@
+import io
+import os
+import json
+import time
+import importlib
+import multiprocessing
+import threading
+from contextlib import contextmanager
+
+from dotenv import load_dotenv
+
+# How the server gets ready:
+#   background - serve immediately, initialize EE and import heavy modules on a warm-up thread (default)
+#   lazy       - initialize EE on the first request that needs it
+#   eager      - block at import until EE is initialized (the old behaviour)
+STARTUP_MODE = os.getenv('STARTUP_MODE', 'background').lower()
+EE_INIT_TIMEOUT = float(os.getenv('EE_INIT_TIMEOUT_SECONDS', 60))
+# Imported on the warm-up thread so the first solar report or LLM call doesn't pay for them
+WARM_IMPORTS = ['groq', 'reportlab.pdfgen.canvas', 'reportlab.pdfbase.pdfmetrics']
+
+PROCESS_START = time.perf_counter()
+_phases = []  # (name, seconds)
+_last_mark = PROCESS_START
+_phases_lock = threading.Lock()
+
+
+def _record(name, seconds):
+    with _phases_lock:
+        _phases.append((name, round(seconds, 3)))
+    print(f"[STARTUP] {name}: {seconds:.2f}s ({time.perf_counter() - PROCESS_START:.2f}s since start)")
+
+
+def mark(name):
+    """Record the time spent since the previous mark (or process start) as a startup phase."""
+    global _last_mark
+    now = time.perf_counter()
+    with _phases_lock:
+        started, _last_mark = _last_mark, now
+    _record(name, now - started)
+
+
+@contextmanager
+def phase(name):
+    """Time a block as a startup phase, e.g. work done on the warm-up thread."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        _record(name, time.perf_counter() - started)
+
+
+def startup_phases():
+    with _phases_lock:
+        return [{'phase': name, 'seconds': seconds} for name, seconds in _phases]
+
+
+def load_env(env_path):
+    """Load .env, tolerating a UTF-8 BOM (utf-8-sig strips it) without rewriting the file."""
+    try:
+        with open(env_path, 'r', encoding='utf-8-sig') as f:
+            load_dotenv(stream=io.StringIO(f.read()))
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        print(f"[DEBUG] Error loading .env: {e}")
+
+
+# --- Earth Engine ---
+
+_ee_status = {'state': 'pending', 'error': None, 'seconds': None}
+_ee_ready = threading.Event()
+_ee_started = False
+_ee_lock = threading.Lock()
+
+
+def _find_credentials():
+    # Check for Cloud Run mounted secret first, then fallback to local file
+    # Cloud Run typically mounts secrets to /secrets/<secret-name> or custom path
+    credentials_paths = [
+        os.environ.get('GOOGLE_APPLICATION_CREDENTIALS'),  # Environment variable path
+        '/secrets/earthengine-credentials',  # User's Cloud Run secret mount path
+        '/secrets/credentials.json',  # Common Cloud Run secret mount path
+        '/secrets/credentials/credentials.json',  # Alternative mount path
+        os.path.join(os.path.dirname(__file__), 'credentials.json')  # Local development
+    ]
+    for cred_path in credentials_paths:
+        if cred_path and os.path.exists(cred_path):
+            print(f"[DEBUG] Found credentials at: {cred_path}")
+            with open(cred_path, 'r') as f:
+                return json.load(f)
+    raise FileNotFoundError("No credentials.json found in any expected location")
+
+
+def _initialize_ee():
+    _ee_status['state'] = 'initializing'
+    started = time.perf_counter()
+    try:
+        with phase('ee_init'):
+            ee_module = importlib.import_module('ee')
+            credentials_data = _find_credentials()
+            creds = ee_module.ServiceAccountCredentials(
+                credentials_data['client_email'],
+                key_data=json.dumps(credentials_data)
+            )
+            ee_module.Initialize(creds)
+        _ee_status['state'] = 'ready'
+        print("Earth Engine initialized successfully")
+    except Exception as e:
+        _ee_status['state'] = 'failed'
+        _ee_status['error'] = str(e)
+        print(f"Earth Engine initialization failed: {e}")
+    finally:
+        _ee_status['seconds'] = round(time.perf_counter() - started, 3)
+        _ee_ready.set()
+
+
+def start_ee_init(background=True):
+    """Start Earth Engine initialization once; later calls are no-ops."""
+    global _ee_started
+    with _ee_lock:
+        if _ee_started:
+            return
+        _ee_started = True
+    if background:
+        threading.Thread(target=_initialize_ee, name='ee-init', daemon=True).start()
+    else:
+        _initialize_ee()
+
+
+def ensure_ee(timeout=EE_INIT_TIMEOUT):
+    """Block until the EE initialization attempt has finished (started if needed). Returns True if ready."""
+    start_ee_init()
+    _ee_ready.wait(timeout)
+    return _ee_status['state'] == 'ready'
+
+
+def ee_status():
+    return dict(_ee_status)
+
+
+class LazyModule:
+    """
+    Stand-in for a module that is imported, and prepared by `prepare()`, on
+    first attribute access, so importing the code that uses it stays cheap.
+    """
+
+    def __init__(self, name, prepare=None):
+        self._name = name
+        self._prepare = prepare
+        self._module = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        with self._lock:
+            if self._module is None:
+                if self._prepare is not None:
+                    self._prepare()
+                self._module = importlib.import_module(self._name)
+        return self._module
+
+    def __getattr__(self, attr):
+        return getattr(self._module or self._load(), attr)
+
+
+# `from startup import ee` instead of `import ee`: the first EE call waits for initialization
+ee = LazyModule('ee', prepare=ensure_ee)
+
+
+def _warm_up():
+    start_ee_init(background=False)
+    for module in WARM_IMPORTS:
+        try:
+            with phase(f"import {module}"):
+                importlib.import_module(module)
+        except Exception as e:
+            print(f"[DEBUG] Warm-up import of {module} failed: {e}")
+
+
+def start():
+    """Kick off initialization according to STARTUP_MODE."""
+    if multiprocessing.parent_process() is not None:
+        return  # Spawned worker (e.g. the PDF render pool) re-importing the server; it never serves requests
+    if STARTUP_MODE == 'eager':
+        start_ee_init(background=False)
+    elif STARTUP_MODE != 'lazy':
+        threading.Thread(target=_warm_up, name='warm-up', daemon=True).start()
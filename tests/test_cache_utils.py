@@ -0,0 +1,203 @@
+import os
+import threading
+
+import pytest
+
+import cache_utils
+from cache_utils import DiskLRUCache, LRUCache, SingleFlight, SQLiteStore, MISSING
+
+
+@pytest.fixture
+def store(tmp_path):
+    return SQLiteStore(str(tmp_path / "cache.sqlite"))
+
+
+# --- LRUCache ---
+
+def test_lru_evicts_least_recently_used():
+    cache = LRUCache(max_entries=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")  # "b" is now the oldest
+    cache.set("c", 3)
+    assert cache.get("a") == 1
+    assert cache.get("b") is None
+    assert cache.get("c") == 3
+
+
+def test_lru_none_is_a_cached_value():
+    cache = LRUCache(max_entries=10)
+    cache.set("negative", None)
+    assert cache.get("negative", MISSING) is None
+    assert cache.get("absent", MISSING) is MISSING
+
+
+def test_lru_ttl_expiry(monkeypatch, clock):
+    monkeypatch.setattr(cache_utils, "time", clock)
+    cache = LRUCache(max_entries=10, ttl=60)
+    cache.set("default", 1)
+    cache.set("short", 2, ttl=10)
+    clock.advance(30)
+    assert cache.get("default") == 1
+    assert cache.get("short") is None
+    clock.advance(31)
+    assert cache.get("default") is None
+
+
+def test_lru_callable_ttl_depends_on_value(monkeypatch, clock):
+    monkeypatch.setattr(cache_utils, "time", clock)
+    cache = LRUCache(max_entries=10, ttl=lambda value: 5 if value is None else 100)
+    cache.set("miss", None)
+    cache.set("hit", "x")
+    clock.advance(10)
+    assert cache.get("miss", MISSING) is MISSING
+    assert cache.get("hit") == "x"
+
+
+def test_lru_promotes_store_rows_with_remaining_ttl(monkeypatch, clock, store):
+    monkeypatch.setattr(cache_utils, "time", clock)
+    LRUCache(max_entries=10, store=store).set("k", {"v": 1}, ttl=100)
+    clock.advance(60)
+    # A fresh process: nothing in memory, the row is read back with 40 s left
+    cache = LRUCache(max_entries=10, store=store)
+    assert cache.get("k") == {"v": 1}
+    clock.advance(41)
+    assert cache.get("k") is None
+    assert store.get("k") is MISSING
+
+
+def test_lru_set_many_writes_one_store_batch(monkeypatch, clock, store):
+    monkeypatch.setattr(cache_utils, "time", clock)
+    batches = []
+    set_many = store.set_many
+    monkeypatch.setattr(store, "set_many", lambda items, ttl=None: (batches.append(list(items)), set_many(items, ttl)))
+    cache = LRUCache(max_entries=10, store=store)
+    cache.set_many([("a", 1), ("b", 2)], ttl=30)
+    assert batches == [[("a", 1), ("b", 2)]]
+    assert LRUCache(max_entries=10, store=store).get("b") == 2
+    clock.advance(31)
+    assert cache.get("a") is None
+    assert store.get("b") is MISSING
+
+
+def test_lru_set_many_with_callable_ttl(monkeypatch, clock):
+    monkeypatch.setattr(cache_utils, "time", clock)
+    cache = LRUCache(max_entries=10, ttl=lambda value: value)
+    cache.set_many([("short", 5), ("long", 50)])
+    clock.advance(10)
+    assert cache.get("short") is None
+    assert cache.get("long") == 50
+
+
+def test_lru_get_or_load_coalesces_concurrent_misses():
+    cache = LRUCache(max_entries=10)
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def loader():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return "value"
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get_or_load("k", loader))) for _ in range(5)]
+    threads[0].start()
+    started.wait(5)
+    for t in threads[1:]:
+        t.start()
+    release.set()
+    for t in threads:
+        t.join(5)
+    assert results == ["value"] * 5
+    assert len(calls) == 1
+
+
+# --- SingleFlight ---
+
+def test_single_flight_shares_errors_with_waiters():
+    flight = SingleFlight("test flight")
+    started = threading.Event()
+    release = threading.Event()
+
+    def fail():
+        started.set()
+        release.wait(5)
+        raise ValueError("upstream said no")
+
+    errors = []
+
+    def call():
+        try:
+            flight.do("k", fail)
+        except ValueError as e:
+            errors.append(e)
+
+    leader = threading.Thread(target=call)
+    leader.start()
+    started.wait(5)
+    follower = threading.Thread(target=call)
+    follower.start()
+    # The follower is waiting on the leader's call once it has been counted
+    while flight.calls < 2:
+        pass
+    release.set()
+    leader.join(5)
+    follower.join(5)
+    assert len(errors) == 2
+    assert flight.executions == 1
+    # A finished call is forgotten, so the next one runs again
+    assert flight.do("k", lambda: "ok") == "ok"
+
+
+# --- DiskLRUCache ---
+
+def test_disk_cache_round_trip_and_etag(tmp_path):
+    cache = DiskLRUCache(str(tmp_path), max_bytes=1024)
+    etag = cache.put("k", b"tile")
+    assert etag == DiskLRUCache.make_etag(b"tile")
+    assert cache.etag("k") == etag
+    assert cache.get("k") == (b"tile", etag)
+    assert cache.get("missing") is None
+
+
+def test_disk_cache_evicts_to_max_bytes(tmp_path):
+    cache = DiskLRUCache(str(tmp_path), max_bytes=10)
+    cache.put("a", b"aaaa")
+    cache.put("b", b"bbbb")
+    cache.get("a")  # "b" is now the oldest
+    cache.put("c", b"cccc")
+    assert cache.get("b") is None
+    assert cache.get("a") is not None
+    assert len([f for f in os.listdir(tmp_path) if f.endswith(".bin")]) == 2
+
+
+def test_disk_cache_put_stream_matches_put(tmp_path):
+    cache = DiskLRUCache(str(tmp_path), max_bytes=1024)
+    etag = cache.put_stream("k", iter([b"ti", b"le"]))
+    assert etag == DiskLRUCache.make_etag(b"tile")
+    chunks, stream_etag = cache.stream("k", chunk_size=3)
+    assert stream_etag == etag
+    assert list(chunks) == [b"til", b"e"]
+
+
+def test_disk_cache_put_stream_failure_commits_nothing(tmp_path):
+    cache = DiskLRUCache(str(tmp_path), max_bytes=1024)
+
+    def broken():
+        yield b"partial"
+        raise ConnectionError("upstream went away")
+
+    with pytest.raises(ConnectionError):
+        cache.put_stream("k", broken())
+    assert cache.stream("k") is None
+    assert os.listdir(tmp_path) == []
+
+
+def test_disk_cache_rebuilds_index_and_drops_partial_writes(tmp_path):
+    etag = DiskLRUCache(str(tmp_path), max_bytes=1024).put("k", b"tile")
+    (tmp_path / "other.123.tmp").write_bytes(b"interrupted")
+    cache = DiskLRUCache(str(tmp_path), max_bytes=1024)
+    assert cache.get("k") == (b"tile", etag)
+    assert not (tmp_path / "other.123.tmp").exists()
@@ -0,0 +1,59 @@
+import json
+
+import numpy as np
+import pytest
+
+from lst_store import LSTRasterStore, LST_NODATA
+
+# Two pixels per degree keeps the arithmetic readable
+PIXEL_DEG = 0.5
+BBOX = [77.0, 12.0, 78.0, 13.0]  # west, south, east, north
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = LSTRasterStore(str(tmp_path), bbox=BBOX, pixel_deg=PIXEL_DEG)
+    # Rows run north to south, columns west to east, as ingest() writes them
+    array = np.array([[15000, 15100],
+                      [LST_NODATA, 15300]], dtype=np.uint16)
+    array_path, meta_path = store._paths(2020)
+    np.save(array_path, array)
+    with open(meta_path, "w") as f:
+        json.dump({"west": 77.0, "north": 13.0, "pixel_deg": PIXEL_DEG, "width": 2, "height": 2, "year": 2020}, f)
+    return store
+
+
+@pytest.mark.parametrize("lat, lng, expected", [
+    (12.9, 77.1, 15000),   # north-west pixel
+    (12.9, 77.9, 15100),   # north-east pixel
+    (12.1, 77.9, 15300),   # south-east pixel
+    (13.0, 77.0, 15000),   # the north-west corner belongs to the first pixel
+    (12.5, 77.5, 15300),   # pixel edges belong to the pixel south-east of them
+])
+def test_lookup_inside_snapshot(store, lat, lng, expected):
+    assert store.lookup(2020, lat, lng) == expected
+
+
+def test_lookup_returns_plain_int(store):
+    assert type(store.lookup(2020, 12.9, 77.1)) is int
+
+
+def test_lookup_nodata_is_none(store):
+    assert store.lookup(2020, 12.1, 77.1) is None
+
+
+@pytest.mark.parametrize("lat, lng", [
+    (13.1, 77.5),   # north of the bbox
+    (11.9, 77.5),   # south
+    (12.5, 76.9),   # west
+    (12.5, 78.0),   # the east edge is exclusive
+    (12.0, 77.5),   # and so is the south edge
+])
+def test_lookup_outside_snapshot_is_none(store, lat, lng):
+    assert store.lookup(2020, lat, lng) is None
+
+
+def test_missing_year(store):
+    assert not store.has_year(2019)
+    assert store.lookup(2019, 12.9, 77.1) is None
+    assert store.has_year(2020)
@@ -0,0 +1,135 @@
+import itertools
+
+import pytest
+import requests
+
+import resilience
+from resilience import CircuitBreaker, CircuitOpenError, DeadlineExceeded, is_upstream_failure
+
+_names = itertools.count()
+
+
+@pytest.fixture
+def circuit(monkeypatch, clock):
+    monkeypatch.setattr(resilience, "time", clock)
+    return CircuitBreaker("test upstream", failure_threshold=3, reset_timeout=30)
+
+
+def http_error(status):
+    response = requests.Response()
+    response.status_code = status
+    return requests.HTTPError("upstream answered with an error", response=response)
+
+
+# --- CircuitBreaker ---
+
+def test_opens_after_consecutive_failures(circuit):
+    for _ in range(2):
+        circuit.record_failure()
+    assert circuit.allow()
+    circuit.record_failure()
+    assert circuit.state == "open"
+    with pytest.raises(CircuitOpenError):
+        circuit.check()
+
+
+def test_success_resets_the_failure_count(circuit):
+    circuit.record_failure()
+    circuit.record_failure()
+    circuit.record_success()
+    circuit.record_failure()
+    circuit.record_failure()
+    assert circuit.state == "closed"
+
+
+def test_half_open_lets_one_trial_through(circuit, clock):
+    for _ in range(3):
+        circuit.record_failure()
+    clock.advance(29)
+    assert not circuit.allow()
+    clock.advance(1)
+    assert circuit.allow()
+    assert circuit.state == "half_open"
+    assert not circuit.allow()  # Only one trial at a time
+
+
+def test_trial_success_closes_and_failure_reopens(circuit, clock):
+    for _ in range(3):
+        circuit.record_failure()
+    clock.advance(30)
+    assert circuit.allow()
+    circuit.record_failure()
+    assert circuit.state == "open"
+    assert not circuit.allow()
+    clock.advance(30)
+    assert circuit.allow()
+    circuit.record_success()
+    assert circuit.state == "closed"
+    assert circuit.allow()
+
+
+def test_release_trial_lets_the_next_call_try(circuit, clock):
+    for _ in range(3):
+        circuit.record_failure()
+    clock.advance(30)
+    assert circuit.allow()
+    circuit.release_trial()
+    assert circuit.state == "half_open"
+    assert circuit.allow()
+
+
+# --- is_upstream_failure ---
+
+@pytest.mark.parametrize("exc, expected", [
+    (http_error(503), True),
+    (http_error(429), True),
+    (http_error(400), False),
+    (http_error(404), False),
+    (requests.ConnectionError("connection refused"), True),
+    (requests.Timeout("read timed out"), True),
+    (Exception("Too many concurrent aggregations."), True),
+    (Exception("Image.sample: Parameter 'region' is required."), False),
+    (ValueError("year must be between 2000 and 2026"), False),
+    (DeadlineExceeded("request budget exhausted"), False),
+])
+def test_is_upstream_failure(exc, expected):
+    assert is_upstream_failure(exc) is expected
+
+
+# --- guard ---
+
+def test_guard_counts_only_upstream_failures():
+    name = f"test guard {next(_names)}"
+    circuit = resilience.breaker(name)
+    circuit.failure_threshold = 1
+
+    with pytest.raises(ValueError):
+        with resilience.guard(name):
+            raise ValueError("bad geometry")
+    assert circuit.state == "closed"
+
+    with pytest.raises(requests.ConnectionError):
+        with resilience.guard(name):
+            raise requests.ConnectionError("connection reset")
+    assert circuit.state == "open"
+    with pytest.raises(CircuitOpenError):
+        with resilience.guard(name):
+            pass
+
+
+def test_guard_releases_a_trial_without_a_verdict(monkeypatch, clock):
+    monkeypatch.setattr(resilience, "time", clock)
+    name = f"test guard {next(_names)}"
+    circuit = resilience.breaker(name)
+    circuit.reset_timeout = 30
+    for _ in range(circuit.failure_threshold):
+        circuit.record_failure()
+    clock.advance(30)
+
+    with pytest.raises(ValueError):
+        with resilience.guard(name):
+            raise ValueError("bad input says nothing about the upstream")
+    # The trial slot is free again rather than stuck until the next verdict
+    with resilience.guard(name):
+        pass
+    assert circuit.state == "closed"
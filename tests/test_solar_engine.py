@@ -0,0 +1,83 @@
+import math
+
+import numpy as np
+import pytest
+
+from solar_engine import financial_model, site_financials, CO2_KG_PER_KWH
+
+
+def brute_force(yearly_energy, panels, tariff, panel_cost, degradation, years, discount_rate):
+    """Year-by-year reference for the closed forms in financial_model."""
+    install_cost = panels * panel_cost
+    savings = [yearly_energy * tariff * (1 - degradation) ** t for t in range(years)]
+    npv = sum(s / (1 + discount_rate) ** (t + 1) for t, s in enumerate(savings)) - install_cost
+    lifetime_energy = sum(yearly_energy * (1 - degradation) ** t for t in range(years))
+    return npv, lifetime_energy * CO2_KG_PER_KWH
+
+
+def test_simple_payback_without_degradation():
+    result = financial_model(4000, 10, tariff=8, panel_cost=25000, degradation=0, years=25, discount_rate=0)
+    assert result["install_cost"] == 250000
+    assert result["annual_savings"] == 32000
+    assert result["breakeven_years"] == pytest.approx(250000 / 32000)
+    # No decay and no discounting: q == 1 takes the annuity's special case
+    assert result["npv"] == pytest.approx(32000 * 25 - 250000)
+    assert result["lifetime_co2_kg"] == pytest.approx(4000 * 25 * CO2_KG_PER_KWH)
+
+
+@pytest.mark.parametrize("degradation, discount_rate", [
+    (0.0, 0.08),
+    (0.005, 0.08),
+    (0.02, 0.0),
+    (0.03, 0.05),
+])
+def test_closed_forms_match_year_by_year_sums(degradation, discount_rate):
+    result = financial_model(4000, 10, tariff=8, panel_cost=25000,
+                             degradation=degradation, years=25, discount_rate=discount_rate)
+    npv, lifetime_co2 = brute_force(4000, 10, 8, 25000, degradation, 25, discount_rate)
+    assert result["npv"] == pytest.approx(npv)
+    assert result["lifetime_co2_kg"] == pytest.approx(lifetime_co2)
+
+
+def test_degraded_breakeven_recovers_install_cost():
+    degradation = 0.01
+    result = financial_model(4000, 10, tariff=8, panel_cost=25000, degradation=degradation)
+    n = float(result["breakeven_years"])
+    # Cumulative (continuous-time) savings after n years equal the install cost
+    keep = 1 - degradation
+    assert 32000 * (1 - keep ** n) / degradation == pytest.approx(250000)
+    assert n > 250000 / 32000
+
+
+def test_never_pays_back_is_inf():
+    # Output decays faster than it can ever repay the install cost
+    decaying = financial_model(100, 10, tariff=8, panel_cost=25000, degradation=0.5)
+    assert math.isinf(decaying["breakeven_years"])
+    no_output = financial_model(0, 10)
+    assert math.isinf(no_output["breakeven_years"])
+    assert no_output["npv"] == pytest.approx(-no_output["install_cost"])
+
+
+def test_zero_panels():
+    result = financial_model(0, 0)
+    assert result["install_cost"] == 0
+    assert math.isinf(result["breakeven_years"])
+    assert result["npv"] == 0
+    assert result["lifetime_co2_kg"] == 0
+
+
+def test_arguments_broadcast_to_a_grid():
+    panels = np.array([10, 20])[:, None, None]
+    tariffs = np.array([6, 8, 10])[None, :, None]
+    degradations = np.array([0.0, 0.01])[None, None, :]
+    result = financial_model(panels * 400, panels, tariff=tariffs, degradation=degradations)
+    assert result["npv"].shape == (2, 3, 2)
+    single = financial_model(20 * 400, 20, tariff=10, degradation=0.01)
+    assert result["npv"][1, 2, 1] == pytest.approx(single["npv"])
+    assert result["breakeven_years"][1, 2, 1] == pytest.approx(single["breakeven_years"])
+
+
+def test_site_financials_reports_no_payback_as_zero():
+    summary = site_financials(0, 0)
+    assert summary["breakeven_years"] == 0
+    assert summary["install_cost"] == 0